@@ -0,0 +1,13 @@
+"""
+Benchmarks for the game systems
+
+These run under Evennia's test runner (and its throwaway SQLite test
+database) but are skipped unless `OMA_BENCHMARK` is set, so they never slow
+down a normal `evennia test`:
+
+    OMA_BENCHMARK=1 evennia test --settings settings.py benchmarks
+
+Results are written as JSON so two runs (before/after a change) can be
+diffed. See the individual modules for the environment variables they read.
+
+"""
@@ -0,0 +1,170 @@
+"""
+Needs simulation benchmark
+
+Creates N synthetic `PrimordialCharacter`s, registers them as online (the
+stand-in for connected sessions; `msg` is replaced by a counter so no
+output pipeline is involved) and drives `NeedsSystem` through the tick
+scheduler for a number of ticks. One tick is one full needs period, i.e.
+every scheduler slot of it, so every character is processed once.
+
+A share of the population starts out starving with low hp so the damage
+and death paths (`at_damage`, `at_death`, respawning) are exercised too.
+
+Per tick it records wall time, database queries, Attribute write
+statements, values written by the stats flush, messages sent and peak
+traced memory. Memory tracing slows everything down by a roughly constant
+factor, so compare wall times between runs, not against production.
+
+Environment:
+
+    OMA_BENCHMARK          set to anything to run the benchmarks
+    OMA_BENCHMARK_SIZES    population sizes, default "100,1000,10000"
+    OMA_BENCHMARK_TICKS    ticks per size, default 5
+    OMA_BENCHMARK_OUTPUT   JSON file to write, default "benchmark_needs.json"
+
+"""
+
+import json
+import os
+import platform
+import time
+import tracemalloc
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from evennia import create_object, create_script
+from evennia.utils import logger
+from evennia.utils.test_resources import BaseEvenniaTest
+
+from typeclasses.characters import PrimordialCharacter
+from typeclasses.rooms import ForestRoom
+from world import needs
+from world.online import ONLINE_CHARACTERS
+from world.spawns import SPAWN_POINTS
+from world.stats import flush_all
+from world.ticks import TICK_SCHEDULER
+
+SIZES = [
+    int(size) for size in os.environ.get("OMA_BENCHMARK_SIZES", "100,1000,10000").split(",")
+]
+TICKS = int(os.environ.get("OMA_BENCHMARK_TICKS", 5))
+OUTPUT = os.environ.get("OMA_BENCHMARK_OUTPUT", "benchmark_needs.json")
+
+# every STARVING_EVERY-th character starts starving, every DYING_EVERY-th
+# of those is also about to die
+STARVING_EVERY = 10
+DYING_EVERY = 5
+
+
+def _is_attribute_write(query):
+    sql = query["sql"].lstrip().upper()
+    return "TYPECLASSES_ATTRIBUTE" in sql and sql.startswith(("INSERT", "UPDATE", "DELETE"))
+
+
+@skipUnless(os.environ.get("OMA_BENCHMARK"), "set OMA_BENCHMARK=1 to run benchmarks")
+class NeedsBenchmark(BaseEvenniaTest):
+    """
+    Scaling of the needs tick with the online population.
+
+    """
+
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.results:
+            with open(OUTPUT, "w") as fil:
+                json.dump(
+                    {
+                        "benchmark": "needs",
+                        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": platform.python_version(),
+                        "numpy": needs.np is not None,
+                        "ticks": TICKS,
+                        "runs": cls.results,
+                    },
+                    fil,
+                    indent=2,
+                )
+
+    def setUp(self):
+        super().setUp()
+        ONLINE_CHARACTERS.clear()
+        SPAWN_POINTS.invalidate()
+        self.spawn = create_object(ForestRoom, key="Benchmark clearing")
+        self.spawn.set_spawn_point()
+        self.messages = 0
+        msg_patch = mock.patch.object(PrimordialCharacter, "msg", self._count_msg)
+        msg_patch.start()
+        self.addCleanup(msg_patch.stop)
+
+    def tearDown(self):
+        ONLINE_CHARACTERS.clear()
+        SPAWN_POINTS.invalidate()
+        TICK_SCHEDULER.unregister("needs")
+        super().tearDown()
+
+    def _count_msg(self, *args, **kwargs):
+        self.messages += 1
+
+    def _populate(self, size):
+        for num in range(size):
+            char = create_object(
+                PrimordialCharacter, key=f"Bench{num}", location=self.spawn, home=self.spawn
+            )
+            if num % STARVING_EVERY == 0:
+                char.stats.hunger = 0
+                if num % (STARVING_EVERY * DYING_EVERY) == 0:
+                    char.stats.current_hp = 1
+            ONLINE_CHARACTERS.add(char)
+        flush_all()
+
+    def _run_size(self, size):
+        from scripts.needs_system import NeedsSystem
+
+        self._populate(size)
+        system_script = create_script(NeedsSystem, key="bench_needs")
+        system = TICK_SCHEDULER.systems["needs"]
+        # one budget-free shard per slot, so a tick really covers everyone
+        system.budget = None
+        slots = TICK_SCHEDULER.shards(system)
+
+        ticks = []
+        for _ in range(TICKS):
+            self.messages = 0
+            tracemalloc.start()
+            start = time.perf_counter()
+            with CaptureQueriesContext(connection) as queries:
+                for _ in range(slots):
+                    TICK_SCHEDULER.run_slot()
+                values_written = flush_all()
+            duration = time.perf_counter() - start
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            ticks.append(
+                {
+                    "wall_ms": round(duration * 1000, 3),
+                    "queries": len(queries),
+                    "attribute_writes": sum(1 for query in queries if _is_attribute_write(query)),
+                    "values_flushed": values_written,
+                    "messages": self.messages,
+                    "peak_memory_kb": round(peak / 1024, 1),
+                }
+            )
+
+        system_script.delete()
+        summary = {
+            key: round(sum(tick[key] for tick in ticks) / len(ticks), 3) for key in ticks[0]
+        }
+        self.results.append({"size": size, "slots": slots, "mean": summary, "ticks": ticks})
+        logger.log_info(f"Benchmark needs x{size}: {summary}")
+
+    def test_needs_tick_scaling(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                self._run_size(size)
+                for char in ONLINE_CHARACTERS.all():
+                    char.delete()
+                ONLINE_CHARACTERS.clear()
@@ -0,0 +1,146 @@
+"""
+Region generation benchmark
+
+Generates procedural regions (`world.map.procgen`) of growing size and
+builds them with the map compiler. For every size it records:
+
+- generation: wall time and peak traced memory, also per 1000 rooms;
+- build: wall time and database queries of the first build into an empty
+  database, and of a rebuild with the same seed (which should change
+  nothing).
+
+Generation is run twice per size with the same seed to check it is
+deterministic. Memory tracing slows generation down by a roughly constant
+factor, so its time is measured in a separate, untraced run.
+
+Environment:
+
+    OMA_BENCHMARK          set to anything to run the benchmarks
+    OMA_BENCHMARK_ROOMS    region sizes in rooms, default "1000,10000"
+    OMA_BENCHMARK_BUILD    set to 0 to only benchmark generation
+    OMA_BENCHMARK_OUTPUT   JSON file to write, default "benchmark_procgen.json"
+
+"""
+
+import json
+import math
+import os
+import platform
+import time
+import tracemalloc
+from unittest import skipUnless
+
+from django.db import connection
+from evennia.utils import logger
+from evennia.utils.test_resources import BaseEvenniaTest
+
+from world.map.procgen import build_region, generate_region
+from world.spawns import SPAWN_POINTS
+
+SIZES = [int(size) for size in os.environ.get("OMA_BENCHMARK_ROOMS", "1000,10000").split(",")]
+BUILD = os.environ.get("OMA_BENCHMARK_BUILD", "1") != "0"
+OUTPUT = os.environ.get("OMA_BENCHMARK_OUTPUT", "benchmark_procgen.json")
+SEED = 1
+
+
+class _QueryCounter:
+    """
+    Counts queries; unlike `CaptureQueriesContext` it isn't capped at the
+    9000 queries Django keeps in its log.
+    """
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def _grid(size):
+    width = max(1, int(math.sqrt(size)))
+    return width, math.ceil(size / width)
+
+
+@skipUnless(os.environ.get("OMA_BENCHMARK"), "set OMA_BENCHMARK=1 to run benchmarks")
+class ProcgenBenchmark(BaseEvenniaTest):
+    """
+    Generation and build time of procedural regions.
+
+    """
+
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        if cls.results:
+            with open(OUTPUT, "w") as fil:
+                json.dump(
+                    {
+                        "benchmark": "procgen",
+                        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                        "python": platform.python_version(),
+                        "seed": SEED,
+                        "runs": cls.results,
+                    },
+                    fil,
+                    indent=2,
+                )
+
+    def setUp(self):
+        SPAWN_POINTS.invalidate()
+        super().setUp()
+
+    def tearDown(self):
+        SPAWN_POINTS.invalidate()
+        super().tearDown()
+
+    def _generate(self, width, height):
+        start = time.perf_counter()
+        rooms, exits = generate_region(SEED, width, height)
+        duration = time.perf_counter() - start
+
+        tracemalloc.start()
+        traced = generate_region(SEED, width, height)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        self.assertEqual((rooms, exits), traced, "generation is not deterministic")
+
+        per_1k = 1000 / len(rooms)
+        return rooms, exits, {
+            "rooms": len(rooms),
+            "exits": len(exits) * 2,
+            "wall_ms": round(duration * 1000, 3),
+            "wall_ms_per_1k_rooms": round(duration * 1000 * per_1k, 3),
+            "peak_memory_kb": round(peak / 1024, 1),
+            "peak_memory_kb_per_1k_rooms": round(peak / 1024 * per_1k, 1),
+        }
+
+    def _build(self, map_tag, width, height):
+        result = {}
+        for run in ("build", "rebuild"):
+            queries = _QueryCounter()
+            start = time.perf_counter()
+            with connection.execute_wrapper(queries):
+                report = build_region(map_tag, SEED, width, height)
+            duration = time.perf_counter() - start
+            result[run] = {
+                "wall_ms": round(duration * 1000, 3),
+                "queries": queries.count,
+                "created": report.created,
+                "unchanged": report.unchanged,
+            }
+        self.assertEqual(result["rebuild"]["created"], 0)
+        return result
+
+    def test_region_scaling(self):
+        for size in SIZES:
+            with self.subTest(size=size):
+                width, height = _grid(size)
+                rooms, exits, generation = self._generate(width, height)
+                run = {"size": size, "width": width, "height": height, "generate": generation}
+                if BUILD:
+                    run.update(self._build(f"bench_region_{size}", width, height))
+                self.results.append(run)
+                logger.log_info(f"Benchmark procgen x{size}: {run}")
@@ -0,0 +1,105 @@
+"""
+Combat commands
+
+Thin wrappers around the combat engine in `world.combat`, which does the
+actual fighting.
+
+"""
+
+import random
+
+from commands.command import Command
+from world.combat import COMBAT
+
+FLEE_STAMINA_COST = 10
+FLEE_BASE_CHANCE = 0.5
+FLEE_CHANCE_PER_AGILITY = 0.05
+
+
+class CmdAttack(Command):
+    """
+    Attack someone.
+
+    Usage:
+      attack <target>
+
+    You keep attacking your target automatically, at your attack speed,
+    until one of you dies, flees or leaves. Attacking someone else while
+    fighting switches your target.
+    """
+
+    key = "attack"
+    aliases = ["kill", "攻击"]
+    locks = "cmd:all()"
+    help_category = "Combat"
+
+    def func(self):
+        caller = self.caller
+        if not self.args.strip():
+            caller.msg("你要攻击谁？")
+            return
+        target = caller.search(self.args.strip())
+        if not target:
+            return
+        if target == caller:
+            caller.msg("你不能攻击自己。")
+            return
+        if not hasattr(target, "stats") or not target.attributes.has("current_hp"):
+            caller.msg(f"你无法攻击 {target.key}。")
+            return
+        if COMBAT.target_of(caller) == target:
+            caller.msg(f"你已经在攻击 {target.key} 了。")
+            return
+
+        COMBAT.engage(caller, target)
+        caller.msg(f"你向 {target.key} 发起了攻击！")
+        target.msg(f"{caller.key} 向你发起了攻击！")
+        caller.location.msg_contents(
+            f"{caller.key} 向 {target.key} 发起了攻击！", exclude=[caller, target]
+        )
+
+
+class CmdFlee(Command):
+    """
+    Try to escape from combat.
+
+    Usage:
+      flee
+
+    Costs stamina whether it works or not. The quicker you are compared to
+    your opponent, the better your chances. If you get away you run off
+    through a random exit.
+    """
+
+    key = "flee"
+    aliases = ["逃跑"]
+    locks = "cmd:all()"
+    help_category = "Combat"
+
+    def func(self):
+        caller = self.caller
+        if not COMBAT.is_fighting(caller):
+            caller.msg("你现在没有在战斗。")
+            return
+        if caller.stats.stamina < FLEE_STAMINA_COST:
+            caller.msg("你精疲力尽，根本跑不动！")
+            return
+        caller.stats.stamina -= FLEE_STAMINA_COST
+
+        opponent = COMBAT.target_of(caller)
+        agility = caller.attributes.get("agility", default=0) or 0
+        opponent_agility = 0
+        if opponent:
+            opponent_agility = opponent.attributes.get("agility", default=0) or 0
+        chance = FLEE_BASE_CHANCE + (agility - opponent_agility) * FLEE_CHANCE_PER_AGILITY
+        if random.random() >= chance:
+            caller.msg("你试图逃跑，但是没能脱身！")
+            return
+
+        COMBAT.disengage(caller)
+        exits = [exi for exi in caller.location.exits if exi.access(caller, "traverse")]
+        caller.msg("你成功脱离了战斗！")
+        if exits:
+            caller.location.msg_contents(f"{caller.key} 仓皇逃跑了！", exclude=[caller])
+            exit_obj = random.choice(exits)
+            exit_obj.at_traverse(caller, exit_obj.destination)
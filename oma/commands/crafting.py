@@ -0,0 +1,100 @@
+"""
+Crafting commands
+
+Thin wrapper around the crafting engine in `world.crafting`.
+
+"""
+
+from collections import Counter
+
+from commands.command import Command
+from world.crafting import CRAFTING
+
+
+class CmdCraft(Command):
+    """
+    Make something from what you carry.
+
+    Usage:
+      craft
+      craft <recipe>
+      craft <item> + <item> [+ ...]
+
+    Without arguments, lists what you can make right now. With a recipe
+    name (like 石刀), makes it. Naming items joined by "+" tries to make
+    whatever exactly those items make, e.g. "craft 木柴 + 木柴".
+    """
+
+    key = "craft"
+    aliases = ["制作"]
+    locks = "cmd:all()"
+    help_category = "Survival"
+
+    def _names(self, counts):
+        return "、".join(
+            f"{CRAFTING.display_name(key)}×{count}" if count > 1 else CRAFTING.display_name(key)
+            for key, count in counts.items()
+        )
+
+    def list_craftable(self, inventory):
+        caller = self.caller
+        recipes = CRAFTING.craftable(caller, inventory)
+        if not recipes:
+            caller.msg("你手头的东西还做不出什么。")
+            return
+        lines = ["你现在可以制作："]
+        for recipe in recipes:
+            lines.append(f"  {recipe.name}  （{self._names(recipe.ingredients)}）")
+        caller.msg("\n".join(lines))
+
+    def match_items(self, names, inventory):
+        """
+        Find the recipe made from exactly the named items held.
+        """
+        by_name = {}
+        for key, objects in inventory.items():
+            for obj in objects:
+                by_name.setdefault(obj.key, key)
+        counts = Counter()
+        for name in names:
+            key = by_name.get(name)
+            if key is None:
+                self.caller.msg(f"你身上没有{name}。")
+                return None
+            counts[key] += 1
+        recipe = CRAFTING.match(counts)
+        if recipe is None:
+            self.caller.msg("这些东西凑在一起做不出什么。")
+        return recipe
+
+    def func(self):
+        caller = self.caller
+        inventory = CRAFTING.inventory(caller)
+        args = self.args.strip()
+        if not args:
+            self.list_craftable(inventory)
+            return
+
+        if "+" in args:
+            names = [name.strip() for name in args.split("+") if name.strip()]
+            recipe = self.match_items(names, inventory)
+            if recipe is None:
+                return
+        else:
+            recipe = CRAFTING.recipe(args)
+            if recipe is None:
+                caller.msg(f"你不知道怎么做{args}。")
+                return
+
+        missing = CRAFTING.missing(caller, recipe, inventory)
+        if missing:
+            caller.msg(f"要做{recipe.name}，你还缺：{self._names(missing)}。")
+            return
+        if recipe.in_room and not caller.location:
+            caller.msg(f"这里没法做{recipe.name}。")
+            return
+
+        product = CRAFTING.craft(caller, recipe, inventory)
+        caller.msg(f"你做出了{product.key}。")
+        if caller.location:
+            caller.location.msg_contents(f"{caller.key}做出了{product.key}。", exclude=caller)
@@ -16,6 +16,12 @@ own cmdsets by inheriting from them or directly from `evennia.CmdSet`.
 
 from evennia import default_cmds
 
+from commands.combat import CmdAttack, CmdFlee
+from commands.crafting import CmdCraft
+from commands.gathering import CmdChopWood, CmdForage, CmdMineFlint
+from commands.inventory import CmdDrop, CmdGet, CmdGive
+from commands.skills import CmdUseSkill
+
 
 class CharacterCmdSet(default_cmds.CharacterCmdSet):
     """
@@ -34,6 +40,16 @@ class CharacterCmdSet(default_cmds.CharacterCmdSet):
         #
         # any commands you add below will overload the default ones.
         #
+        self.add(CmdAttack())
+        self.add(CmdFlee())
+        self.add(CmdUseSkill())
+        self.add(CmdForage())
+        self.add(CmdChopWood())
+        self.add(CmdMineFlint())
+        self.add(CmdCraft())
+        self.add(CmdGet())
+        self.add(CmdDrop())
+        self.add(CmdGive())
 
 
 class AccountCmdSet(default_cmds.AccountCmdSet):
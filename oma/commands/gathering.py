@@ -0,0 +1,99 @@
+"""
+Gathering commands
+
+Foraging, chopping and mining take units from the room's resource nodes
+(`world.resources`) and turn each into an item, added to the gatherer's
+stack of them.
+
+"""
+
+from commands.command import Command
+from world.combat import COMBAT
+from world.items import add_items
+from world.resources import RESOURCE_TYPES, RESOURCES
+
+
+class GatherCommand(Command):
+    """
+    Base for commands gathering one resource type.
+    """
+
+    # key of `RESOURCE_TYPES`
+    resource = None
+    # what gathering is called in messages
+    verb = ""
+    locks = "cmd:all()"
+    help_category = "Survival"
+
+    def func(self):
+        caller = self.caller
+        room = caller.location
+        resource = RESOURCE_TYPES[self.resource]
+        if not room or not RESOURCES.has(room, self.resource):
+            caller.msg(f"这里没有{resource.name}可以{self.verb}。")
+            return
+        if COMBAT.is_fighting(caller):
+            caller.msg("你正在战斗，没空分心。")
+            return
+        if caller.stats.stamina < resource.stamina:
+            caller.msg(f"你太累了，没有力气{self.verb}。")
+            return
+        if not RESOURCES.consume(room, self.resource):
+            caller.msg(resource.depleted)
+            return
+
+        caller.stats.stamina -= resource.stamina
+        item = add_items(caller, resource.prototype)[0]
+        caller.msg(f"你{self.verb}到了{item.key}。")
+        room.msg_contents(f"{caller.key}{self.verb}到了{item.key}。", exclude=caller)
+
+
+class CmdForage(GatherCommand):
+    """
+    Forage for something edible.
+
+    Usage:
+      forage
+
+    Picks wild berries and other edible plants where the forest offers
+    them. Each place only has so much; it grows back after a while.
+    """
+
+    key = "forage"
+    aliases = ["采集"]
+    resource = "forage"
+    verb = "采集"
+
+
+class CmdChopWood(GatherCommand):
+    """
+    Chop firewood.
+
+    Usage:
+      chop
+
+    Cuts a piece of wood where there are trees to cut. The trees only
+    give so much at a time and need a while to give more.
+    """
+
+    key = "chop"
+    aliases = ["砍柴"]
+    resource = "wood"
+    verb = "砍"
+
+
+class CmdMineFlint(GatherCommand):
+    """
+    Look for flint.
+
+    Usage:
+      mine
+
+    Breaks a flint stone out of the rocks where there are any. Flint is
+    scarce and takes a long time to turn up again.
+    """
+
+    key = "mine"
+    aliases = ["采石"]
+    resource = "flint"
+    verb = "采"
@@ -0,0 +1,174 @@
+"""
+Inventory commands
+
+Evennia's `get`, `drop` and `give`, taught about stacks
+(`typeclasses.objects.StackableObject`). Naming a stack moves all of it;
+putting a count first moves just that many items off it, e.g.
+`give 3 木柴 to Ada`. Either way the items join the stack of the same
+items where they end up. Anything that isn't a stack is handled by the
+default commands as before.
+
+"""
+
+from evennia import default_cmds
+
+from world.items import is_stackable
+
+
+class StackCommand:
+    """
+    Mixin for the inventory commands, used with Evennia's
+    `NumberedTargetCommand` (which parses the count into `self.number`).
+    """
+
+    # shown when asking for more items than the stack holds
+    too_few_string = "你只有{quantity}个{name}。"
+
+    def find_stack(self, name, location):
+        """
+        Returns:
+            StackableObject or None: The stack, if `name` matches exactly one
+                object in `location` and it's a stack. Nothing is reported to
+                the caller, so the default command can take over otherwise.
+
+        """
+        if not name:
+            return None
+        matches = self.caller.search(name, location=location, quiet=True)
+        if len(matches) == 1 and is_stackable(matches[0]):
+            return matches[0]
+        return None
+
+    def stack_count(self, stack):
+        """
+        Returns:
+            int or None: How many items to move, or None (after telling the
+                caller) if the stack doesn't have that many.
+
+        """
+        quantity = stack.quantity
+        count = self.number or quantity
+        if count > quantity:
+            self.msg(self.too_few_string.format(quantity=quantity, name=stack.key))
+            return None
+        return count
+
+    def stack_name(self, stack, count):
+        return f"{stack.key}×{count}" if count > 1 else stack.key
+
+
+class CmdGet(StackCommand, default_cmds.CmdGet):
+    """
+    pick up something
+
+    Usage:
+      get <obj>
+      get <count> <obj>
+
+    Picks up an object from your location and puts it in your inventory.
+    With a count, picks up that many of a pile of things, like
+    "get 3 木柴"; without one, the whole pile.
+    """
+
+    too_few_string = "这里只有{quantity}个{name}。"
+
+    def func(self):
+        caller = self.caller
+        stack = self.find_stack(self.args, caller.location)
+        if not stack:
+            super().func()
+            return
+        if not stack.access(caller, "get"):
+            self.msg(stack.db.get_err_msg or "你拿不了这个。")
+            return
+        if not stack.at_pre_get(caller):
+            return
+        count = self.stack_count(stack)
+        if not count:
+            return
+
+        moved = stack.split(count, caller, move_type="get")
+        if not moved:
+            self.msg("这个捡不起来。")
+            return
+        moved.at_get(caller)
+        name = self.stack_name(stack, count)
+        caller.msg(f"你捡起了{name}。")
+        caller.location.msg_contents(f"{caller.key}捡起了{name}。", exclude=caller)
+
+
+class CmdDrop(StackCommand, default_cmds.CmdDrop):
+    """
+    drop something
+
+    Usage:
+      drop <obj>
+      drop <count> <obj>
+
+    Lets you drop an object from your inventory into the
+    location you are currently in. With a count, drops that many of
+    a pile of things, like "drop 3 木柴"; without one, the whole pile.
+    """
+
+    def func(self):
+        caller = self.caller
+        stack = self.find_stack(self.args, caller)
+        if not stack:
+            super().func()
+            return
+        if not stack.at_pre_drop(caller):
+            return
+        count = self.stack_count(stack)
+        if not count:
+            return
+
+        moved = stack.split(count, caller.location, move_type="drop")
+        if not moved:
+            self.msg("这个丢不下。")
+            return
+        moved.at_drop(caller)
+        name = self.stack_name(stack, count)
+        caller.msg(f"你丢下了{name}。")
+        caller.location.msg_contents(f"{caller.key}丢下了{name}。", exclude=caller)
+
+
+class CmdGive(StackCommand, default_cmds.CmdGive):
+    """
+    give away something to someone
+
+    Usage:
+      give <inventory obj> <to||=> <target>
+      give <count> <inventory obj> <to||=> <target>
+
+    Gives an item from your inventory to another person,
+    placing it in their inventory. With a count, gives that many of
+    a pile of things, like "give 3 木柴 to Ada"; without one, the
+    whole pile.
+    """
+
+    def func(self):
+        caller = self.caller
+        stack = self.find_stack(self.lhs, caller) if self.rhs else None
+        if not stack:
+            super().func()
+            return
+        target = caller.search(self.rhs)
+        if not target:
+            return
+        count = self.stack_count(stack)
+        if not count:
+            return
+        name = self.stack_name(stack, count)
+        if target == caller:
+            caller.msg(f"你把{name}留在了自己身上。")
+            return
+        if not stack.at_pre_give(caller, target):
+            return
+
+        moved = stack.split(count, target, move_type="give")
+        if not moved:
+            caller.msg(f"你没能把这个交给{target.get_display_name(caller)}。")
+            return
+        moved.at_give(caller, target)
+        caller.msg(f"你把{name}交给了{target.get_display_name(caller)}。")
+        target.msg(f"{caller.get_display_name(target)}把{name}交给了你。")
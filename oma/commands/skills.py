@@ -0,0 +1,84 @@
+"""
+Skill commands
+
+"""
+
+from commands.command import Command
+from world.combat import COMBAT
+from world.cooldowns import COOLDOWNS
+from world.skills import SKILLS
+
+
+class CmdUseSkill(Command):
+    """
+    Use a skill.
+
+    Usage:
+      skill <skill> [= <target>]
+
+    Attack skills hit your target (or whoever you are fighting) right away;
+    healing skills heal you. Skills cost stamina and need time to recover
+    before they can be used again. Use "skill" alone to list your skills.
+    """
+
+    key = "skill"
+    aliases = ["技能"]
+    locks = "cmd:all()"
+    help_category = "Combat"
+
+    def list_skills(self):
+        caller = self.caller
+        lines = ["你的技能："]
+        for name, skill in SKILLS.items():
+            remaining = COOLDOWNS.remaining(caller, name)
+            state = f"冷却中（{remaining:.1f} 秒）" if remaining else "可用"
+            lines.append(f"  {name}  精力 {skill['cost_stamina']}  {state}")
+        caller.msg("\n".join(lines))
+
+    def func(self):
+        caller = self.caller
+        name, _, target_name = self.args.partition("=")
+        name, target_name = name.strip(), target_name.strip()
+        if not name:
+            self.list_skills()
+            return
+        skill = SKILLS.get(name)
+        if not skill:
+            caller.msg(f"你不会 {name} 这个技能。")
+            return
+
+        target = None
+        if skill["type"] == "attack":
+            if target_name:
+                target = caller.search(target_name)
+                if not target:
+                    return
+            else:
+                target = COMBAT.target_of(caller)
+            if not target or target == caller:
+                caller.msg(f"你要对谁使用{name}？")
+                return
+            if not hasattr(target, "stats") or not target.attributes.has("current_hp"):
+                caller.msg(f"你无法攻击 {target.key}。")
+                return
+            if not COMBAT.can_hit(caller, target):
+                caller.msg(f"{target.key} 不在你的攻击范围内。")
+                return
+
+        remaining = COOLDOWNS.remaining(caller, name)
+        if remaining:
+            caller.msg(f"{name} 还需要 {remaining:.1f} 秒才能再次使用。")
+            return
+        if caller.stats.stamina < skill["cost_stamina"]:
+            caller.msg(f"你的精力不足以使用{name}。")
+            return
+
+        caller.stats.stamina -= skill["cost_stamina"]
+        COOLDOWNS.arm(caller, name, skill["cooldown"])
+        if skill["type"] == "attack":
+            COMBAT.strike(caller, target, multiplier=skill["damage_multiplier"], action=name)
+        elif skill["type"] == "heal":
+            max_hp = caller.attributes.get("max_hp", default=caller.stats.current_hp)
+            healed = max(0, min(skill["heal_amount"], max_hp - caller.stats.current_hp))
+            caller.stats.current_hp += healed
+            caller.msg(f"你使用了{name}，恢复了 {healed} 点生命。")
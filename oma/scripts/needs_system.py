@@ -1,11 +1,59 @@
+import time
+
+from django.conf import settings
 from evennia.scripts.scripts import DefaultScript
-from evennia.utils import logger
-import time # Import time for timestamping logs
+
+from world.gamelog import get_logger
+from world.needs import (
+    CHILLY,
+    DEPLETED,
+    EXHAUSTED,
+    FREEZING,
+    HOT,
+    LOW,
+    NEEDS,
+    NORMAL,
+    NeedsEngine,
+)
+from world.online import ONLINE_CHARACTERS
+from world.ticks import TICK_SCHEDULER
+
+log = get_logger("needs")
+
+# need -> state -> what the character is told on entering that state
+NEED_MESSAGES = {
+    "hunger": {
+        NORMAL: "你不再感到饥饿了。",
+        LOW: "你的肚子咕咕叫，你非常饿。",
+        DEPLETED: "你感到极度饥饿，胃里传来阵阵绞痛！",
+    },
+    "thirst": {
+        NORMAL: "你不再口渴了。",
+        LOW: "你口干舌燥，非常渴。",
+        DEPLETED: "你感到喉咙快要烧起来了，极度干渴！",
+    },
+    "stamina": {
+        NORMAL: "你的体力渐渐恢复了。",
+        EXHAUSTED: "你感到筋疲力尽，连动一根手指的力气都没有了。",
+    },
+    "temperature": {
+        NORMAL: "你的体温恢复了正常。",
+        CHILLY: "你觉得有点冷。",
+        FREEZING: "你感到非常寒冷，身体开始颤抖。",
+        HOT: "你觉得有些热得不舒服。",
+    },
+}
 
 class NeedsSystem(DefaultScript):
     """
     Manages the basic needs of characters, such as hunger, thirst, and temperature.
     This script is intended to be run globally and affect all PrimordialCharacters.
+    The numbers are crunched by `world.needs.NeedsEngine`; this script feeds it
+    the online population and turns its results into messages and damage.
+
+    The script has no timer of its own. It registers with the shared tick
+    scheduler (`world.ticks`), which hands it one shard of the online
+    characters per slot so every character is still updated once a minute.
     """
 
     def at_script_creation(self):
@@ -14,90 +62,100 @@ class NeedsSystem(DefaultScript):
         """
         self.key = "NeedsSystem_Global" # Default key if started via @script
         self.desc = "Manages character needs globally."
-        # self.interval will be overridden by GLOBAL_SCRIPTS setting if started that way
-        self.interval = 60  # Update needs every 60 seconds (1 minute)
+        # Timing is handled by the tick scheduler, see register()
         self.persistent = True # Persist this script through server reboots
+        self.register()
 
-    def at_repeat(self):
+    @property
+    def engine(self):
         """
-        Called every `self.interval` seconds.
-        This is where the main logic for updating needs will go.
+        The in-memory needs engine, created on first use. It lives on
+        `ndb` and is rebuilt from the characters' stats after a reload.
         """
-        logger.log_infomsg(f"NeedsSystem: at_repeat called at {time.time()}")
-        # Import here to avoid circular dependencies at load time
-        from typeclasses.characters import PrimordialCharacter
-
-        characters = PrimordialCharacter.objects.all()
-        online_characters = [char for char in characters if char.has_account and char.account.is_connected]
-        
-        logger.log_infomsg(f"NeedsSystem: Found {len(online_characters)} online PrimordialCharacters.")
-
-        for char in online_characters:
-            original_hunger = char.db.hunger
-            logger.log_infomsg(f"NeedsSystem: Processing character {char.key} (ID: {char.id}). Current hunger: {original_hunger}")
+        engine = self.ndb.engine
+        if engine is None:
+            engine = NeedsEngine(
+                reminder_interval=getattr(settings, "NEEDS_REMINDER_INTERVAL", 300)
+            )
+            self.ndb.engine = engine
+        return engine
 
-            # --- Hunger --- 
-            char.db.hunger = max(0, char.db.hunger - 1)
-            logger.log_infomsg(f"NeedsSystem: Character {char.key} new hunger: {char.db.hunger}")
-            
-            if char.db.hunger <= 0:
-                char.msg("你感到极度饥饿，胃里传来阵阵绞痛！")
-                char.at_damage(1, attacker=None)
-            elif char.db.hunger < 25:
-                char.msg("你的肚子咕咕叫，你非常饿。")
-
-            # --- Thirst ---
-            original_thirst = char.db.thirst
-            logger.log_infomsg(f"NeedsSystem: Character {char.key} current thirst: {original_thirst}")
-            char.db.thirst = max(0, char.db.thirst - 2)
-            logger.log_infomsg(f"NeedsSystem: Character {char.key} new thirst: {char.db.thirst}")
-
-            if char.db.thirst <= 0:
-                char.msg("你感到喉咙快要烧起来了，极度干渴！")
-                char.at_damage(1, attacker=None)
-            elif char.db.thirst < 25:
-                char.msg("你口干舌燥，非常渴。")
-
-            # --- Stamina/Energy ---
-            original_stamina = char.db.stamina
-            # Stamina regeneration
-            if not char.db.is_in_combat and char.db.hunger > 10 and char.db.thirst > 10:
-                char.db.stamina = min(100, char.db.stamina + 5)
-            # Stamina drain from extreme conditions
-            if char.db.hunger < 10 or char.db.thirst < 10:
-                char.db.stamina = max(0, char.db.stamina - 2)
-                if char.db.stamina == 0:
-                    char.msg("你感到筋疲力尽，连动一根手指的力气都没有了。")
-            if char.db.stamina != original_stamina: # Log only if changed
-                 logger.log_infomsg(f"NeedsSystem: Character {char.key} new stamina: {char.db.stamina}")
+    def at_tick(self, characters):
+        """
+        Called by the tick scheduler with the shard of online characters due
+        this slot. Advances their needs in one batched step and then applies
+        the damage it reports.
 
+        Characters are only messaged when one of their needs changes state
+        (or, every `settings.NEEDS_REMINDER_INTERVAL` seconds, while they
+        stay in a bad state) or when they take damage, and everything one character is told in a
+        tick goes out as a single message.
+        """
+        start = time.perf_counter()
+        engine = self.engine
+        # characters join the engine when their shard comes up; those gone
+        # offline are dropped once per rotation, not with a pass every slot
+        engine.add(*characters)
+        system = TICK_SCHEDULER.systems.get("needs")
+        slots = (self.ndb.slots or 0) + 1
+        if system is None or slots >= TICK_SCHEDULER.shards(system):
+            engine.sync(ONLINE_CHARACTERS.all())
+            slots = 0
+        self.ndb.slots = slots
+        rows = [engine.rows[char.id] for char in characters if char.id in engine.rows]
+        result = engine.step(rows)
 
-            # --- Temperature (Simplified) ---
-            original_temp = char.db.temperature
-            current_temp_effect = -0.1 
-            char.db.temperature += current_temp_effect
-            char.db.temperature = round(char.db.temperature, 1)
-            if char.db.temperature != original_temp: # Log only if changed
-                logger.log_infomsg(f"NeedsSystem: Character {char.key} new temperature: {char.db.temperature}")
+        messages = 0
+        damage_events = 0
+        for index, row in enumerate(result.rows):
+            char = engine.characters[row]
+            remind = result.remind[index]
+            lines = [
+                NEED_MESSAGES[need][int(result.states[need][index])]
+                for need in NEEDS
+                if result.changed[need][index]
+                or (remind and result.states[need][index] != NORMAL)
+            ]
+            damage = int(result.damage[index])
+            if damage:
+                damage_events += damage
+                lines.append(f"你受到了 {damage} 点伤害！")
+            if lines:
+                char.msg("\n".join(line for line in lines if line))
+                messages += 1
+            if damage:
+                char.at_damage(damage, attacker=None, quiet=True)
 
+        log.summary(
+            "tick",
+            processed=len(rows),
+            online=len(engine),
+            messages=messages,
+            damage_events=damage_events,
+            crossed=int(sum(result.crossed)),
+            duration_ms=round((time.perf_counter() - start) * 1000, 2),
+        )
 
-            if char.db.temperature < 35.0:
-                char.msg("你感到非常寒冷，身体开始颤抖。")
-                char.at_damage(1, attacker=None) # Take 1 damage from cold
-            elif char.db.temperature < 36.0:
-                char.msg("你觉得有点冷。")
-            elif char.db.temperature > 38.5:
-                char.msg("你觉得有些热得不舒服。")
+    def register(self):
+        """
+        Register this system's tick with the shared tick scheduler.
+        """
+        system = TICK_SCHEDULER.register(
+            "needs", self.at_tick, period=60, population=ONLINE_CHARACTERS.all
+        )
+        log.info("NeedsSystem %s registered.", self.dbref, period=system.period, budget=system.budget)
 
-    def at_start(self):
+    def at_server_start(self):
         """
-        Called when the script is started or the server reloads.
+        Called after every server start or reload. The scheduler is in-memory
+        only, so the system has to register again each time.
         """
-        # Log the interval the script believes it's running at.
-        logger.log_infomsg(f"NeedsSystem (ID: {self.id}, DBRef: {self.dbref}, Key: {self.key}) started. Interval: {self.interval}s. Persistent: {self.persistent}.")
+        self.register()
 
-    def at_stop(self):
+    def at_script_delete(self):
         """
-        Called when the script is stopped or the server unloads it.
+        Called when the script is deleted.
         """
-        logger.log_infomsg(f"NeedsSystem (ID: {self.id}, DBRef: {self.dbref}, Key: {self.key}) stopped.")
+        TICK_SCHEDULER.unregister("needs")
+        log.info("NeedsSystem %s stopped.", self.dbref)
+        return True
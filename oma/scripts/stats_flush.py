@@ -0,0 +1,26 @@
+from evennia.scripts.scripts import DefaultScript
+
+from world.stats import flush_all
+
+
+class StatsFlushScript(DefaultScript):
+    """
+    Periodically writes the stats that characters changed in memory (see
+    `world.stats.StatHandler`) to the database in one transaction.
+    """
+
+    def at_script_creation(self):
+        """
+        Called when the script is first created.
+        """
+        self.key = "StatsFlush_Global"
+        self.desc = "Writes pending character stat changes."
+        # self.interval will be overridden by GLOBAL_SCRIPTS setting if started that way
+        self.interval = 30
+        self.persistent = True
+
+    def at_repeat(self):
+        """
+        Called every `self.interval` seconds.
+        """
+        flush_all()
@@ -0,0 +1,26 @@
+from evennia.scripts.scripts import DefaultScript
+
+from world.ticks import TICK_SCHEDULER
+
+
+class TickSchedulerScript(DefaultScript):
+    """
+    Drives `world.ticks.TICK_SCHEDULER`: every `interval` seconds (one slot)
+    it runs the due shard of every registered periodic system.
+    """
+
+    def at_script_creation(self):
+        """
+        Called when the script is first created.
+        """
+        self.key = "TickScheduler_Global"
+        self.desc = "Runs sharded periodic game systems."
+        # self.interval will be overridden by GLOBAL_SCRIPTS setting if started that way
+        self.interval = 5
+        self.persistent = True
+
+    def at_repeat(self):
+        """
+        Called every `self.interval` seconds.
+        """
+        TICK_SCHEDULER.run_slot()
@@ -17,6 +17,15 @@ at_server_cold_stop()
 
 """
 
+from world.ai import MONSTER_AI
+from world.combat import COMBAT
+from world.crafting import CRAFTING
+from world.online import ONLINE_CHARACTERS
+from world.pathfinding import ROOM_GRAPH
+from world.resources import RESOURCES
+from world.stats import flush_all
+from world.wilderness import WILDERNESS
+
 
 def at_server_init():
     """
@@ -30,7 +39,12 @@ def at_server_start():
     This is called every time the server starts up, regardless of
     how it was shut down.
     """
-    pass
+    ONLINE_CHARACTERS.rebuild()
+    WILDERNESS.load()
+    ROOM_GRAPH.load()
+    MONSTER_AI.load()
+    RESOURCES.load()
+    CRAFTING.compile()
 
 
 def at_server_stop():
@@ -45,14 +59,17 @@ def at_server_reload_start():
     """
     This is called only when server starts back up after a reload.
     """
-    pass
+    # resume the fights that were going on when the reload started
+    COMBAT.load_snapshot()
 
 
 def at_server_reload_stop():
     """
     This is called only time the server stops before a reload.
     """
-    pass
+    # keep ongoing fights, then write character stats still held in memory
+    COMBAT.save_snapshot()
+    flush_all()
 
 
 def at_server_cold_start():
@@ -68,4 +85,5 @@ def at_server_cold_stop():
     This is called only when the server goes down due to a shutdown or
     reset.
     """
-    pass
+    COMBAT.disengage_all()
+    flush_all()
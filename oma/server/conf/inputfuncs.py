@@ -26,6 +26,50 @@ as argument.
 
 """
 
+
+def char_vitals(session, *args, **kwargs):
+    """
+    Subscribe to (or unsubscribe from) pushes of the puppet's hp and needs,
+    sent back as `char_vitals` (GMCP `Char.Vitals`), see `world.vitals`.
+
+        Char.Vitals                          -> subscribe
+        Char.Vitals {"interval": 2}          -> subscribe, at most every 2s
+        Char.Vitals "off"                    -> unsubscribe
+        Char.Vitals {"subscribe": false}     -> unsubscribe
+        Char.Vitals "get"                    -> send all fields once
+
+    Keyword Args:
+        subscribe (bool): Subscribe (default) or unsubscribe.
+        interval (float): Minimum seconds between pushes, no less than
+            `settings.VITALS_MIN_INTERVAL`.
+        get (bool): Only send the current values, once.
+
+    """
+    from world.vitals import OUTPUTFUNC, VITALS, snapshot
+
+    args = [str(arg).lower() for arg in args]
+    if "get" in args or kwargs.get("get"):
+        puppet = session.puppet
+        if puppet is not None and getattr(puppet, "stats", None) is not None:
+            session.msg(**{OUTPUTFUNC: snapshot(puppet)})
+        return
+
+    subscribe = kwargs.get("subscribe", "off" not in args)
+    if isinstance(subscribe, str):
+        subscribe = subscribe.lower() in ("true", "on", "1")
+    if not subscribe:
+        VITALS.unsubscribe(session)
+        session.update_flags(VITALS=None)
+        return
+
+    try:
+        interval = float(kwargs["interval"]) if "interval" in kwargs else None
+    except (TypeError, ValueError):
+        interval = None
+    interval = VITALS.subscribe(session, interval)
+    session.update_flags(VITALS=interval)
+
+
 # def oob_echo(session, *args, **kwargs):
 #     """
 #     Example echo function. Echoes args, kwargs sent to it.
@@ -21,7 +21,12 @@ settings file:
 
 """
 
+from django.conf import settings
 from evennia.server.serversession import ServerSession as BaseServerSession
+from twisted.internet import reactor
+
+from world.online import CHARACTER_TYPECLASS, ONLINE_CHARACTERS
+from world.vitals import VITALS
 
 
 class ServerSession(BaseServerSession):
@@ -32,6 +37,136 @@ class ServerSession(BaseServerSession):
     Each account gets one or more sessions assigned to them whenever they connect
     to the game server. All communication between game and account goes
     through their session(s).
+
+    Outgoing text is buffered for `settings.SESSION_OUTPUT_FRAME` seconds
+    and sent as one payload, so a player getting dozens of lines a second
+    (ticks, combat, room messages) costs one AMP message and one socket
+    write per frame instead of one per line. Texts are only merged with
+    others of the same kind (same text kwargs and options); anything else
+    (OOB commands, prompts, raw text) first sends what is buffered and then
+    goes out right away, so nothing is reordered.
+
+    Replies to the session's own input are sent as soon as the command is
+    done, not a frame later, and `options={"flush": True}` sends a text
+    immediately.
     """
 
-    pass
+    # [text kwargs, options, [texts]] waiting to be sent
+    _output = None
+    _output_timer = None
+    # set while handling the session's own input
+    _replying = False
+
+    @property
+    def output_frame(self):
+        """
+        Seconds outgoing text is held back to be merged; 0 sends at once.
+        """
+        return getattr(settings, "SESSION_OUTPUT_FRAME", 0.05)
+
+    @staticmethod
+    def _bufferable(kwargs, options):
+        """
+        Returns:
+            tuple or None: `(text, text kwargs)` if this send is plain text
+                that can wait and be merged with others.
+
+        """
+        if len(kwargs) != 1 + ("options" in kwargs):
+            return None
+        if options.get("raw") or options.get("send_prompt"):
+            return None
+        text = kwargs.get("text")
+        if isinstance(text, str):
+            return text, {}
+        if (
+            isinstance(text, (tuple, list))
+            and len(text) == 2
+            and isinstance(text[0], str)
+            and isinstance(text[1], dict)
+        ):
+            return text[0], text[1]
+        return None
+
+    def data_out(self, **kwargs):
+        """
+        Buffer outgoing text, see the class docstring. Everything else is
+        sent on right away, after the buffered text.
+        """
+        options = kwargs.get("options") or {}
+        if options.get("flush"):
+            kwargs["options"] = {key: value for key, value in options.items() if key != "flush"}
+            self.flush_output()
+            self.sessionhandler.data_out(self, **kwargs)
+            return
+
+        frame = self.output_frame
+        entry = self._bufferable(kwargs, options) if frame > 0 else None
+        if entry is None:
+            self.flush_output()
+            self.sessionhandler.data_out(self, **kwargs)
+            return
+
+        text, text_kwargs = entry
+        output = self._output
+        if output and (output[0] != text_kwargs or output[1] != options):
+            self.flush_output()
+            output = None
+        if output is None:
+            output = self._output = [dict(text_kwargs), dict(options), []]
+            if not self._replying:
+                self._output_timer = reactor.callLater(frame, self.flush_output)
+        output[2].append(text)
+
+    def flush_output(self):
+        """
+        Send the buffered text now, as one payload.
+        """
+        timer, self._output_timer = self._output_timer, None
+        if timer is not None and timer.active():
+            timer.cancel()
+        output, self._output = self._output, None
+        if not output:
+            return
+        text_kwargs, options, texts = output
+        text = "\n".join(texts)
+        kwargs = {"text": (text, text_kwargs) if text_kwargs else text}
+        if options:
+            kwargs["options"] = options
+        self.sessionhandler.data_out(self, **kwargs)
+
+    def data_in(self, **kwargs):
+        """
+        Handle input from the client. Output produced while handling it is
+        the reply, and is sent (merged) as soon as the handling is done.
+        """
+        self.flush_output()
+        self._replying = True
+        try:
+            super().data_in(**kwargs)
+        finally:
+            self._replying = False
+            self.flush_output()
+
+    def at_disconnect(self, reason=None):
+        """
+        Send anything still buffered before the connection goes.
+        """
+        self.flush_output()
+        VITALS.unsubscribe(self)
+        super().at_disconnect(reason=reason)
+
+    def at_sync(self):
+        """
+        Called when the session is re-synced with the Portal, e.g. after a
+        reload. The puppet is re-attached here without any puppet hooks
+        firing, so put it back in the online registry ourselves, and renew
+        the vitals subscription kept in the `VITALS` protocol flag.
+        """
+        super().at_sync()
+        puppet = self.puppet
+        if puppet and puppet.is_typeclass(CHARACTER_TYPECLASS, exact=False):
+            ONLINE_CHARACTERS.add(puppet)
+        interval = self.protocol_flags.get("VITALS")
+        if interval and not VITALS.is_subscribed(self):
+            VITALS.subscribe(self, interval)
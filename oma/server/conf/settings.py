@@ -38,7 +38,7 @@ SERVERNAME = "oma"
 # Typeclass bases
 ######################################################################
 # Server-side session class for sessions connecting to the Portal.
-# SERVER_SESSION_CLASS = "evennia.server.serversession.ServerSession"
+SERVER_SESSION_CLASS = "server.conf.serversession.ServerSession"
 # Base typeclass for all objects.
 # BASE_OBJECT_TYPECLASS = "evennia.objects.objects.DefaultObject"
 # Base typeclass for all characters directly controlled by players.
@@ -62,18 +62,98 @@ try:
 except ImportError:
     print("secret_settings.py file not found or failed to import.")
 
+# 游戏系统日志（world.gamelog）。按子系统设置日志级别：DEBUG / INFO / WARNING / ERROR / OFF，
+# 未列出的子系统使用 "default"。高频系统建议保持 WARNING 以上，只看每个 tick 的汇总记录请用 INFO。
+GAME_LOG_LEVELS = {
+    "default": "INFO",
+    "needs": "INFO",
+    "characters": "WARNING",
+}
+# 按子系统设置 sampled() 调用的采样率（0~1），未列出的为 1.0（全部记录）。
+GAME_LOG_SAMPLING = {}
+
+# 角色的生存/战斗数值（char.stats）先在内存中修改，每隔这么多秒批量写回数据库。
+# 角色下线、死亡以及服务器重载/关闭时也会立即写回。
+STATS_FLUSH_INTERVAL = 30
+
+# 需求系统只在状态变化时（如 正常 -> 饥饿 -> 饿晕）提示玩家。角色一直处于
+# 不良状态时，每隔这么多秒再提醒一次；0 表示不提醒。
+NEEDS_REMINDER_INTERVAL = 300
+
+# 周期性系统（需求、天气、篝火、怪物AI……）共用一个调度器。调度器每隔
+# TICK_SCHEDULER_SLOT 秒运行一个“时间片”，把每个系统的对象按 id 分片，
+# 每个时间片只处理一片，从而把负载平摊到整个周期内，而不是每分钟集中爆发一次。
+TICK_SCHEDULER_SLOT = 5
+# 按系统覆盖参数：period 为同一对象两次处理之间的秒数，
+# budget 为单个时间片最多处理的对象数（超出的顺延到下一个时间片，None 表示不限）。
+TICK_SYSTEMS = {
+    "needs": {"period": 60, "budget": 1000},
+}
+
+# 需要亚秒级精度的实时系统（如战斗）共用一个帧时钟，每隔这么多秒运行一帧。
+# 只有在有系统订阅（例如有人在战斗）时时钟才会运行。
+FRAME_CLOCK_INTERVAL = 0.25
+
+# 每个会话的输出文本先缓存这么多秒，再合并成一次发送（减少 AMP 消息和写套接字的次数）。
+# 对玩家自己输入的回应会在命令执行完后立即发出。设为 0 则不缓存。
+SESSION_OUTPUT_FRAME = 0.05
+
+# 订阅了生命/饥饿/口渴/体力推送（GMCP Char.Vitals）的客户端，两次推送之间至少间隔这么多秒。
+# 客户端可以要求更长的间隔；没有指定时也用这个值。
+VITALS_MIN_INTERVAL = 0.5
+
+# 技能冷却保存在内存中的时间轮里。冷却时间不少于这么多秒的才会写入
+# char.stats.skill_cooldowns，从而在重载/下线后保留。
+COOLDOWN_PERSIST_MIN = 60
+# 冷却结束时是否通知角色（文本消息 + 客户端 OOB "cooldown" 事件）。
+COOLDOWN_NOTIFY = True
+
+# 远方的荒野（world.wilderness）不为每个地块建房间：地块按坐标和种子即时生成，
+# 只有有人站着或被改变（丢了物品、生了篝火）的地块才占用一个数据库房间。
+WILDERNESS_SEED = 20250601
+WILDERNESS_SIZE = (1000, 1000)
+# 被改变的地块这么多秒无人到访后，森林会收回留下的东西，地块恢复原状。
+WILDERNESS_IDLE_TIME = 3600
+# 最多保留多少个空闲的备用房间，多出的会被删除。
+WILDERNESS_POOL_SIZE = 50
+
+# 寻路（world.pathfinding）最多缓存多少条最近查询过的路径。
+ROOM_GRAPH_CACHE_SIZE = 4096
+# 只为不超过这么多个房间的区域计算两两之间的距离（占用内存随房间数的平方增长）；
+# 更大的区域只能查询从某一个房间出发的距离。
+ROOM_GRAPH_REGION_MAX_ROOMS = 500
+
+# 怪物 AI（world.ai）只在离在线玩家这么多个出口以内的房间里运行，
+# 其余的怪物处于休眠状态，不占用任何计算。
+MONSTER_AI_RADIUS = 2
+
 GLOBAL_SCRIPTS = {
+    "tick_scheduler": {
+        "typeclass": "scripts.tick_scheduler.TickSchedulerScript",
+        "interval": TICK_SCHEDULER_SLOT,
+        "repeats": -1,
+        "desc": "Runs sharded periodic game systems.",
+    },
     "needs_system": {  # 这个键名 "needs_system" 会成为脚本在游戏中的默认key
         "typeclass": "scripts.needs_system.NeedsSystem",  # 指向脚本类的Python路径
-        "interval": 60,  # 脚本的 at_repeat() 方法被调用的时间间隔（秒）
-        "repeats": -1,   # 脚本重复执行的次数。-1 代表无限次重复
+        # 没有 interval：由 tick_scheduler 按 TICK_SYSTEMS["needs"] 分片驱动
         "desc": "Manages character needs.",
         # "obj": some_object, # （可选）如果脚本需要绑定到特定对象而不是纯全局
         # "start_delay": False, # （可选）如果为True，脚本在首次启动时不立即执行其at_repeat方法，而是等待第一个interval过去
         # "persistent": True, # （可选）通常全局脚本都应持久化，这也是默认行为。脚本内部的 self.persistent = True 也会确保这点。
-    }
+    },
+    "stats_flush": {  # 定期把 char.stats 中的脏数据批量写回数据库
+        "typeclass": "scripts.stats_flush.StatsFlushScript",
+        "interval": STATS_FLUSH_INTERVAL,
+        "repeats": -1,
+        "desc": "Writes pending character stat changes.",
+    },
 }
 
 BATCHCODE_PATHS = ["world","world.map", "evennia.contrib", "evennia.contrib.tutorials"]
 
-DEFAULT_HOME = "#262" # 林间空地(#262)
\ No newline at end of file
+DEFAULT_HOME = "#262" # 林间空地(#262)
+
+# 出生/复活点的选择策略（world.spawns）："random" 均匀随机；"weighted" 按房间的
+# spawn_weight 加权随机；"least_populated" 优先选择在线人数最少的出生点。
+SPAWN_STRATEGY = "least_populated"
@@ -0,0 +1,9 @@
+"""
+Tests for the game systems
+
+Run them with Evennia's test runner, which sets up a throwaway test
+database:
+
+    evennia test --settings settings.py tests
+
+"""
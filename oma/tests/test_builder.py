@@ -0,0 +1,55 @@
+"""
+Tests for `world.builder`.
+
+"""
+
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection
+from evennia import create_object
+from evennia.objects.models import ObjectDB
+from evennia.utils.test_resources import BaseEvenniaTest
+
+from world.builder import ObjectSpec, bulk_create_objects
+
+
+class TestBulkCreateObjects(BaseEvenniaTest):
+    def _stored_locks(self, obj):
+        return sorted(ObjectDB.objects.get(id=obj.id).db_lock_storage.split(";"))
+
+    def test_locks_match_create_object(self):
+        typeclasses = [
+            "typeclasses.characters.PrimordialCharacter",
+            "typeclasses.rooms.ForestRoom",
+            settings.BASE_OBJECT_TYPECLASS,
+        ]
+        for typeclass in typeclasses:
+            with self.subTest(typeclass=typeclass):
+                expected = create_object(typeclass, key="single", location=self.room1)
+                (bulk,) = bulk_create_objects([ObjectSpec("bulk", typeclass, location=self.room1)])
+                self.assertEqual(self._stored_locks(bulk), self._stored_locks(expected))
+
+    def test_exit_locks_match_create_object(self):
+        expected = create_object(
+            settings.BASE_EXIT_TYPECLASS, key="east", location=self.room1, destination=self.room2
+        )
+        (bulk,) = bulk_create_objects(
+            [ObjectSpec("west", settings.BASE_EXIT_TYPECLASS, location=self.room2,
+                        destination=self.room1)]
+        )
+        self.assertEqual(self._stored_locks(bulk), self._stored_locks(expected))
+
+    def test_spec_locks_are_added(self):
+        (bulk,) = bulk_create_objects(
+            [ObjectSpec("stone", settings.BASE_OBJECT_TYPECLASS, locks="get:false()")]
+        )
+        self.assertIn("get:false()", self._stored_locks(bulk))
+        self.assertIn("control", [lock.split(":")[0] for lock in self._stored_locks(bulk)])
+
+    def test_needs_primary_keys_from_bulk_insert(self):
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", False):
+            with self.assertRaises(RuntimeError):
+                bulk_create_objects([ObjectSpec("stone")])
+        self.assertFalse(ObjectDB.objects.filter(db_key="stone").exists())
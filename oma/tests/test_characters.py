@@ -0,0 +1,34 @@
+"""
+Tests for `typeclasses.characters`.
+
+"""
+
+from unittest import mock
+
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils.test_resources import EvenniaTest
+
+from world.spawns import SPAWN_POINTS
+from world.wilderness import WILDERNESS
+
+
+class TestUnpuppet(EvenniaTest):
+    room_typeclass = "typeclasses.rooms.ForestRoom"
+    character_typeclass = "typeclasses.characters.PrimordialCharacter"
+
+    def setUp(self):
+        SPAWN_POINTS.invalidate()
+        WILDERNESS.clear()
+        super().setUp()
+
+    def _stored(self, char, key):
+        return Attribute.objects.get(objectdb=char, db_key=key, db_category=None).db_value
+
+    def test_logout_from_ordinary_room_saves_stats(self):
+        self.char1.stats.hunger = 42
+        with mock.patch.object(type(self.char1.sessions), "count", return_value=0):
+            self.char1.at_post_unpuppet(self.account)
+
+        self.assertIsNone(self.char1.location)
+        self.assertFalse(self.char1.stats.pending())
+        self.assertEqual(self._stored(self.char1, "hunger"), 42)
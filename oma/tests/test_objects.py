@@ -0,0 +1,54 @@
+"""
+Tests for `typeclasses.objects`.
+
+"""
+
+from evennia.objects.models import ObjectDB
+from evennia.utils.create import create_object
+from evennia.utils.test_resources import EvenniaCommandTest, EvenniaTest
+
+from commands.inventory import CmdGive
+from world.items import STACKABLE_TYPECLASS, add_items, prototype_of
+
+
+class TestStackSplit(EvenniaTest):
+    def test_split_prototype_stack(self):
+        stack = add_items(self.char1, "FIREWOOD", 5)[0]
+        part = stack.split(2, self.char2, move_type="give")
+
+        self.assertEqual(part.location, self.char2)
+        self.assertEqual(part.quantity, 2)
+        self.assertEqual(prototype_of(part), "firewood")
+        self.assertEqual(stack.quantity, 3)
+        self.assertEqual(stack.location, self.char1)
+
+        # a second part merges with the stack already there
+        part = stack.split(1, self.char2, move_type="give")
+        self.assertEqual([obj.quantity for obj in self.char2.contents], [3])
+        self.assertEqual(part.quantity, 3)
+        self.assertEqual(stack.quantity, 2)
+
+    def test_split_plain_stack(self):
+        stack = create_object(STACKABLE_TYPECLASS, key="rock", location=self.char1)
+        stack.quantity = 5
+        stack.db.desc = "A heap of rocks."
+        part = stack.split(2, self.char2, move_type="give")
+
+        self.assertNotEqual(part, stack)
+        self.assertTrue(ObjectDB.objects.filter(id=stack.id).exists())
+        self.assertEqual(stack.quantity, 3)
+        self.assertEqual(stack.location, self.char1)
+        self.assertEqual(part.location, self.char2)
+        self.assertEqual(part.quantity, 2)
+        self.assertEqual(part.db.desc, "A heap of rocks.")
+
+
+class TestGiveStack(EvenniaCommandTest):
+    def test_give_part_of_plain_stack(self):
+        stack = create_object(STACKABLE_TYPECLASS, key="rock", location=self.char1)
+        stack.quantity = 5
+        self.call(CmdGive(), "2 rock to Char2", "你把")
+
+        self.assertEqual(stack.quantity, 3)
+        given = [obj for obj in self.char2.contents if obj.key == "rock"]
+        self.assertEqual([obj.quantity for obj in given], [2])
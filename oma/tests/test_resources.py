@@ -0,0 +1,48 @@
+"""
+Tests for `world.resources`.
+
+"""
+
+from evennia.utils.test_resources import BaseEvenniaTest
+
+from world.resources import POOL_ATTRIBUTE, RESOURCE_TYPES, RESOURCES
+from world.spawns import SPAWN_POINTS
+from world.wilderness import WILDERNESS
+
+
+class TestResourceNodes(BaseEvenniaTest):
+    room_typeclass = "typeclasses.rooms.ForestRoom"
+
+    def setUp(self):
+        SPAWN_POINTS.invalidate()
+        WILDERNESS.clear()
+        RESOURCES.clear()
+        super().setUp()
+        self.room1.db.has_forageables = True
+
+    def tearDown(self):
+        RESOURCES.clear()
+        super().tearDown()
+
+    def test_consume_partly_regrown_node(self):
+        resource = RESOURCE_TYPES["forage"]
+        regrow_time = resource.regrow_time
+        self.assertEqual(RESOURCES.consume(self.room1, "forage", amount=3, now=0), 3)
+        self.assertEqual(self.room1.attributes.get(POOL_ATTRIBUTE)["forage"], (2, regrow_time))
+
+        # one unit has grown back but the tick hasn't run: consuming settles
+        # the pool and moves the next regrowth forward
+        now = regrow_time + 30
+        self.assertEqual(RESOURCES.consume(self.room1, "forage", now=now), 1)
+        self.assertEqual(self.room1.attributes.get(POOL_ATTRIBUTE)["forage"], (2, 2 * regrow_time))
+
+        # the old entry is skipped, the new one regrows the node
+        self.assertEqual(RESOURCES.regrow(now=now), 0)
+        self.assertEqual(RESOURCES.regrow(now=2 * regrow_time), 1)
+        self.assertEqual(self.room1.attributes.get(POOL_ATTRIBUTE)["forage"], (3, 3 * regrow_time))
+
+        # and it keeps going until full, then the pool is dropped
+        self.assertEqual(RESOURCES.regrow(now=10 * regrow_time), 1)
+        self.assertNotIn("forage", self.room1.attributes.get(POOL_ATTRIBUTE))
+        self.assertEqual(RESOURCES.available(self.room1, "forage"), resource.capacity)
+        self.assertEqual(len(RESOURCES), 0)
@@ -1,11 +1,22 @@
 # typeclasses/characters.py
 
 from evennia.objects.objects import DefaultCharacter
-from evennia.utils import logger
-from evennia import search_tag # 用于按标签搜索
+from evennia.utils.utils import lazy_property
 import evennia.utils.search # 用于搜索 DEFAULT_HOME
 from django.conf import settings # 用于 DEFAULT_HOME
-import random
+
+from world.ai import MONSTER_AI, MONSTER_TAG
+from world.broadcast import BROADCAST
+from world.combat import COMBAT
+from world.events import ROOM_EVENTS, SAY
+from world.gamelog import get_logger
+from world.online import ONLINE_CHARACTERS, REGION_TAG_CATEGORY
+from world.spawns import SPAWN_POINTS
+from world.stats import StatHandler
+from world.vitals import VITALS
+from world.wilderness import WILDERNESS
+
+log = get_logger("characters")
 
 # 这是一个占位符，因为你的原始代码引用了 .objects.ObjectParent
 # 如果你在 .objects 文件中有这个类的定义，请确保它是正确的。
@@ -30,7 +41,16 @@ class PrimordialCharacter(DefaultCharacter):
     """
     This class represents the player character in the "茹毛饮血" (Primordial) setting.
     It includes basic attributes and needs for survival.
+
+    Stats that change often (hp, needs, combat state, cooldowns) should be
+    read and written through `self.stats`, which keeps them in memory and
+    writes them back in batches. See `world.stats`.
     """
+
+    @lazy_property
+    def stats(self):
+        return StatHandler(self)
+
     def at_object_creation(self):
         """
         Called only once, when the object is first created.
@@ -55,41 +75,20 @@ class PrimordialCharacter(DefaultCharacter):
         self.db.is_in_combat = False
         self.db.combat_target = None
         self.db.needs_initial_spawn = True
-        logger.log_infomsg(f"PrimordialCharacter {self.key} (ID: {self.id}) created. Flagged for initial spawn.")
+        log.debug("PrimordialCharacter %s (ID: %s) created. Flagged for initial spawn.", self.key, self.id)
 
-    def _find_and_move_to_spawn_point(self, character_message, fallback_message):
+    def _find_and_move_to_spawn_point(self, character_message, fallback_message, region=None):
         """
         Helper function to find a spawn point and move the character.
         Used for both initial spawn and respawn after death.
         Ensures "look" happens after the character_message.
+        Spawn points come from the cached registry in `world.spawns`;
+        `region` prefers spawn points tagged with that region.
         """
-        spawn_tag_key = "forest_spawn_point"
-        spawn_tag_category = "info"
-        
-        logger.log_infomsg(f"Character {self.key} attempting to find spawn location with tag '{spawn_tag_key}:{spawn_tag_category}'.")
-        
-        tagged_objects = search_tag(key=spawn_tag_key, category=spawn_tag_category)
-        possible_spawn_locations = []
-        if tagged_objects:
-            for obj in tagged_objects:
-                if obj.is_typeclass("typeclasses.rooms.ForestRoom", exact=False):
-                    possible_spawn_locations.append(obj)
-        
-        if not possible_spawn_locations:
-            logger.log_infomsg(
-                f"No spawn locations found with '{spawn_tag_key}:{spawn_tag_category}'. "
-                f"Trying with key only: '{spawn_tag_key}'."
-            )
-            tagged_objects_key_only = search_tag(key=spawn_tag_key)
-            if tagged_objects_key_only:
-                for obj in tagged_objects_key_only:
-                    if obj.is_typeclass("typeclasses.rooms.ForestRoom", exact=False):
-                        possible_spawn_locations.append(obj)
-                        logger.log_infomsg(f"Found fallback spawn location by key only: {obj.key}")
-
-        if possible_spawn_locations:
-            spawn_location = random.choice(possible_spawn_locations)
-            logger.log_infomsg(f"Character {self.key} (ID: {self.id}): Performing spawn/respawn to {spawn_location.key} (ID: {spawn_location.id}).")
+        spawn_location = SPAWN_POINTS.choose(region=region)
+
+        if spawn_location:
+            log.debug("Character %s (ID: %s): Performing spawn/respawn to %s (ID: %s).", self.key, self.id, spawn_location.key, spawn_location.id)
             
             self.msg(character_message)
             
@@ -101,10 +100,10 @@ class PrimordialCharacter(DefaultCharacter):
             
             return True # Spawn successful
         
-        # If no possible_spawn_locations were found (fallback logic)
-        logger.log_warnmsg(
-            f"Character {self.key} (ID: {self.id}): "
-            f"No valid spawn points found with tag. Attempting fallback to DEFAULT_HOME."
+        # If no spawn point was found (fallback logic)
+        log.warning(
+            "Character %s (ID: %s): No valid spawn points found with tag. Attempting fallback to DEFAULT_HOME.",
+            self.key, self.id,
         )
         
         try:
@@ -113,17 +112,17 @@ class PrimordialCharacter(DefaultCharacter):
                 limbo = limbo_obj_list[0]
                 if self.location != limbo:
                     self.move_to(limbo, quiet=False, move_hooks=True) # This triggers a "look"
-                    logger.log_infomsg(f"Moved {self.key} to Fallback Location (DEFAULT_HOME: {limbo.key}).")
+                    log.debug("Moved %s to Fallback Location (DEFAULT_HOME: %s).", self.key, limbo.key)
                 else: # Already in Limbo
                     self.execute_cmd("look") # Refresh view of Limbo
-                    logger.log_infomsg(f"{self.key} is already in Fallback Location (DEFAULT_HOME: {limbo.key}).")
+                    log.debug("%s is already in Fallback Location (DEFAULT_HOME: %s).", self.key, limbo.key)
             else: # Limbo not found
-                logger.log_warnmsg(f"Could not find Fallback Location (settings.DEFAULT_HOME) for {self.key}.")
+                log.warning("Could not find Fallback Location (settings.DEFAULT_HOME) for %s.", self.key)
                 if self.location: 
                     self.execute_cmd("look") # Show current location
 
         except Exception as e:
-            logger.log_errmsg(f"Error moving {self.key} to Fallback Location (DEFAULT_HOME): {e}")
+            log.error("Error moving %s to Fallback Location (DEFAULT_HOME): %s", self.key, e)
             if self.location:
                 self.execute_cmd("look") # Show current location after error
 
@@ -136,6 +135,9 @@ class PrimordialCharacter(DefaultCharacter):
         Called every time the character is puppeted by an account (e.g. login, possession).
         We use this to handle the initial random spawn.
         """
+        ONLINE_CHARACTERS.add(self)
+        for session in self.sessions.all():
+            VITALS.bind(session, self)
         if hasattr(self.db, 'needs_initial_spawn') and self.db.needs_initial_spawn:
             initial_message = "你在一片陌生的森林中醒来，四周弥漫着潮湿的泥土气息..."
             fallback_message = "你在一片虚无中醒来，周围什么都没有...（初始出生点未找到）"
@@ -148,18 +150,76 @@ class PrimordialCharacter(DefaultCharacter):
             elif hasattr(self.db, 'needs_initial_spawn'): 
                  del self.db.needs_initial_spawn
 
+    def at_pre_puppet(self, account, session=None, **kwargs):
+        """
+        Called just before the character is puppeted. Puts a character that
+        logged out in the wilderness back on its tile.
+        """
+        WILDERNESS.at_login(self)
+        super().at_pre_puppet(account, session=session, **kwargs)
+
+    def at_post_unpuppet(self, account=None, session=None, **kwargs):
+        """
+        Called when the account stops puppeting this character (e.g. logout).
+        Leaves combat and writes any stat changes still held in memory.
+        """
+        try:
+            if session is not None:
+                VITALS.bind(session, None)
+            location = self.location
+            if not self.sessions.count():
+                WILDERNESS.at_logout(self)
+            super().at_post_unpuppet(account=account, session=session, **kwargs)
+            if not self.sessions.count():
+                ONLINE_CHARACTERS.remove(self)
+                COMBAT.disengage(self, save=False)
+                # only wilderness rooms are released when left empty
+                if (
+                    self.location is None
+                    and getattr(location, "coordinates", None) is not None
+                ):
+                    WILDERNESS.at_leave(location)
+        finally:
+            self.stats.flush()
+
+    def at_post_move(self, source_location, move_type="move", **kwargs):
+        """
+        Called after the character moved. Keeps the online registry's
+        room and region buckets current.
+        """
+        super().at_post_move(source_location, move_type=move_type, **kwargs)
+        ONLINE_CHARACTERS.move(self)
 
-    def at_damage(self, amount, attacker=None):
+    def at_say(self, message, msg_self=None, msg_location=None, receivers=None,
+               msg_receivers=None, **kwargs):
+        """
+        Called after the character spoke. Things said out loud (not
+        whispered) are a `SAY` event of the room, see `world.events`.
+        """
+        super().at_say(message, msg_self=msg_self, msg_location=msg_location,
+                       receivers=receivers, msg_receivers=msg_receivers, **kwargs)
+        if self.location and not kwargs.get("whisper"):
+            ROOM_EVENTS.emit(self.location, SAY, self, message=message)
+
+    def at_damage(self, amount, attacker=None, quiet=False):
         """
         Called when the character takes damage.
+
+        Args:
+            amount (int): Hp lost.
+            attacker (Object, optional): Who dealt the damage.
+            quiet (bool, optional): Don't message the character; for callers
+                that already included the damage in their own message.
+
         """
-        self.db.current_hp -= amount
-        if attacker:
-            self.msg(f"你受到了来自 {attacker.key} 的 {amount} 点伤害！")
-        else:
-            self.msg(f"你受到了 {amount} 点伤害！")
+        self.stats.current_hp -= amount
+        if not quiet:
+            if attacker:
+                self.msg(f"你受到了来自 {attacker.key} 的 {amount} 点伤害！")
+            else:
+                self.msg(f"你受到了 {amount} 点伤害！")
 
-        if self.db.current_hp <= 0:
+        if self.stats.current_hp <= 0:
             self.at_death(killer=attacker)
 
     def at_death(self, killer=None):
@@ -176,20 +236,82 @@ class PrimordialCharacter(DefaultCharacter):
         else:
             death_message_self = "你死了！"
             death_message_others = f"{self.key} 死了。"
-        
+
+        # the blows that killed us may still be queued; they read first
+        BROADCAST.flush()
         self.msg(death_message_self) # Send death message to self
         if self.location:
             self.location.msg_contents(death_message_others, exclude=self) # Send death message to others in room
 
-        # Reset combat state and HP
-        self.db.current_hp = self.db.max_hp 
-        self.db.is_in_combat = False
-        self.db.combat_target = None
+        # End all fights involving us, reset combat state and HP, and persist it right away
+        COMBAT.end_fights(self)
+        self.stats.current_hp = self.db.max_hp
+        self.stats.is_in_combat = False
+        self.stats.combat_target = None
+        self.stats.flush()
         
-        logger.log_infomsg(f"Character {self.key} died. Attempting respawn in forest.")
+        log.info("Character %s died. Attempting respawn in forest.", self.key, killer=killer.key if killer else None)
 
         # Respawn messages
         respawn_message = "你在森林的另一处苏醒过来，阳光透过树叶洒在你脸上，带来了些许暖意。"
         respawn_fallback_message = "你在朦胧中醒来，发现自己身处一个意想不到的地方...（复活点未找到）"
 
-        self._find_and_move_to_spawn_point(respawn_message, respawn_fallback_message)
+        # Prefer respawning in the region the character died in
+        region = None
+        if self.location:
+            region = self.location.tags.get(category=REGION_TAG_CATEGORY, return_list=True)
+            region = region[0] if region else None
+        self._find_and_move_to_spawn_point(respawn_message, respawn_fallback_message, region=region)
+
+
+class MonsterCharacter(PrimordialCharacter):
+    """
+    A monster of the forest. It has the same stats as a player character
+    and fights through the same combat engine, but its actions come from
+    the monster AI (`world.ai`), which only runs it while a player is
+    near.
+
+    Attributes read by the AI:
+        behaviour (str): Key of `world.ai.BEHAVIOURS`, "passive" by default.
+        chase_range (int): How many exits away it hunts players.
+        wander_chance (float): Chance per tick to roam to a neighbouring room.
+    """
+
+    def at_object_creation(self):
+        """
+        Called only once, when the object is first created.
+        """
+        super().at_object_creation()
+        self.attributes.remove("needs_initial_spawn")
+        self.db.desc = "一只在林间游荡的野兽。"
+        self.db.behaviour = "passive"
+        self.db.chase_range = 1
+        self.db.wander_chance = 0.1
+        self.tags.add(*MONSTER_TAG)
+        MONSTER_AI.place(self)
+
+    def at_object_delete(self):
+        """
+        Called just before the monster is deleted.
+        """
+        MONSTER_AI.remove(self)
+        COMBAT.end_fights(self)
+        return super().at_object_delete()
+
+    def at_post_move(self, source_location, move_type="move", **kwargs):
+        """
+        Nobody sees through a monster's eyes, so it doesn't look around
+        after moving unless someone puppets it.
+        """
+        if self.sessions.count():
+            super().at_post_move(source_location, move_type=move_type, **kwargs)
+
+    def at_death(self, killer=None):
+        """
+        Monsters don't respawn: the body is gone once killed.
+        """
+        if self.location:
+            BROADCAST.room(self.location, f"{self.key}倒在地上，不再动弹了。")
+        COMBAT.end_fights(self)
+        log.info("Monster %s died.", self.key, killer=killer.key if killer else None)
+        self.delete()
@@ -9,6 +9,9 @@ for allowing Characters to traverse the exit to its destination.
 
 from evennia.objects.objects import DefaultExit
 
+from world.pathfinding import ROOM_GRAPH
+from world.wilderness import DIRECTIONS, RETURN_ATTRIBUTE, WILDERNESS
+
 from .objects import ObjectParent
 
 
@@ -23,4 +26,93 @@ class Exit(ObjectParent, DefaultExit):
 
     """
 
-    pass
+    def at_object_creation(self):
+        """
+        Called once, when the exit is first created.
+        """
+        super().at_object_creation()
+        ROOM_GRAPH.add_exit(self)
+
+    def at_object_delete(self):
+        """
+        Called just before the exit is deleted.
+        """
+        ROOM_GRAPH.remove_exit(self)
+        return super().at_object_delete()
+
+
+class WildernessExit(Exit):
+    """
+    One of the four compass exits of a `WildernessRoom`. It doesn't have a
+    real destination: traversing it moves to the neighbouring tile, or
+    back out of the wilderness when walking off the map where one came in.
+    """
+
+    def get_target(self, traversing_object):
+        """
+        Args:
+            traversing_object (Object): Who wants to go through.
+
+        Returns:
+            tuple or Object or None: The coordinates of the next tile, the
+                room to leave the wilderness to, or None.
+        """
+        coordinates = self.location.coordinates
+        if coordinates is None or self.key not in DIRECTIONS:
+            return None
+        dx, dy, _ = DIRECTIONS[self.key]
+        target = (coordinates[0] + dx, coordinates[1] + dy)
+        if WILDERNESS.is_valid(target):
+            return target
+        return WILDERNESS.way_out(traversing_object, coordinates)
+
+    def leads_somewhere(self, looker):
+        """
+        If the exit should be shown to `looker`.
+        """
+        return self.get_target(looker) is not None
+
+    def at_traverse(self, traversing_object, target_location, **kwargs):
+        """
+        Move to the next tile (or out of the wilderness) instead of the
+        exit's destination.
+        """
+        target = self.get_target(traversing_object)
+        if target is None:
+            traversing_object.msg("那边是无法穿越的密林。")
+            return
+        source_location = traversing_object.location
+        if isinstance(target, tuple):
+            moved = WILDERNESS.move(traversing_object, target)
+        else:
+            moved = traversing_object.move_to(target, move_type="traverse", exit_obj=self)
+            if moved:
+                traversing_object.attributes.remove(RETURN_ATTRIBUTE)
+        if moved:
+            self.at_post_traverse(traversing_object, source_location)
+        else:
+            self.at_failed_traverse(traversing_object)
+
+
+class WildernessEntrance(Exit):
+    """
+    An exit from an ordinary room into the wilderness. Its destination is
+    ignored (point it back at its own room); it leads to the tile in its
+    `wilderness_coordinates` Attribute, or the wilderness entry.
+
+        @open 荒野 = here
+        @typeclass 荒野 = typeclasses.exits.WildernessEntrance
+        @set 荒野/wilderness_coordinates = (500, 0)
+    """
+
+    def at_traverse(self, traversing_object, target_location, **kwargs):
+        """
+        Enter the wilderness, remembering where to come back to.
+        """
+        source_location = traversing_object.location
+        if WILDERNESS.enter(
+            traversing_object, self.db.wilderness_coordinates, return_to=source_location
+        ):
+            self.at_post_traverse(traversing_object, source_location)
+        else:
+            self.at_failed_traverse(traversing_object)
@@ -8,7 +8,11 @@ with a location in the game world (like Characters, Rooms, Exits).
 
 """
 
+from django.db import transaction
 from evennia.objects.objects import DefaultObject
+from evennia.utils.create import create_object
+
+from world.items import is_stackable, prototype_of
 
 
 class ObjectParent:
@@ -215,3 +219,147 @@ class Object(ObjectParent, DefaultObject):
     """
 
     pass
+
+
+class StackableObject(Object):
+    """
+    Any number of identical items held as one object, e.g. all the 木柴 a
+    character carries. The count is the `quantity` Attribute.
+
+    Items stack when they come from the same prototype (see
+    `world.items`). A stack moved somewhere takes in the stacks of the same
+    items already there, so get and drop merge stacks; `split` moves just
+    part of one, as `give 3 木柴 to ...` does. `consume` uses items up in
+    place.
+
+    """
+
+    @property
+    def quantity(self):
+        return self.attributes.get("quantity", default=1)
+
+    @quantity.setter
+    def quantity(self, value):
+        self.attributes.add("quantity", value)
+        location = self.location
+        if location and hasattr(location, "invalidate_appearance"):
+            # the room shows the count
+            location.invalidate_appearance()
+
+    @property
+    def stack_key(self):
+        return prototype_of(self) or self.key
+
+    def stacks_with(self, other):
+        """
+        Args:
+            other (Object): Another object.
+
+        Returns:
+            bool: If the two hold the same items and can be merged.
+
+        """
+        return other != self and is_stackable(other) and other.stack_key == self.stack_key
+
+    def get_display_name(self, looker=None, **kwargs):
+        name = super().get_display_name(looker, **kwargs)
+        quantity = self.quantity
+        return f"{name}×{quantity}" if quantity > 1 else name
+
+    def merge_stacks(self):
+        """
+        Take in the other stacks of the same items where this one is.
+        """
+        location = self.location
+        if not location:
+            return
+        others = [obj for obj in location.contents if self.stacks_with(obj)]
+        if not others:
+            return
+        self.quantity += sum(obj.quantity for obj in others)
+        for obj in others:
+            obj.delete()
+
+    def consume(self, count=1):
+        """
+        Use up items of the stack; it's deleted once empty.
+
+        Args:
+            count (int, optional): How many.
+
+        Returns:
+            int: How many were used up, at most the stack's quantity.
+
+        """
+        quantity = self.quantity
+        taken = min(count, quantity)
+        if taken >= quantity:
+            self.delete()
+        else:
+            self.quantity = quantity - taken
+        return taken
+
+    def split(self, count, destination, move_type="move", **kwargs):
+        """
+        Move some of the stack's items to `destination`, where they join any
+        stack already there.
+
+        Args:
+            count (int): How many; all of them moves the whole stack.
+            destination (Object): Where to.
+            move_type (str, optional): Passed on to `move_to`.
+            **kwargs: Passed on to `move_to`.
+
+        Returns:
+            StackableObject or None: The object that was moved, or None if it
+                couldn't be. Either way this one keeps the rest.
+
+        """
+        if count >= self.quantity:
+            moved = self.move_to(destination, quiet=True, move_type=move_type, **kwargs)
+            return self if moved else None
+        with transaction.atomic():
+            part = self._create_part(count)
+            if not part.move_to(destination, quiet=True, move_type=move_type, **kwargs):
+                part.delete()
+                return None
+            self.quantity -= count
+        return part
+
+    def _create_part(self, count):
+        """
+        Create a copy of this stack holding `count` items, nowhere yet.
+        Unlike `copy`, which puts it here before its tags and Attributes
+        are set, so that it can merge with this stack while it's created.
+
+        Args:
+            count (int): How many items it holds.
+
+        Returns:
+            StackableObject: The copy.
+
+        """
+        attributes = [
+            (attr.key, attr.value, attr.category, attr.lock_storage)
+            for attr in self.attributes.all()
+            if not (attr.key == "quantity" and attr.category is None)
+        ]
+        attributes.append(("quantity", count))
+        return create_object(
+            self.typeclass_path,
+            key=self.key,
+            home=self.home,
+            locks=self.db_lock_storage,
+            aliases=self.aliases.all(),
+            tags=self.tags.all(return_key_and_category=True),
+            attributes=attributes,
+        )
+
+    def at_post_move(self, source_location, move_type="move", **kwargs):
+        """
+        Merge with the stacks at the new location, unless moved with
+        `stack=False`.
+        """
+        super().at_post_move(source_location, move_type=move_type, **kwargs)
+        if kwargs.get("stack", True):
+            self.merge_stacks()
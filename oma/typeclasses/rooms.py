@@ -5,12 +5,146 @@ Rooms are simple containers that has no location of their own.
 
 """
 
+from django.utils.translation import gettext as _
+from evennia.objects.models import ContentsHandler
 from evennia.objects.objects import DefaultRoom
+from evennia.typeclasses.attributes import AttributeHandler, ModelAttributeBackend
+from evennia.typeclasses.tags import TagHandler
+from evennia.utils.utils import iter_to_str, lazy_property
+
+from world.events import DROP, ENTER, LEAVE, ROOM_EVENTS
+from world.online import REGION_TAG_CATEGORY
+from world.pathfinding import ROOM_GRAPH
+from world.resources import RESOURCE_TYPES, RESOURCES
+from world.spawns import SPAWN_POINTS, SPAWN_TAG, SPAWN_TAG_CATEGORY
+from world.wilderness import WILDERNESS
 
 from .objects import ObjectParent
 
 
-class Room(ObjectParent, DefaultRoom):
+class RoomTagHandler(TagHandler):
+    """
+    TagHandler that tells its room when tags change, so caches built
+    from tags (like the spawn point registry) can be invalidated.
+    """
+
+    def add(self, key=None, category=None, data=None):
+        super().add(key=key, category=category, data=data)
+        self.obj.at_tags_changed(category)
+
+    def remove(self, key=None, category=None):
+        super().remove(key=key, category=category)
+        self.obj.at_tags_changed(category)
+
+    def clear(self, category=None):
+        super().clear(category=category)
+        self.obj.at_tags_changed(category)
+
+
+class RoomAttributeHandler(AttributeHandler):
+    """
+    AttributeHandler that tells its room when Attributes change, so its
+    cached appearance can be dropped.
+    """
+
+    def add(self, *args, **kwargs):
+        super().add(*args, **kwargs)
+        self.obj.at_attributes_changed()
+
+    def batch_add(self, *args, **kwargs):
+        super().batch_add(*args, **kwargs)
+        self.obj.at_attributes_changed()
+
+    def remove(self, *args, **kwargs):
+        super().remove(*args, **kwargs)
+        self.obj.at_attributes_changed()
+
+    def clear(self, *args, **kwargs):
+        super().clear(*args, **kwargs)
+        self.obj.at_attributes_changed()
+
+
+class RoomContentsHandler(ContentsHandler):
+    """
+    ContentsHandler that tells its room when something arrives or goes,
+    however it happens (moves, creation, deletion).
+    """
+
+    def init(self):
+        super().init()
+        self.obj.at_contents_changed(None)
+
+    def add(self, obj):
+        super().add(obj)
+        self.obj.at_contents_changed(obj)
+
+    def remove(self, obj):
+        super().remove(obj)
+        self.obj.at_contents_changed(obj)
+
+
+# lockstrings letting everybody see an object, so it looks the same to all
+_OPEN_LOCKS = ("", "view:all()", "search:all()")
+# `appearance_template` fields besides `characters`
+_APPEARANCE_FIELDS = ("header", "name", "extra_name_info", "desc", "exits", "things", "footer")
+
+
+class AppearanceCache:
+    """
+    A room's rendered appearance. Kept on the room instance rather than in
+    `ndb`, which would stop the idmapper from ever flushing the room.
+    """
+
+    __slots__ = ("version", "shared", "characters")
+
+    def __init__(self):
+        self.version = 0
+        # (version, viewer class) -> rendered template fields
+        self.shared = {}
+        # viewer class -> [(character, display name)]
+        self.characters = {}
+
+
+def _seen_alike(objects):
+    return all(
+        obj.locks.get("view") in _OPEN_LOCKS and obj.locks.get("search") in _OPEN_LOCKS
+        for obj in objects
+    )
+
+
+class RoomEventsMixin:
+    """
+    Makes a room emit its events on the room event bus
+    (`world.events.ROOM_EVENTS`): `ENTER` and `LEAVE` for everything
+    moving in and out, and `DROP` for things dropped here.
+    """
+
+    def subscribe(self, event, callback):
+        """
+        Call `callback(event)` whenever `event` happens in this room.
+
+        Returns:
+            int: A handle for `ROOM_EVENTS.unsubscribe`.
+
+        """
+        return ROOM_EVENTS.subscribe(event, callback, room=self)
+
+    def at_object_receive(self, moved_obj, source_location, move_type="move", **kwargs):
+        super().at_object_receive(moved_obj, source_location, move_type=move_type, **kwargs)
+        ROOM_EVENTS.emit(self, ENTER, moved_obj, source=source_location, move_type=move_type)
+        if move_type == "drop":
+            ROOM_EVENTS.emit(self, DROP, moved_obj, dropper=source_location)
+
+    def at_object_leave(self, moved_obj, target_location, move_type="move", **kwargs):
+        super().at_object_leave(moved_obj, target_location, move_type=move_type, **kwargs)
+        ROOM_EVENTS.emit(self, LEAVE, moved_obj, destination=target_location, move_type=move_type)
+
+    def at_object_delete(self):
+        ROOM_EVENTS.forget_room(self)
+        return super().at_object_delete()
+
+
+class Room(RoomEventsMixin, ObjectParent, DefaultRoom):
     """
     Rooms are like any Object, except their location is None
     (which is default). They also use basetype_setup() to
@@ -24,11 +158,33 @@ class Room(ObjectParent, DefaultRoom):
     pass
 
 
-class ForestRoom(DefaultRoom):
+class ForestRoom(RoomEventsMixin, DefaultRoom):
     """
     This class represents a room in the "荧露树林" (Glimmerdew Forest).
     It can hold information about available resources, danger levels, etc.
+    What happens in it can be subscribed to, see `world.events`.
     """
+
+    # `appearance_template` fields that depend on the looker itself, not just
+    # on its viewer class; they are rendered on every look
+    appearance_per_looker = ()
+
+    @lazy_property
+    def tags(self):
+        return RoomTagHandler(self)
+
+    @lazy_property
+    def attributes(self):
+        return RoomAttributeHandler(self, ModelAttributeBackend)
+
+    @lazy_property
+    def contents_cache(self):
+        return RoomContentsHandler(self)
+
+    @lazy_property
+    def appearance_cache(self):
+        return AppearanceCache()
+
     def at_object_creation(self):
         """
         Called only once, when the object is first created.
@@ -41,6 +197,52 @@ class ForestRoom(DefaultRoom):
         self.db.danger_level = 1      # Arbitrary danger level (1 = low, 5 = high)
         self.db.description_details = "空气中弥漫着潮湿的泥土和腐叶的气息。"
 
+    def get_feature(self, name, default=None):
+        """
+        Get one of the room's environment values, like `has_wood` or
+        `danger_level`.
+
+        Args:
+            name (str): The Attribute name.
+            default (any, optional): Returned if the room doesn't have it.
+
+        Returns:
+            any: The value.
+        """
+        return self.attributes.get(name, default=default)
+
+    def set_spawn_point(self, enabled=True, weight=1):
+        """
+        Make this room a (re)spawn point for characters, or stop it being one.
+
+        Args:
+            enabled (bool, optional): If this room should be a spawn point.
+            weight (int, optional): Relative chance of being picked by the
+                "weighted" spawn strategy.
+        """
+        if enabled:
+            self.db.spawn_weight = weight
+            self.tags.add(SPAWN_TAG, category=SPAWN_TAG_CATEGORY)
+        else:
+            self.tags.remove(SPAWN_TAG, category=SPAWN_TAG_CATEGORY)
+
+    def at_tags_changed(self, category):
+        """
+        Called by the room's tag handler whenever tags were added or removed.
+        """
+        if category is None or category == SPAWN_TAG_CATEGORY:
+            SPAWN_POINTS.invalidate()
+        if category is None or category == REGION_TAG_CATEGORY:
+            ROOM_GRAPH.update_room(self)
+
+    def at_object_delete(self):
+        """
+        Called just before the room is deleted.
+        """
+        if self.tags.has(SPAWN_TAG, category=SPAWN_TAG_CATEGORY) or self.tags.has(SPAWN_TAG):
+            SPAWN_POINTS.invalidate()
+        return super().at_object_delete()
+
     def get_display_name(self, looker, **kwargs):
         """
         Displays the name of the room.
@@ -48,29 +250,224 @@ class ForestRoom(DefaultRoom):
         """
         return super().get_display_name(looker, **kwargs)
 
+    def get_viewer_class(self, looker):
+        """
+        Lookers of one viewer class see the room the same way (apart from
+        `get_display_hints`, `appearance_per_looker` and themselves not being
+        listed among the characters), so they share its cached appearance.
+        """
+        # what `get_extra_display_name_info` checks, without parsing a lockstring
+        builder = getattr(looker, "is_superuser", False) or looker.permissions.check("Builder")
+        return (type(looker), bool(builder))
+
+    @property
+    def appearance_version(self):
+        """
+        Goes up whenever the cached appearance is dropped.
+        """
+        return self.appearance_cache.version
+
+    def invalidate_appearance(self, characters=False):
+        """
+        Drop the cached appearance. The room notices changes to its
+        Attributes and contents by itself; call this after changing
+        something it can't notice, like renaming an exit or item in it.
+
+        Args:
+            characters (bool, optional): Only the characters changed.
+        """
+        cache = self.appearance_cache
+        cache.characters.clear()
+        if not characters:
+            cache.version += 1
+            cache.shared.clear()
+
+    def at_attributes_changed(self):
+        """
+        Called by the room's Attribute handler whenever Attributes changed.
+        """
+        self.invalidate_appearance()
+
+    def at_rename(self, oldname, newname):
+        """
+        Called when the room was renamed.
+        """
+        super().at_rename(oldname, newname)
+        self.invalidate_appearance()
+
+    def at_contents_changed(self, obj):
+        """
+        Called by the room's contents cache when `obj` arrived or left, or
+        with None when the contents were (re)loaded.
+        """
+        self.invalidate_appearance(characters=obj is not None and "character" in obj._content_types)
+
+    def _render_field(self, name, looker, **kwargs):
+        if name == "extra_name_info":
+            return self.get_extra_display_name_info(looker, **kwargs)
+        return getattr(self, f"get_display_{name}")(looker, **kwargs)
+
+    def _shared_fields(self, looker, viewer):
+        key = (self.appearance_version, viewer)
+        cache = self.appearance_cache.shared
+        fields = cache.get(key)
+        if fields is None:
+            fields = {
+                name: self._render_field(name, looker)
+                for name in _APPEARANCE_FIELDS
+                if name not in self.appearance_per_looker
+            }
+            shown = self.contents_get(content_type="exit") + self.contents_get(content_type="object")
+            if looker not in shown and _seen_alike(shown):
+                cache[key] = fields
+        return fields
+
+    def get_display_footer(self, looker, **kwargs):
+        """
+        What the room offers: its extra details and resources.
+        """
+        lines = []
+        description_details = self.get_feature("description_details")
+        if description_details:
+            lines.append(description_details)
+        for key, resource in RESOURCE_TYPES.items():
+            if RESOURCES.has(self, key):
+                left = RESOURCES.available(self, key)
+                lines.append(resource.present if left else resource.depleted)
+        return "\n".join(lines)
+
+    def get_display_characters(self, looker, **kwargs):
+        """
+        The characters in the room except `looker`. Their names are kept per
+        viewer class until somebody arrives or leaves.
+        """
+        if kwargs:
+            return super().get_display_characters(looker, **kwargs)
+        return self._display_characters(looker, self.get_viewer_class(looker))
+
+    def _display_characters(self, looker, viewer):
+        cache = self.appearance_cache.characters
+        names = cache.get(viewer)
+        if names is None:
+            characters = self.contents_get(content_type="character")
+            if not _seen_alike(characters):
+                return super().get_display_characters(looker)
+            names = cache[viewer] = [(char, char.get_display_name(looker)) for char in characters]
+        names = iter_to_str((name for char, name in names if char != looker), endsep=_(", and"))
+        return f"|w{_('Characters')}:|n {names}" if names else ""
+
+    def get_display_hints(self, looker, **kwargs):
+        """
+        Lines only some lookers get, never cached.
+        """
+        perception = looker.attributes.get("perception", default=0) or 0
+        if perception > 7 and (self.get_feature("danger_level") or 0) > 3:
+            return "你隐约感觉到这片区域有些危险。"
+        return ""
+
     def return_appearance(self, looker, **kwargs):
         """
         This is called when a player looks at the room.
-        We can customize this to add details about resources or dangers.
-        """
-        description = super().return_appearance(looker, **kwargs)
-        # Add custom details to the room description
-        details = []
-        if self.db.has_forageables:
-            details.append("你注意到这里似乎有一些可食用的植物。")
-        if self.db.has_wood:
-            details.append("周围有不少树木，可以砍伐。")
-        if self.db.has_flint:
-            details.append("你看到一些岩石，也许能找到燧石。")
-        
-        if self.db.description_details:
-            description += f"\n{self.db.description_details}"
-            
-        if details:
-            description += "\n" + "\n".join(details)
-
-        # Could add danger level hints for higher perception characters
-        # if looker.db.perception > 7 and self.db.danger_level > 3:
-        #     description += "\n你隐约感觉到这片区域有些危险。"
-            
-        return description
+
+        Everything but the characters and the `appearance_per_looker` fields
+        is rendered once per viewer class and cached until the room changes;
+        the rest and `get_display_hints` are added for each look.
+        """
+        if not looker:
+            return ""
+        if kwargs:
+            fields = {name: self._render_field(name, looker, **kwargs) for name in _APPEARANCE_FIELDS}
+            fields["characters"] = self.get_display_characters(looker, **kwargs)
+        else:
+            viewer = self.get_viewer_class(looker)
+            fields = dict(self._shared_fields(looker, viewer))
+            for name in self.appearance_per_looker:
+                fields[name] = self._render_field(name, looker)
+            fields["characters"] = self._display_characters(looker, viewer)
+        appearance = self.format_appearance(
+            self.appearance_template.format(**fields), looker, **kwargs
+        )
+        hints = self.get_display_hints(looker, **kwargs)
+        return f"{appearance}\n{hints}" if hints else appearance
+
+
+class WildernessRoom(ForestRoom):
+    """
+    A room showing one tile of the wilderness (see `world.wilderness`).
+    The same room serves different tiles over time; what it looks like
+    comes from the generated tile, unless an Attribute on the room itself
+    overrides it.
+    """
+
+    # the exits shown depend on where the looker entered the wilderness
+    appearance_per_looker = ("exits",)
+
+    def at_object_creation(self):
+        """
+        Called only once, when the object is first created. Unlike other
+        forest rooms it stores no environment values; they come from the
+        tile it is bound to.
+        """
+        DefaultRoom.at_object_creation(self)
+
+    @property
+    def coordinates(self):
+        """
+        The `(x, y)` of the tile this room is bound to, or None.
+        """
+        if self.ndb.coordinates is None:
+            coordinates = self.attributes.get("coordinates")
+            self.ndb.coordinates = tuple(coordinates) if coordinates else None
+        return self.ndb.coordinates
+
+    @property
+    def tile(self):
+        """
+        `(key, definition)` of the generated tile, or None when unbound.
+        """
+        if self.ndb.tile is None and self.coordinates is not None:
+            self.ndb.tile = WILDERNESS.tile(self.coordinates)
+        return self.ndb.tile
+
+    def get_feature(self, name, default=None):
+        """
+        Environment values come from the tile unless set on the room.
+        """
+        value = self.attributes.get(name)
+        if value is not None or self.tile is None:
+            return default if value is None else value
+        return self.tile[1]["attributes"].get(name, default)
+
+    def get_display_name(self, looker, **kwargs):
+        """
+        Rooms are named after their tile.
+        """
+        if self.tile is None:
+            return super().get_display_name(looker, **kwargs)
+        return self.tile[0]
+
+    def get_display_desc(self, looker, **kwargs):
+        """
+        The tile's description, unless the room has one of its own.
+        """
+        if self.db.desc or self.tile is None:
+            return super().get_display_desc(looker, **kwargs)
+        return self.tile[1]["desc"]
+
+    def filter_visible(self, obj_list, looker, **kwargs):
+        """
+        Hide the exits that lead nowhere from here.
+        """
+        visible = super().filter_visible(obj_list, looker, **kwargs)
+        return [
+            obj for obj in visible
+            if not obj.destination or not hasattr(obj, "leads_somewhere")
+            or obj.leads_somewhere(looker)
+        ]
+
+    def at_object_leave(self, moved_obj, target_location, move_type="move", **kwargs):
+        """
+        Lets the wilderness release the tile once it is left empty.
+        """
+        super().at_object_leave(moved_obj, target_location, move_type=move_type, **kwargs)
+        WILDERNESS.at_leave(self, leaving=moved_obj)
@@ -0,0 +1,502 @@
+"""
+Monster AI
+
+Monsters (`typeclasses.characters.MonsterCharacter`) only think while a
+player is close enough to notice. A monster is *awake* when it stands
+within `settings.MONSTER_AI_RADIUS` exits of a room with an online
+character (counted on `world.pathfinding.ROOM_GRAPH`), or while it is
+fighting; every other monster is *asleep* and costs nothing: it isn't
+polled, and isn't even loaded from the database.
+
+- Where the monsters are is kept in memory as ids, per room: loaded with
+  one query at server start and kept current by listening to the `ENTER`
+  events of all rooms (`world.events`) and the monsters' creation and
+  deletion.
+- The same events wake the monsters around a room when an online
+  character walks in. Awake aggressive monsters in that very room attack
+  at once; the others react on the next tick, never after a scan.
+- One system on the tick scheduler (`world.ticks`) runs the behaviour
+  trees of all awake monsters in one batch. The rooms around the players
+  are worked out once per tick, from the players' rooms outwards, and
+  monsters that ended up out of reach and aren't fighting are put back to
+  sleep (their stats are flushed, so nothing pins them in memory).
+
+So the cost grows with how many players are about and what is near them,
+not with how many monsters the world holds.
+
+Behaviour trees are made of `Selector`, `Sequence`, `Condition` and
+`Action` nodes; each node returns `SUCCESS`, `FAILURE` or `RUNNING`. A
+monster runs the tree in `BEHAVIOURS` named by its `behaviour` Attribute.
+
+Usage:
+
+    from world.ai import MONSTER_AI
+
+    MONSTER_AI.is_awake(wolf)
+    MONSTER_AI.wake_around(room)       # e.g. after a loud noise
+    MONSTER_AI.tick()                  # run by the tick scheduler
+
+"""
+
+import random
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+
+from world.broadcast import BROADCAST
+from world.combat import COMBAT
+from world.events import ENTER, ROOM_EVENTS
+from world.gamelog import get_logger
+from world.online import ONLINE_CHARACTERS
+from world.pathfinding import ROOM_GRAPH
+from world.ticks import TICK_SCHEDULER
+
+MONSTER_TAG = ("monster", "npc")
+MONSTER_TYPECLASS = "typeclasses.characters.MonsterCharacter"
+
+SUCCESS, FAILURE, RUNNING = "success", "failure", "running"
+
+log = get_logger("ai")
+
+
+# behaviour tree nodes
+
+
+class Node(ABC):
+    """
+    Base of the behaviour tree nodes.
+    """
+
+    @abstractmethod
+    def run(self, monster, context):
+        """
+        Args:
+            monster (MonsterCharacter): Who is thinking.
+            context (AIContext): What this tick knows about the world.
+
+        Returns:
+            str: `SUCCESS`, `FAILURE` or `RUNNING`.
+
+        """
+
+
+class Selector(Node):
+    """
+    Runs its children in order until one doesn't fail.
+    """
+
+    def __init__(self, *children):
+        self.children = children
+
+    def run(self, monster, context):
+        for child in self.children:
+            status = child.run(monster, context)
+            if status != FAILURE:
+                return status
+        return FAILURE
+
+
+class Sequence(Node):
+    """
+    Runs its children in order while they succeed.
+    """
+
+    def __init__(self, *children):
+        self.children = children
+
+    def run(self, monster, context):
+        for child in self.children:
+            status = child.run(monster, context)
+            if status != SUCCESS:
+                return status
+        return SUCCESS
+
+
+class Condition(Node):
+    """
+    Succeeds if `check(monster, context)` is true.
+    """
+
+    def __init__(self, check):
+        self.check = check
+
+    def run(self, monster, context):
+        return SUCCESS if self.check(monster, context) else FAILURE
+
+
+class Action(Node):
+    """
+    Does `act(monster, context)`, which returns the status.
+    """
+
+    def __init__(self, act):
+        self.act = act
+
+    def run(self, monster, context):
+        return self.act(monster, context)
+
+
+class AIContext:
+    """
+    What one tick knows about the world, worked out once for all monsters.
+
+    """
+
+    __slots__ = ("now", "near")
+
+    def __init__(self, now, near):
+        self.now = now
+        # room id -> (steps to the nearest online character, its room id)
+        self.near = near
+
+    def nearest_player(self, room):
+        """
+        Returns:
+            tuple or None: `(steps, room id)` of the closest online character.
+
+        """
+        return self.near.get(getattr(room, "id", room))
+
+
+# conditions and actions
+
+
+def is_fighting(monster, context):
+    return COMBAT.is_fighting(monster)
+
+
+def attack_player(monster, context):
+    """
+    Attack an online character in the monster's room.
+    """
+    targets = [
+        char for char in ONLINE_CHARACTERS.in_room(monster.location) if char.stats.current_hp > 0
+    ]
+    if not targets:
+        return FAILURE
+    pounce(monster, random.choice(targets), context.now)
+    return SUCCESS
+
+
+def pounce(monster, target, now=None):
+    """
+    Make a monster attack `target`, with a line for the room.
+    """
+    BROADCAST.room(monster.location, f"{monster.key}朝{target.key}扑了过来！")
+    COMBAT.engage(monster, target, now=now)
+
+
+def chase_player(monster, context):
+    """
+    Take one step towards the closest online character within the
+    monster's `chase_range`.
+    """
+    nearest = context.nearest_player(monster.location)
+    if not nearest or not 0 < nearest[0] <= monster.attributes.get("chase_range", default=1):
+        return FAILURE
+    exit = ROOM_GRAPH.next_exit(monster.location, nearest[1])
+    if exit is None or not exit.access(monster, "traverse"):
+        return FAILURE
+    exit.at_traverse(monster, exit.destination)
+    return SUCCESS
+
+
+def wander(monster, context):
+    """
+    Now and then (`wander_chance`) walk to a neighbouring room of the same
+    region.
+    """
+    if random.random() >= monster.attributes.get("wander_chance", default=0.1):
+        return FAILURE
+    room = monster.location
+    regions = set(ROOM_GRAPH.regions(room))
+    allowed = {
+        exit_id for exit_id, destination_id in ROOM_GRAPH.neighbours(room)
+        if not regions or regions & set(ROOM_GRAPH.regions(destination_id))
+    }
+    exits = [exit for exit in room.exits if exit.id in allowed and exit.access(monster, "traverse")]
+    if not exits:
+        return FAILURE
+    exit = random.choice(exits)
+    exit.at_traverse(monster, exit.destination)
+    return SUCCESS
+
+
+def idle(monster, context):
+    return RUNNING
+
+
+BEHAVIOURS = {
+    # attacks players in sight and hunts them down
+    "aggressive": Selector(
+        Condition(is_fighting),
+        Action(attack_player),
+        Action(chase_player),
+        Action(wander),
+        Action(idle),
+    ),
+    # fights back when attacked, otherwise roams
+    "passive": Selector(
+        Condition(is_fighting),
+        Action(wander),
+        Action(idle),
+    ),
+}
+
+
+class MonsterAI:
+    """
+    Where the monsters are, which of them are awake, and the batched tick
+    running their behaviour.
+
+    """
+
+    def __init__(self):
+        # room id -> ids of the monsters in it
+        self._by_room = defaultdict(set)
+        # monster id -> room id
+        self._placement = {}
+        # monster id -> monster, for the awake ones
+        self._awake = {}
+        # ids woken since the last tick, not loaded yet
+        self._waking = set()
+        self._loaded = False
+        self._listener = None
+        self.last_count = 0
+
+    def __len__(self):
+        return len(self._placement)
+
+    @property
+    def radius(self):
+        """
+        How many exits away from a player monsters wake up.
+        """
+        return getattr(settings, "MONSTER_AI_RADIUS", 2)
+
+    def load(self):
+        """
+        Find all monsters after a server start and register the AI system.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        monsters = ObjectDB.objects.filter(
+            db_tags__db_key=MONSTER_TAG[0], db_tags__db_category=MONSTER_TAG[1]
+        ).values_list("id", "db_location_id")
+        for monster_id, room_id in monsters:
+            self._place(monster_id, room_id)
+        self._listener = ROOM_EVENTS.subscribe(ENTER, self.at_enter)
+        TICK_SCHEDULER.register("monster_ai", self.tick, period=5)
+        log.info("Monsters loaded.", monsters=len(self._placement))
+
+    def clear(self):
+        """
+        Forget everything; it's rebuilt by the next `load`.
+        """
+        self._by_room.clear()
+        self._placement.clear()
+        self._awake.clear()
+        self._waking.clear()
+        self._loaded = False
+        if self._listener is not None:
+            ROOM_EVENTS.unsubscribe(self._listener)
+            self._listener = None
+        TICK_SCHEDULER.unregister("monster_ai")
+
+    # where the monsters are
+
+    def _place(self, monster_id, room_id):
+        old = self._placement.pop(monster_id, None)
+        if old is not None:
+            monsters = self._by_room.get(old)
+            if monsters is not None:
+                monsters.discard(monster_id)
+                if not monsters:
+                    del self._by_room[old]
+        if room_id is not None:
+            self._placement[monster_id] = room_id
+            self._by_room[room_id].add(monster_id)
+
+    def place(self, monster):
+        """
+        Note where a monster is now, e.g. after it was created, and wake it
+        if a player is near.
+
+        Args:
+            monster (MonsterCharacter): The monster.
+
+        """
+        location = monster.location
+        self._place(monster.id, location.id if location else None)
+        if location and self._player_near(location):
+            self.wake(monster)
+
+    def remove(self, monster):
+        """
+        Forget a monster, e.g. one about to be deleted.
+
+        Args:
+            monster (MonsterCharacter): The monster.
+
+        """
+        self._place(monster.id, None)
+        self._awake.pop(monster.id, None)
+        self._waking.discard(monster.id)
+
+    def monsters_in(self, room):
+        """
+        Args:
+            room (Room or int): The room.
+
+        Returns:
+            set: Ids of the monsters in it.
+
+        """
+        return set(self._by_room.get(getattr(room, "id", room), ()))
+
+    def at_enter(self, event):
+        """
+        Listener for the `ENTER` event of every room: follows monsters
+        moving, and when an online character arrives wakes the monsters
+        around and lets the awake aggressive ones in the room pounce.
+
+        Args:
+            event (RoomEvent): The event.
+
+        """
+        obj, room = event.obj, event.room
+        if obj.id in self._placement or obj.is_typeclass(MONSTER_TYPECLASS, exact=False):
+            self.place(obj)
+        elif obj in ONLINE_CHARACTERS:
+            self.wake_around(room)
+            if obj.stats.current_hp <= 0:
+                return
+            for monster_id in list(self._by_room.get(room.id, ())):
+                monster = self._awake.get(monster_id)
+                if (
+                    monster is None
+                    or COMBAT.is_fighting(monster)
+                    or monster.attributes.get("behaviour", default="passive") != "aggressive"
+                ):
+                    continue
+                # the newcomer isn't in the online index's room bucket yet
+                pounce(monster, obj)
+
+    # waking and sleeping
+
+    def _player_near(self, room):
+        return any(
+            ONLINE_CHARACTERS.count_in_room(room_id)
+            for room_id in ROOM_GRAPH.within(room, self.radius)
+        )
+
+    def is_awake(self, monster):
+        return monster.id in self._awake or monster.id in self._waking
+
+    def wake(self, monster):
+        """
+        Args:
+            monster (MonsterCharacter): A monster to run on the next tick.
+
+        """
+        self._awake[monster.id] = monster
+        self._waking.discard(monster.id)
+
+    def wake_around(self, room):
+        """
+        Wake the monsters within the AI radius of a room.
+
+        Args:
+            room (Room or int): The room.
+
+        Returns:
+            int: How many monsters were newly woken.
+
+        """
+        woken = 0
+        for room_id in ROOM_GRAPH.within(room, self.radius):
+            for monster_id in self._by_room.get(room_id, ()):
+                if monster_id not in self._awake and monster_id not in self._waking:
+                    self._waking.add(monster_id)
+                    woken += 1
+        return woken
+
+    def sleep(self, monster):
+        """
+        Stop running a monster until a player comes near again.
+
+        Args:
+            monster (MonsterCharacter): The monster.
+
+        """
+        if self._awake.pop(monster.id, None) is not None and monster.pk:
+            monster.stats.flush()
+
+    # the tick
+
+    def _near_players(self):
+        """
+        Rooms within the AI radius of an online character, with the steps to
+        (and room of) the closest one.
+        """
+        radius = self.radius
+        near = {}
+        for player_room in ONLINE_CHARACTERS.rooms():
+            for room_id, steps in ROOM_GRAPH.within(player_room, radius).items():
+                if room_id not in near or steps < near[room_id][0]:
+                    near[room_id] = (steps, player_room)
+        return near
+
+    def tick(self, now=None):
+        """
+        Wake the monsters near players, put the others to sleep and run
+        the behaviour of the awake ones. Run by the tick scheduler.
+
+        Args:
+            now (float, optional): The current time.
+
+        Returns:
+            int: How many monsters ran.
+
+        """
+        now = time.time() if now is None else now
+        context = AIContext(now, self._near_players())
+        for room_id in context.near:
+            for monster_id in self._by_room.get(room_id, ()):
+                if monster_id not in self._awake:
+                    self._waking.add(monster_id)
+        if self._waking:
+            for monster in ObjectDB.objects.filter(id__in=list(self._waking)):
+                self._awake[monster.id] = monster
+            self._waking.clear()
+
+        ran = 0
+        for monster in list(self._awake.values()):
+            location = monster.location
+            if not monster.pk or location is None:
+                self.remove(monster)
+                continue
+            if location.id not in context.near and not COMBAT.is_fighting(monster):
+                self.sleep(monster)
+                continue
+            tree = BEHAVIOURS.get(monster.attributes.get("behaviour", default="passive"))
+            if tree is None:
+                continue
+            try:
+                tree.run(monster, context)
+            except Exception:
+                # one broken monster shouldn't stop the others
+                logger.log_trace(f"MonsterAI: behaviour of {monster.key} (#{monster.id}) failed.")
+            ran += 1
+        self.last_count = ran
+        if ran:
+            log.debug("Monsters ran.", monsters=ran, asleep=len(self._placement) - len(self._awake))
+        return ran
+
+
+MONSTER_AI = MonsterAI()
@@ -0,0 +1,54 @@
+"""
+Attribute helpers
+
+Evennia saves an Attribute every time `obj.db.x = ...` is assigned, which
+is one UPDATE per value. The helpers here let game systems that touch many
+values at once (needs ticks, stat flushes) push all of them to the
+database in a single transaction instead.
+
+"""
+
+from django.db import transaction
+from evennia.typeclasses.attributes import Attribute
+from evennia.utils.dbserialize import to_pickle
+
+
+def bulk_set_attributes(updates, batch_size=500):
+    """
+    Write many Attribute values in one transaction.
+
+    Existing Attributes are updated in place with one `bulk_update` per
+    `batch_size` rows. Attributes that don't exist yet are created the
+    normal way (this only happens the first time a value is written).
+
+    Args:
+        updates (iterable): Tuples `(obj, key, value)`. Only uncategorized
+            Attributes are handled, which is what `obj.db` uses.
+        batch_size (int, optional): Max rows per UPDATE statement.
+
+    Returns:
+        int: The number of Attribute values written.
+
+    """
+    changed = []
+    missing = []
+    for obj, key, value in updates:
+        attr = obj.attributes.get(key, return_obj=True)
+        if attr:
+            # the handler caches the Attribute instance, so updating the
+            # field here keeps `obj.db.key` in sync without a re-read
+            attr.db_value = to_pickle(value)
+            changed.append(attr)
+        else:
+            missing.append((obj, key, value))
+
+    if not changed and not missing:
+        return 0
+
+    with transaction.atomic():
+        if changed:
+            Attribute.objects.bulk_update(changed, ["db_value"], batch_size=batch_size)
+        for obj, key, value in missing:
+            obj.attributes.add(key, value)
+
+    return len(changed) + len(missing)
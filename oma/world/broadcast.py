@@ -0,0 +1,205 @@
+"""
+Broadcasts
+
+`msg_contents` sends a room message to every object in the room, one by
+one: the text is run through the funcparser for each receiver, handed to
+each of their sessions, and then turned into ANSI or HTML by the Portal
+once per session. For a fight among fifty players in the spawn clearing,
+where every hit goes to everyone, that is a lot of identical work.
+
+`BROADCAST` queues room lines and sends them all at the end of the frame
+(`world.ticks.FRAME_CLOCK`, `settings.FRAME_CLOCK_INTERVAL` seconds):
+
+- Everything a character is sent within one frame is joined into a single
+  send, however many attacks, skills and deaths produced it.
+- Only characters somebody is connected to are looked at, not every item
+  in the room.
+- Recipients are grouped by the text they get and how their client
+  renders it (protocol and color settings). Each group's text is rendered
+  once, here, and sent as-is to its sessions, so the Portal doesn't parse
+  it again per session. Sessions whose protocol isn't known here (or that
+  use screenreader or raw mode) get the text the normal way.
+
+Texts are sent as they are: `$You()`-style inline functions aren't parsed,
+so broadcast lines should be plain text with color markup only.
+
+Anything sent directly (`obj.msg`) goes out at once, ahead of the queued
+lines; code about to send something that must read after them (like a
+death) calls `BROADCAST.flush()` first.
+
+Usage:
+
+    from world.broadcast import BROADCAST
+
+    BROADCAST.room(room, "灰狼咬了你一口！", exclude=[wolf])
+    BROADCAST.msg(char, "你停止了战斗。")
+    BROADCAST.flush()                  # send now instead of at frame end
+
+"""
+
+import re
+from collections import defaultdict
+
+from evennia.server.portal.mxp import mxp_parse
+from evennia.utils.ansi import parse_ansi
+from evennia.utils.text2html import parse_html
+
+from world.gamelog import get_logger
+from world.ticks import FRAME_CLOCK
+
+TELNET_PROTOCOLS = ("telnet", "telnet/ssl")
+WEBSOCKET_PROTOCOLS = ("webclient/websocket",)
+# the rendered text goes through the Portal untouched
+RAW_OPTIONS = {"raw": True, "client_raw": True}
+
+_RE_N = re.compile(r"\|n$")
+
+log = get_logger("broadcast")
+
+
+def render_key(session):
+    """
+    How a session's client wants text rendered, worked out like the
+    Portal's protocols do.
+
+    Args:
+        session (ServerSession): The session.
+
+    Returns:
+        tuple or None: Sessions with the same key get the same bytes; None if
+            the session's text must be rendered by the Portal.
+
+    """
+    flags = session.protocol_flags
+    if flags.get("SCREENREADER") or flags.get("RAW"):
+        return None
+    protocol = session.protocol_key
+    if protocol in TELNET_PROTOCOLS:
+        ttype = flags.get("TTYPE", False)
+        xterm256 = flags.get("XTERM256", False) if ttype else True
+        truecolor = flags.get("TRUECOLOR", False) if ttype else True
+        ansi = flags.get("ANSI", False) if ttype else True
+        nocolor = bool(flags.get("NOCOLOR") or not (xterm256 or ansi))
+        return ("telnet", nocolor, xterm256, truecolor, flags.get("MXP", False))
+    if protocol in WEBSOCKET_PROTOCOLS:
+        return ("websocket", bool(flags.get("NOCOLOR", False)))
+    return None
+
+
+def render(text, key):
+    """
+    Render text for all sessions with one `render_key`.
+
+    Args:
+        text (str): Text with Evennia color markup.
+        key (tuple): A `render_key`.
+
+    Returns:
+        str: What the client gets.
+
+    """
+    if key[0] == "telnet":
+        _, nocolor, xterm256, truecolor, mxp = key
+        text = parse_ansi(
+            _RE_N.sub("", text) + ("||n" if text.endswith("|") else "|n"),
+            strip_ansi=nocolor,
+            xterm256=xterm256,
+            mxp=mxp,
+            truecolor=truecolor,
+        )
+        return mxp_parse(text) if mxp else text
+    return parse_html(text, strip_ansi=key[1])
+
+
+class Broadcaster:
+    """
+    Lines queued per recipient until the end of the frame.
+
+    """
+
+    def __init__(self):
+        # recipient id -> (recipient, [lines]), in the order first queued
+        self._pending = {}
+        self.sends = 0
+        self.renders = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _queue(self, recipient, text):
+        entry = self._pending.get(recipient.id)
+        if entry is None:
+            if not self._pending:
+                FRAME_CLOCK.subscribe("broadcast", self.flush)
+            self._pending[recipient.id] = (recipient, [text])
+        else:
+            entry[1].append(text)
+
+    def msg(self, recipient, text):
+        """
+        Queue a line for one recipient.
+
+        Args:
+            recipient (Object): Who gets it; ignored if nobody is connected
+                to it.
+            text (str): The line.
+
+        """
+        if recipient.sessions.count():
+            self._queue(recipient, text)
+
+    def room(self, room, text, exclude=None):
+        """
+        Queue a line for everyone connected in a room.
+
+        Args:
+            room (Room): The room.
+            text (str): The line.
+            exclude (list, optional): Objects not to send it to.
+
+        """
+        excluded = {obj.id for obj in exclude or ()}
+        for char in room.contents_get(content_type="character"):
+            if char.id not in excluded and char.sessions.count():
+                self._queue(char, text)
+
+    def flush(self, now=None):
+        """
+        Send everything queued. Called by `FRAME_CLOCK` at the end of the
+        frame, or directly to send right away.
+
+        Returns:
+            int: Number of sessions sent to.
+
+        """
+        pending = self._pending
+        if not pending:
+            return 0
+        self._pending = {}
+        FRAME_CLOCK.unsubscribe("broadcast")
+
+        groups = defaultdict(list)
+        for recipient, lines in pending.values():
+            if not recipient.pk:
+                continue
+            text = "\n".join(lines)
+            for session in recipient.sessions.all():
+                groups[(text, render_key(session))].append(session)
+
+        sent = 0
+        for (text, key), sessions in groups.items():
+            if key is None:
+                for session in sessions:
+                    session.data_out(text=text)
+            else:
+                rendered = render(text, key)
+                self.renders += 1
+                for session in sessions:
+                    session.data_out(text=rendered, options=RAW_OPTIONS)
+            sent += len(sessions)
+        self.sends += sent
+        log.debug("Broadcast flushed.", recipients=len(pending), groups=len(groups), sends=sent)
+        return sent
+
+
+BROADCAST = Broadcaster()
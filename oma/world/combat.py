@@ -0,0 +1,421 @@
+"""
+Combat engine
+
+Real-time auto-attack combat for every fighter in the game, run by one
+in-memory scheduler instead of a timer Script per combatant.
+
+Each fighter has a next-attack time in a priority queue (a heap). Every
+frame of the shared `FRAME_CLOCK` pops all attacks that are due, resolves
+them in one batch and re-queues the attackers `attack_speed` seconds later.
+The clock only runs while someone is fighting, so a large brawl in one
+clearing still costs a single timer and no database rows.
+
+Only outcomes are persisted: hp and combat state go through the fighters'
+write-behind `stats`, and a fighter's stats are flushed when it leaves
+combat (deaths are flushed by `at_death`). Attack lines go out through
+`world.broadcast`, which sends each player everything of one frame as a
+single message.
+
+Engagements live only in memory. On reload they are saved as one compact
+snapshot (`save_snapshot`) and resumed with their attack timing afterwards
+(`load_snapshot`), see `server/conf/at_server_startstop.py`.
+
+Usage:
+
+    from world.combat import COMBAT
+
+    COMBAT.engage(attacker, target)   # start (or switch) attacking
+    COMBAT.disengage(char)            # stop fighting
+    COMBAT.end_fights(char)           # ... and stop everyone fighting it
+    COMBAT.is_fighting(char)
+
+"""
+
+import heapq
+import random
+import time
+from collections import defaultdict
+
+from world.broadcast import BROADCAST
+from world.events import COMBAT_START, ROOM_EVENTS
+from world.gamelog import get_logger
+from world.stats import flush_handlers
+from world.ticks import FRAME_CLOCK
+
+# hit chance for equal agility, change per point of agility difference,
+# and the bounds it is clamped to
+BASE_HIT_CHANCE = 0.8
+HIT_CHANCE_PER_AGILITY = 0.05
+MIN_HIT_CHANCE = 0.05
+MAX_HIT_CHANCE = 0.95
+# used when a fighter has no (valid) attack_speed
+DEFAULT_ATTACK_SPEED = 2.5
+# ServerConfig key the engagements are kept under across a reload
+SNAPSHOT_KEY = "combat_snapshot"
+
+log = get_logger("combat")
+
+
+class Combatant:
+    """
+    Combat data of one fighter. The static combat stats are read once when
+    the fighter engages instead of on every attack.
+
+    """
+
+    __slots__ = ("char", "target", "due", "attack_speed", "attack_power", "defense", "agility")
+
+    def __init__(self, char, target, due):
+        self.char = char
+        self.target = target
+        self.due = due
+        attributes = char.attributes
+        attack_speed = attributes.get("attack_speed", default=DEFAULT_ATTACK_SPEED)
+        self.attack_speed = max(0.1, attack_speed or DEFAULT_ATTACK_SPEED)
+        self.attack_power = attributes.get("attack_power", default=1) or 0
+        self.defense = attributes.get("defense", default=0) or 0
+        self.agility = attributes.get("agility", default=0) or 0
+
+    def __repr__(self):
+        return f"<Combatant {self.char.key} -> {self.target.key} due={self.due:.2f}>"
+
+
+class CombatEngine:
+    """
+    Priority-queue scheduler resolving the attacks of all fighters.
+
+    """
+
+    def __init__(self):
+        self.fighters = {}
+        self._queue = []
+        self._counter = 0
+
+    def __len__(self):
+        return len(self.fighters)
+
+    def is_fighting(self, char):
+        """
+        Args:
+            char (Object): A character.
+
+        Returns:
+            bool: If it is currently attacking someone.
+
+        """
+        return char.id in self.fighters
+
+    def target_of(self, char):
+        """
+        Args:
+            char (Object): A character.
+
+        Returns:
+            Object or None: Who it is attacking.
+
+        """
+        fighter = self.fighters.get(char.id)
+        return fighter.target if fighter else None
+
+    def _schedule(self, fighter, due):
+        fighter.due = due
+        self._counter += 1
+        heapq.heappush(self._queue, (due, self._counter, fighter.char.id))
+
+    # entering and leaving combat
+
+    def engage(self, attacker, target, now=None, retaliate=True):
+        """
+        Make `attacker` auto-attack `target`. An attacker that is already
+        fighting just switches targets and keeps its attack timing.
+
+        Args:
+            attacker (Object): Who attacks. Must have `stats`.
+            target (Object): Who is attacked. Must have `stats`.
+            now (float, optional): The current time.
+            retaliate (bool, optional): Make an idle target fight back.
+
+        """
+        now = time.time() if now is None else now
+        fighter = self.fighters.get(attacker.id)
+        if fighter:
+            fighter.target = target
+        else:
+            fighter = self.fighters[attacker.id] = Combatant(attacker, target, now)
+            self._schedule(fighter, now + fighter.attack_speed)
+            if attacker.location:
+                ROOM_EVENTS.emit(attacker.location, COMBAT_START, attacker, target=target)
+        attacker.stats.is_in_combat = True
+        attacker.stats.combat_target = target
+
+        if retaliate and not self.is_fighting(target):
+            self.engage(target, attacker, now=now, retaliate=False)
+        FRAME_CLOCK.subscribe("combat", self.run_frame)
+        log.debug("%s engages %s.", attacker.key, target.key)
+
+    def disengage(self, char, save=True):
+        """
+        Take a character out of combat. Its queued attack is dropped lazily.
+
+        Args:
+            char (Object): The character.
+            save (bool, optional): Flush its stats right away.
+
+        """
+        if self.fighters.pop(char.id, None) is None:
+            return
+        char.stats.is_in_combat = False
+        char.stats.combat_target = None
+        if save:
+            char.stats.flush()
+        if not self.fighters:
+            self._queue.clear()
+            FRAME_CLOCK.unsubscribe("combat")
+
+    def end_fights(self, char):
+        """
+        Take a character and everyone attacking it out of combat, e.g.
+        when it dies. Stats of the attackers are flushed.
+
+        Args:
+            char (Object): The character.
+
+        """
+        attackers = [
+            fighter.char for fighter in self.fighters.values() if fighter.target == char
+        ]
+        self.disengage(char, save=False)
+        for attacker in attackers:
+            self.disengage(attacker, save=False)
+            BROADCAST.msg(attacker, "你停止了战斗。")
+        flush_handlers(attacker.stats for attacker in attackers)
+
+    def disengage_all(self):
+        """
+        Take everyone out of combat, flushing their stats in one go. Used on
+        shutdown so nobody is left flagged as fighting.
+        """
+        chars = [fighter.char for fighter in self.fighters.values()]
+        for char in chars:
+            self.disengage(char, save=False)
+        flush_handlers(char.stats for char in chars if char.pk)
+
+    def clear(self):
+        """
+        Stop all fights without touching anyone's stats.
+        """
+        self.fighters.clear()
+        self._queue.clear()
+        FRAME_CLOCK.unsubscribe("combat")
+
+    # surviving reloads
+
+    def snapshot(self, now=None):
+        """
+        Describe all engagements compactly, for `restore`.
+
+        Args:
+            now (float, optional): The current time.
+
+        Returns:
+            list: `(attacker id, target id, seconds to next attack)` tuples.
+
+        """
+        now = time.time() if now is None else now
+        return [
+            (char_id, fighter.target.id, round(max(0.0, fighter.due - now), 2))
+            for char_id, fighter in self.fighters.items()
+            if fighter.target is not None
+        ]
+
+    def restore(self, snapshot, now=None):
+        """
+        Resume the engagements of a `snapshot`, keeping each fighter's
+        attack timing. Fighters or targets that no longer exist are skipped;
+        ones that are no longer together drop out on their next attack.
+
+        Args:
+            snapshot (list): As returned by `snapshot`.
+            now (float, optional): The current time.
+
+        Returns:
+            int: Number of engagements restored.
+
+        """
+        from evennia.objects.models import ObjectDB
+
+        now = time.time() if now is None else now
+        ids = {obj_id for entry in snapshot for obj_id in entry[:2]}
+        objects = {obj.id: obj for obj in ObjectDB.objects.filter(id__in=ids)}
+        restored = 0
+        for char_id, target_id, remaining in snapshot:
+            char, target = objects.get(char_id), objects.get(target_id)
+            if char is None or target is None or not hasattr(char, "stats"):
+                continue
+            fighter = self.fighters[char_id] = Combatant(char, target, now)
+            self._schedule(fighter, now + remaining)
+            char.stats.is_in_combat = True
+            char.stats.combat_target = target
+            restored += 1
+        if self.fighters:
+            FRAME_CLOCK.subscribe("combat", self.run_frame)
+        return restored
+
+    def save_snapshot(self):
+        """
+        Store the snapshot in one `ServerConfig` entry, to be picked up by
+        `load_snapshot` after a reload.
+
+        Returns:
+            int: Number of engagements saved.
+
+        """
+        from evennia.server.models import ServerConfig
+
+        snapshot = self.snapshot()
+        ServerConfig.objects.conf(SNAPSHOT_KEY, snapshot)
+        return len(snapshot)
+
+    def load_snapshot(self):
+        """
+        Restore and delete the snapshot stored by `save_snapshot`, if any.
+
+        Returns:
+            int: Number of engagements restored.
+
+        """
+        from evennia.server.models import ServerConfig
+
+        snapshot = ServerConfig.objects.conf(SNAPSHOT_KEY)
+        if not snapshot:
+            return 0
+        ServerConfig.objects.conf(SNAPSHOT_KEY, delete=True)
+        restored = self.restore(snapshot)
+        log.info("Restored %s of %s engagements after reload.", restored, len(snapshot))
+        return restored
+
+    # resolution
+
+    def can_hit(self, char, target):
+        """
+        Whether `char` can attack `target` right now: both alive and in the
+        same room.
+
+        Args:
+            char (Object): The attacker.
+            target (Object): The target.
+
+        Returns:
+            bool: If the attack can happen.
+
+        """
+        return bool(
+            target is not None
+            and target.pk
+            and char.location is not None
+            and target.location == char.location
+            and target.stats.current_hp > 0
+            and char.stats.current_hp > 0
+        )
+
+    def _resolve(self, fighter, messages, multiplier=1.0, action="攻击"):
+        """
+        One attack. Returns the hp it took.
+        """
+        char, target = fighter.char, fighter.target
+        defender = self.fighters.get(target.id)
+        agility = defender.agility if defender else target.attributes.get("agility", default=0) or 0
+        defense = defender.defense if defender else target.attributes.get("defense", default=0) or 0
+        chance = BASE_HIT_CHANCE + (fighter.agility - agility) * HIT_CHANCE_PER_AGILITY
+        chance = min(MAX_HIT_CHANCE, max(MIN_HIT_CHANCE, chance))
+        if random.random() >= chance:
+            messages[char.location].append(f"{char.key} {action} {target.key}，但是没有命中。")
+            return 0
+        damage = max(1, int(fighter.attack_power * multiplier - defense))
+        messages[char.location].append(
+            f"{char.key} {action}了 {target.key}，造成了 {damage} 点伤害！"
+        )
+        return damage
+
+    def strike(self, attacker, target, multiplier=1.0, action="攻击", now=None):
+        """
+        Resolve one extra attack right away, e.g. for a skill, and make sure
+        both sides are fighting. Doesn't change the regular attack timing.
+
+        Args:
+            attacker (Object): Who attacks.
+            target (Object): Who is attacked.
+            multiplier (float, optional): Applied to the attack power.
+            action (str, optional): Verb used in the room message.
+            now (float, optional): The current time.
+
+        Returns:
+            int or None: The hp it took, 0 on a miss, None if the target
+                can't be hit (see `can_hit`); nothing happens then.
+
+        """
+        if not self.can_hit(attacker, target):
+            return None
+        self.engage(attacker, target, now=now)
+        messages = defaultdict(list)
+        damage = self._resolve(self.fighters[attacker.id], messages, multiplier, action)
+        for location, lines in messages.items():
+            BROADCAST.room(location, "\n".join(lines))
+        if damage:
+            target.at_damage(damage, attacker=attacker, quiet=True)
+        return damage
+
+    def run_frame(self, now=None):
+        """
+        Resolve every attack due by `now`. Called by `FRAME_CLOCK`.
+
+        Args:
+            now (float, optional): The frame's time. Defaults to `time.time()`.
+
+        Returns:
+            int: Number of attacks resolved.
+
+        """
+        now = time.time() if now is None else now
+        queue = self._queue
+        messages = defaultdict(list)
+        hits = []
+        ended = []
+        attacks = 0
+        while queue and queue[0][0] <= now:
+            due, _, char_id = heapq.heappop(queue)
+            fighter = self.fighters.get(char_id)
+            if fighter is None or fighter.due != due:
+                # fighter left combat or was rescheduled
+                continue
+            if not self.can_hit(fighter.char, fighter.target):
+                ended.append(fighter.char)
+                continue
+            damage = self._resolve(fighter, messages)
+            attacks += 1
+            if damage:
+                hits.append((fighter.target, damage, fighter.char))
+            self._schedule(fighter, due + fighter.attack_speed)
+
+        for location, lines in messages.items():
+            BROADCAST.room(location, "\n".join(lines))
+        # damage after all messages, so deaths read in order (`at_death`
+        # flushes the queued lines before its own)
+        dead = set()
+        for target, damage, attacker in hits:
+            if target.id in dead:
+                continue
+            if target.stats.current_hp <= damage:
+                dead.add(target.id)
+            target.at_damage(damage, attacker=attacker, quiet=True)
+
+        for char in ended:
+            self.disengage(char, save=False)
+            BROADCAST.msg(char, "你停止了战斗。")
+        flush_handlers(char.stats for char in ended if char.pk)
+        if attacks:
+            log.debug("Frame resolved %s attacks, %s fighters.", attacks, len(self.fighters))
+        return attacks
+
+
+COMBAT = CombatEngine()
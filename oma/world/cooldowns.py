@@ -0,0 +1,291 @@
+"""
+Cooldowns
+
+One cooldown service for all characters and NPCs, built on a hierarchical
+timing wheel. Arming, checking and expiring a cooldown are O(1), and
+cooldowns live in memory: using a skill no longer rewrites the pickled
+`skill_cooldowns` dict Attribute on every key press.
+
+The wheel has `LEVELS` rings of `SLOTS` slots. A ring-0 slot is one frame
+(`settings.FRAME_CLOCK_INTERVAL`); every slot of the next ring spans a whole
+turn of the ring below. A cooldown is filed in the finest ring that can
+hold it and moves down a ring whenever the ring above turns over, so only
+the cooldowns that are actually due get touched. The wheel is advanced by
+`FRAME_CLOCK` and only while at least one cooldown is armed.
+
+Cooldowns of at least `settings.COOLDOWN_PERSIST_MIN` seconds are also
+written to the owner's `stats.skill_cooldowns` (write-behind, see
+`world.stats`) so they survive a reload or logout; shorter ones are
+deliberately only kept in memory.
+
+When a cooldown expires the owner can be told, so clients don't have to
+poll (`settings.COOLDOWN_NOTIFY`).
+
+Usage:
+
+    from world.cooldowns import COOLDOWNS
+
+    if COOLDOWNS.ready(char, "猛击"):
+        COOLDOWNS.arm(char, "猛击", 5)
+    COOLDOWNS.remaining(char, "猛击")
+
+"""
+
+import time
+
+from django.conf import settings
+
+from world.gamelog import get_logger
+from world.ticks import FRAME_CLOCK
+
+SLOTS = 64
+LEVELS = 4
+
+log = get_logger("cooldowns")
+
+
+class Cooldown:
+    """
+    One armed cooldown.
+
+    """
+
+    __slots__ = ("owner", "name", "expires", "tick", "notify", "persistent")
+
+    def __init__(self, owner, name, expires, tick, notify, persistent):
+        self.owner = owner
+        self.name = name
+        self.expires = expires
+        self.tick = tick
+        self.notify = notify
+        self.persistent = persistent
+
+    def __repr__(self):
+        return f"<Cooldown {self.name} of {self.owner.key} expires={self.expires:.2f}>"
+
+
+class CooldownWheel:
+    """
+    Hierarchical timing wheel of cooldowns, keyed by `(owner id, name)`.
+
+    """
+
+    def __init__(self):
+        self.rings = [[set() for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self.cooldowns = {}
+        # key -> (ring, slot) it is filed under
+        self._filed = {}
+        self._loaded = set()
+        self.current = None
+
+    def __len__(self):
+        return len(self.cooldowns)
+
+    @property
+    def resolution(self):
+        """
+        Length of one ring-0 slot in seconds.
+        """
+        return FRAME_CLOCK.interval
+
+    def _tick_of(self, timestamp):
+        return int(timestamp / self.resolution)
+
+    # filing
+
+    def _file(self, key, tick):
+        delta = tick - self.current
+        for ring in range(LEVELS):
+            span = SLOTS ** ring
+            if delta < span * SLOTS or ring == LEVELS - 1:
+                slot = (tick // span) % SLOTS
+                break
+        self.rings[ring][slot].add(key)
+        self._filed[key] = (ring, slot)
+
+    def _unfile(self, key):
+        filed = self._filed.pop(key, None)
+        if filed:
+            self.rings[filed[0]][filed[1]].discard(key)
+
+    # persistence
+
+    def _persist(self, owner, name, expires):
+        stats = getattr(owner, "stats", None)
+        if stats is None:
+            return
+        cooldowns = dict(stats.skill_cooldowns or {})
+        if expires is None:
+            if cooldowns.pop(name, None) is None:
+                return
+        else:
+            cooldowns[name] = expires
+        stats.skill_cooldowns = cooldowns
+
+    def _load(self, owner, now):
+        """
+        Arm the persisted cooldowns of an owner the first time it is seen.
+        """
+        if owner.id in self._loaded:
+            return
+        self._loaded.add(owner.id)
+        stats = getattr(owner, "stats", None)
+        stored = stats.skill_cooldowns if stats is not None else None
+        if not stored:
+            return
+        for name, expires in list(stored.items()):
+            if expires > now and (owner.id, name) not in self.cooldowns:
+                self._arm(owner, name, expires, now, notify=None, persistent=True)
+        if any(expires <= now for expires in stored.values()):
+            stats.skill_cooldowns = {
+                name: expires for name, expires in stored.items() if expires > now
+            }
+
+    # public api
+
+    def _arm(self, owner, name, expires, now, notify, persistent):
+        if not self.cooldowns:
+            self.current = self._tick_of(now)
+            FRAME_CLOCK.subscribe("cooldowns", self.advance)
+        key = (owner.id, name)
+        self._unfile(key)
+        tick = max(self._tick_of(expires) + 1, self.current + 1)
+        self.cooldowns[key] = Cooldown(owner, name, expires, tick, notify, persistent)
+        self._file(key, tick)
+
+    def arm(self, owner, name, duration, notify=None, now=None):
+        """
+        Start (or restart) a cooldown.
+
+        Args:
+            owner (Object): Who the cooldown belongs to.
+            name (str): What is cooling down, like a skill name.
+            duration (float): Seconds until it is ready again.
+            notify (bool, optional): Tell the owner when it expires.
+                Defaults to `settings.COOLDOWN_NOTIFY`.
+            now (float, optional): The current time.
+
+        """
+        now = time.time() if now is None else now
+        self._load(owner, now)
+        expires = now + duration
+        persistent = duration >= getattr(settings, "COOLDOWN_PERSIST_MIN", 60)
+        self._arm(owner, name, expires, now, notify, persistent)
+        if persistent:
+            self._persist(owner, name, expires)
+
+    def remaining(self, owner, name, now=None):
+        """
+        Args:
+            owner (Object): Who the cooldown belongs to.
+            name (str): What is cooling down.
+            now (float, optional): The current time.
+
+        Returns:
+            float: Seconds until it is ready, 0 if it is ready.
+
+        """
+        now = time.time() if now is None else now
+        self._load(owner, now)
+        cooldown = self.cooldowns.get((owner.id, name))
+        return max(0.0, cooldown.expires - now) if cooldown else 0.0
+
+    def ready(self, owner, name, now=None):
+        """
+        Returns:
+            bool: If the cooldown is not running.
+
+        """
+        return not self.remaining(owner, name, now=now)
+
+    def cancel(self, owner, name):
+        """
+        Stop a cooldown without notifying anyone.
+
+        Args:
+            owner (Object): Who the cooldown belongs to.
+            name (str): What is cooling down.
+
+        """
+        key = (owner.id, name)
+        cooldown = self.cooldowns.pop(key, None)
+        if cooldown:
+            self._unfile(key)
+            if cooldown.persistent:
+                self._persist(owner, name, None)
+
+    def forget(self, owner):
+        """
+        Drop all in-memory cooldowns of an owner, e.g. when it is deleted.
+        Persisted ones are loaded again next time the owner is seen.
+
+        Args:
+            owner (Object): The owner.
+
+        """
+        for key in [key for key in self.cooldowns if key[0] == owner.id]:
+            self.cooldowns.pop(key)
+            self._unfile(key)
+        self._loaded.discard(owner.id)
+
+    # expiry
+
+    def advance(self, now=None):
+        """
+        Move the wheel up to `now`, expiring everything due. Called every
+        frame by `FRAME_CLOCK` while cooldowns are armed.
+
+        Args:
+            now (float, optional): The current time.
+
+        Returns:
+            int: Number of cooldowns that expired.
+
+        """
+        now = time.time() if now is None else now
+        target = self._tick_of(now)
+        expired = []
+        while self.cooldowns and self.current < target:
+            self.current += 1
+            tick = self.current
+            # move the due slot of each turned-over ring down
+            for ring in range(LEVELS - 1, 0, -1):
+                span = SLOTS ** ring
+                if tick % span == 0:
+                    slot = self.rings[ring][(tick // span) % SLOTS]
+                    keys = list(slot)
+                    slot.clear()
+                    for key in keys:
+                        self._file(key, self.cooldowns[key].tick)
+            slot = self.rings[0][tick % SLOTS]
+            keys = list(slot)
+            slot.clear()
+            for key in keys:
+                cooldown = self.cooldowns[key]
+                if cooldown.tick > tick:
+                    # further out than the top ring reaches, file it again
+                    self._file(key, cooldown.tick)
+                    continue
+                del self.cooldowns[key]
+                del self._filed[key]
+                expired.append(cooldown)
+        if not self.cooldowns:
+            self.current = target
+            FRAME_CLOCK.unsubscribe("cooldowns")
+
+        default_notify = getattr(settings, "COOLDOWN_NOTIFY", True)
+        for cooldown in expired:
+            if cooldown.persistent:
+                self._persist(cooldown.owner, cooldown.name, None)
+            notify = default_notify if cooldown.notify is None else cooldown.notify
+            if notify:
+                cooldown.owner.msg(
+                    text=f"{cooldown.name} 已经可以再次使用了。",
+                    cooldown=((cooldown.name,), {"remaining": 0}),
+                )
+        if expired:
+            log.debug("%s cooldowns expired.", len(expired))
+        return len(expired)
+
+
+COOLDOWNS = CooldownWheel()
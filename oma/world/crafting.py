@@ -0,0 +1,277 @@
+"""
+Crafting engine
+
+Turns items into other items following the recipes in `world.recipes`.
+Items are told apart by the prototype they were spawned from (their
+`from_prototype` tag), so a 木柴 is a FIREWOOD wherever it came from.
+
+The recipes are compiled once (at server start or on first use) into
+indexes, so no lookup walks the whole recipe list:
+
+- by name, for `craft 石刀`;
+- by the multiset of ingredient prototype keys, for crafting from a
+  handful of items (`craft 木柴+燧石`);
+- by one *anchor* ingredient per recipe (the one fewest recipes use), for
+  "what can I craft": only the recipes anchored on something the crafter
+  holds are checked;
+- by every ingredient and tool, for "what is this item good for".
+
+A crafter's inventory is read in one pass over their contents; stacks
+(`world.items`) count by their quantity. Crafting uses up the ingredients
+and adds the product in one transaction, shrinking and growing stacks in
+place.
+
+Usage:
+
+    from world.crafting import CRAFTING
+
+    CRAFTING.craftable(char)             # recipes char can make now
+    recipe = CRAFTING.recipe("石刀")
+    CRAFTING.missing(char, recipe)       # {prototype key: count} lacking
+    CRAFTING.craft(char, recipe)         # the product, or None
+
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from evennia.prototypes.prototypes import search_prototype
+
+from world.gamelog import get_logger
+from world.items import add_items, count_items, prototype_of, take_items
+from world.recipes import RECIPES
+
+log = get_logger("crafting")
+
+
+def _signature(counts):
+    return tuple(sorted(counts.items()))
+
+
+class Recipe:
+    """
+    One compiled recipe. Prototype keys are lowercase, like the tags of
+    spawned items.
+
+    """
+
+    __slots__ = ("name", "product", "ingredients", "tools", "in_room", "signature")
+
+    def __init__(self, name, product, ingredients, tools=(), in_room=False):
+        self.name = name
+        self.product = product.lower()
+        self.ingredients = {key.lower(): count for key, count in ingredients.items()}
+        self.tools = tuple(key.lower() for key in tools)
+        self.in_room = in_room
+        self.signature = _signature(self.ingredients)
+
+    def __repr__(self):
+        return f"<Recipe {self.name}>"
+
+
+class CraftingEngine:
+    """
+    Compiled recipes and their lookup indexes.
+
+    """
+
+    def __init__(self):
+        self._by_name = None
+        self._by_signature = {}
+        self._by_anchor = defaultdict(list)
+        self._by_use = defaultdict(list)
+        # prototype key -> display name
+        self._names = {}
+
+    def __len__(self):
+        self._ensure_compiled()
+        return len(self._by_name)
+
+    def compile(self, recipes=None):
+        """
+        (Re)build the indexes.
+
+        Args:
+            recipes (dict, optional): Recipe definitions as in
+                `world.recipes.RECIPES`, which is the default.
+
+        """
+        recipes = RECIPES if recipes is None else recipes
+        self._by_name = {}
+        self._by_signature = {}
+        self._by_anchor = defaultdict(list)
+        self._by_use = defaultdict(list)
+        for name, definition in recipes.items():
+            recipe = Recipe(name, **definition)
+            if recipe.signature in self._by_signature:
+                log.warning(
+                    "Recipes %s and %s use the same ingredients; keeping the first.",
+                    self._by_signature[recipe.signature].name,
+                    name,
+                )
+                continue
+            self._by_name[name] = recipe
+            self._by_signature[recipe.signature] = recipe
+            for key in (*recipe.ingredients, *recipe.tools):
+                self._by_use[key].append(recipe)
+
+        for recipe in self._by_name.values():
+            anchor = min(recipe.ingredients, key=lambda key: (len(self._by_use[key]), key))
+            self._by_anchor[anchor].append(recipe)
+
+        self._names = {}
+        keys = set(self._by_use) | {recipe.product for recipe in self._by_name.values()}
+        for prototype in search_prototype(no_db=True):
+            key = prototype.get("prototype_key", "").lower()
+            if key in keys:
+                self._names[key] = prototype.get("key", key)
+        log.info("Compiled recipes.", recipes=len(self._by_name))
+
+    def _ensure_compiled(self):
+        if self._by_name is None:
+            self.compile()
+
+    # lookups
+
+    def recipe(self, name):
+        """
+        Args:
+            name (str): A recipe name.
+
+        Returns:
+            Recipe or None: The recipe.
+
+        """
+        self._ensure_compiled()
+        return self._by_name.get(name.strip())
+
+    def match(self, counts):
+        """
+        Find the recipe using exactly these ingredients.
+
+        Args:
+            counts (dict): `{prototype key: count}`.
+
+        Returns:
+            Recipe or None: The recipe.
+
+        """
+        self._ensure_compiled()
+        return self._by_signature.get(_signature({key.lower(): n for key, n in counts.items()}))
+
+    def uses(self, key):
+        """
+        Args:
+            key (str): A prototype key.
+
+        Returns:
+            list: Recipes needing the item as an ingredient or tool.
+
+        """
+        self._ensure_compiled()
+        return list(self._by_use.get(key.lower(), ()))
+
+    def display_name(self, key):
+        """
+        Args:
+            key (str): A prototype key.
+
+        Returns:
+            str: The name items of this prototype get.
+
+        """
+        self._ensure_compiled()
+        return self._names.get(key, key)
+
+    # crafters
+
+    def inventory(self, crafter):
+        """
+        Group what a crafter carries by prototype.
+
+        Args:
+            crafter (Object): Who crafts.
+
+        Returns:
+            dict: `{prototype key: [items]}`.
+
+        """
+        inventory = defaultdict(list)
+        for obj in crafter.contents:
+            key = prototype_of(obj)
+            if key:
+                inventory[key].append(obj)
+        return inventory
+
+    def missing(self, crafter, recipe, inventory=None):
+        """
+        Args:
+            crafter (Object): Who crafts.
+            recipe (Recipe): What to craft.
+            inventory (dict, optional): As returned by `inventory`.
+
+        Returns:
+            dict: `{prototype key: count}` still lacking; empty if the recipe
+                can be crafted.
+
+        """
+        inventory = self.inventory(crafter) if inventory is None else inventory
+        lacking = {}
+        for key, count in recipe.ingredients.items():
+            held = count_items(inventory.get(key, ()))
+            if held < count:
+                lacking[key] = count - held
+        for key in recipe.tools:
+            if not inventory.get(key):
+                lacking[key] = 1
+        return lacking
+
+    def craftable(self, crafter, inventory=None):
+        """
+        The recipes the crafter has everything for. Only recipes anchored on
+        an item the crafter holds are looked at.
+
+        Args:
+            crafter (Object): Who crafts.
+            inventory (dict, optional): As returned by `inventory`.
+
+        Returns:
+            list: Recipes, by name.
+
+        """
+        self._ensure_compiled()
+        inventory = self.inventory(crafter) if inventory is None else inventory
+        found = []
+        for key in inventory:
+            for recipe in self._by_anchor.get(key, ()):
+                if not self.missing(crafter, recipe, inventory):
+                    found.append(recipe)
+        return sorted(found, key=lambda recipe: recipe.name)
+
+    def craft(self, crafter, recipe, inventory=None):
+        """
+        Use up the ingredients and make the product, in one transaction.
+
+        Args:
+            crafter (Object): Who crafts.
+            recipe (Recipe): What to craft.
+            inventory (dict, optional): As returned by `inventory`.
+
+        Returns:
+            Object or None: The product (or the stack it joined), or None if
+                something is missing.
+
+        """
+        inventory = self.inventory(crafter) if inventory is None else inventory
+        if self.missing(crafter, recipe, inventory):
+            return None
+        destination = crafter.location if recipe.in_room else crafter
+        with transaction.atomic():
+            for key, count in recipe.ingredients.items():
+                take_items(inventory[key], count)
+            product = add_items(destination, recipe.product, move_type="craft")[0]
+        log.debug("Crafted %s.", recipe.name, crafter=crafter.key)
+        return product
+
+
+CRAFTING = CraftingEngine()
@@ -0,0 +1,199 @@
+"""
+Room events
+
+Things that want to react to what happens in a room (monsters noticing a
+player, a trap springing, a campfire catching a dropped branch) subscribe
+to the room's events instead of polling it on a timer. `ROOM_EVENTS` is
+an in-memory bus: rooms (`typeclasses.rooms`) and the systems acting in
+them emit typed events, and only the listeners subscribed to that room,
+to one of its regions or to everything are called.
+
+Events:
+
+- `ENTER`: `obj` arrived (`source` is where from, `move_type` how).
+- `LEAVE`: `obj` left (`destination` is where to, `move_type` how).
+- `SAY`: `obj` said `message` out loud.
+- `DROP`: `obj` was dropped here by `dropper` (also an `ENTER`).
+- `COMBAT_START`: `obj` started fighting `target`.
+
+Dispatching never touches the database: listeners are kept per
+`(room id, event)` and `(region, event)`, and a room's regions come from
+the in-memory `world.pathfinding.ROOM_GRAPH`, so emitting costs one dict
+lookup per scope plus the listeners it calls. Subscriptions live only in
+memory; whoever subscribes does it again after a reload (e.g. from
+`at_server_start` or when loading its own state).
+
+Usage:
+
+    from world.events import ENTER, ROOM_EVENTS
+
+    def on_enter(event):
+        event.room.msg_contents(f"{event.obj.key}踩响了一根枯枝。")
+
+    handle = ROOM_EVENTS.subscribe(ENTER, on_enter, room=room)
+    ROOM_EVENTS.subscribe(ENTER, on_enter, region="GlimmerdewForest")
+    ROOM_EVENTS.unsubscribe(handle)
+
+"""
+
+from collections import defaultdict
+from itertools import count
+
+from evennia.utils import logger
+
+from world.pathfinding import ROOM_GRAPH
+
+ENTER = "enter"
+LEAVE = "leave"
+SAY = "say"
+DROP = "drop"
+COMBAT_START = "combat_start"
+
+EVENT_TYPES = (ENTER, LEAVE, SAY, DROP, COMBAT_START)
+
+
+class RoomEvent:
+    """
+    One event, passed to every listener.
+
+    """
+
+    __slots__ = ("type", "room", "obj", "data")
+
+    def __init__(self, type, room, obj, data):
+        self.type = type
+        self.room = room
+        # who or what the event is about
+        self.obj = obj
+        # the event's other fields, see the module docstring
+        self.data = data
+
+    def __repr__(self):
+        return f"<RoomEvent {self.type} in #{self.room.id}>"
+
+    def __getattr__(self, name):
+        try:
+            return self.data[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+class RoomEventBus:
+    """
+    Listeners by scope and event type.
+
+    """
+
+    def __init__(self):
+        # (scope, event type) -> {handle: callback}; the scope is
+        # ("room", id), ("region", tag) or None for all rooms
+        self._listeners = defaultdict(dict)
+        # handle -> (scope, event type)
+        self._handles = {}
+        self._counter = count(1)
+
+    def __len__(self):
+        return len(self._handles)
+
+    def subscribe(self, event, callback, room=None, region=None):
+        """
+        Call `callback(event)` whenever `event` happens in a room, in any
+        room of a region, or (with neither) anywhere.
+
+        Args:
+            event (str): One of `EVENT_TYPES`.
+            callback (callable): Called with the `RoomEvent`.
+            room (Room or int, optional): Only this room.
+            region (str, optional): Only rooms with this `region` tag.
+
+        Returns:
+            int: A handle for `unsubscribe`.
+
+        """
+        if event not in EVENT_TYPES:
+            raise ValueError(f"Unknown room event '{event}'.")
+        if room is not None:
+            scope = ("room", getattr(room, "id", room))
+        elif region is not None:
+            scope = ("region", region.lower())
+        else:
+            scope = None
+        handle = next(self._counter)
+        self._listeners[(scope, event)][handle] = callback
+        self._handles[handle] = (scope, event)
+        return handle
+
+    def unsubscribe(self, handle):
+        """
+        Args:
+            handle (int): As returned by `subscribe`.
+
+        Returns:
+            bool: If there was such a subscription.
+
+        """
+        key = self._handles.pop(handle, None)
+        if key is None:
+            return False
+        listeners = self._listeners.get(key)
+        if listeners is not None:
+            listeners.pop(handle, None)
+            if not listeners:
+                del self._listeners[key]
+        return True
+
+    def forget_room(self, room):
+        """
+        Drop all subscriptions to one room, e.g. when it's deleted.
+
+        Args:
+            room (Room or int): The room.
+
+        """
+        room_id = getattr(room, "id", room)
+        for handle, (scope, _) in list(self._handles.items()):
+            if scope == ("room", room_id):
+                self.unsubscribe(handle)
+
+    def clear(self):
+        """
+        Drop all subscriptions.
+        """
+        self._listeners.clear()
+        self._handles.clear()
+
+    def emit(self, room, event, obj=None, **data):
+        """
+        Tell the listeners of a room, its regions and all rooms about an
+        event. A listener raising an error is logged and doesn't stop the
+        others.
+
+        Args:
+            room (Room): Where it happened.
+            event (str): One of `EVENT_TYPES`.
+            obj (Object, optional): Who or what it is about.
+            **data: The event's other fields.
+
+        Returns:
+            int: How many listeners were called.
+
+        """
+        listeners = self._listeners
+        if not listeners:
+            return 0
+        callbacks = list(listeners.get((("room", room.id), event), {}).values())
+        for region in ROOM_GRAPH.regions(room):
+            callbacks.extend(listeners.get((("region", region), event), {}).values())
+        callbacks.extend(listeners.get((None, event), {}).values())
+        if not callbacks:
+            return 0
+        room_event = RoomEvent(event, room, obj, data)
+        for callback in callbacks:
+            try:
+                callback(room_event)
+            except Exception:
+                logger.log_trace(f"RoomEventBus: {event} listener {callback!r} failed.")
+        return len(callbacks)
+
+
+ROOM_EVENTS = RoomEventBus()
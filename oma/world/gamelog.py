@@ -0,0 +1,178 @@
+"""
+Game system logging
+
+A thin layer over `evennia.utils.logger` for game systems that run often
+(ticks, spawning, combat). It avoids paying for log lines nobody reads:
+
+- Each subsystem has its own level, set in `settings.GAME_LOG_LEVELS`
+  (`{"needs": "WARNING", ...}`, with `"default"` as the fallback). Calls
+  below that level return before doing any work.
+- Messages are formatted lazily: pass `"%s did %s", a, b` or a callable,
+  and formatting only happens if the record is actually written.
+- `sampled()` writes only a fraction of the records it gets (rate from
+  `settings.GAME_LOG_SAMPLING` or the call), for hot paths where one
+  example in a hundred is plenty.
+- `summary()` writes one structured `key=value` record, meant to replace
+  many per-entity lines with one line per tick.
+
+Usage:
+
+    from world.gamelog import get_logger
+
+    log = get_logger("needs")
+    log.debug("processing %s", char.key)
+    log.summary("tick", processed=120, damage=3, duration_ms=4.2)
+
+"""
+
+import random
+
+from django.conf import settings
+from evennia.utils import logger
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+OFF = 100
+
+LEVELS = {"DEBUG": DEBUG, "INFO": INFO, "WARNING": WARNING, "ERROR": ERROR, "OFF": OFF}
+
+_LOGGERS = {}
+
+
+def _format_fields(fields):
+    return " ".join(f"{key}={value}" for key, value in fields.items())
+
+
+class GameLogger:
+    """
+    Level-gated, lazily formatting logger for one subsystem.
+
+    """
+
+    __slots__ = ("name", "level", "sample_rate")
+
+    def __init__(self, name):
+        self.name = name
+        self.configure()
+
+    def __repr__(self):
+        return f"<GameLogger {self.name} level={self.level}>"
+
+    def configure(self):
+        """
+        (Re)read this subsystem's level and sampling rate from settings.
+        """
+        levels = getattr(settings, "GAME_LOG_LEVELS", {})
+        level = levels.get(self.name, levels.get("default", "INFO"))
+        if isinstance(level, str):
+            level = LEVELS.get(level.upper(), INFO)
+        self.level = level
+        self.sample_rate = getattr(settings, "GAME_LOG_SAMPLING", {}).get(self.name, 1.0)
+
+    def is_enabled_for(self, level):
+        """
+        Args:
+            level (int): One of the module's level constants.
+
+        Returns:
+            bool: If records of this level would be written.
+
+        """
+        return level >= self.level
+
+    def _write(self, level, msg, args, fields):
+        if callable(msg):
+            msg = msg()
+        elif args:
+            msg = msg % args
+        if fields:
+            msg = f"{msg} {_format_fields(fields)}"
+        msg = f"[{self.name}] {msg}"
+        if level >= ERROR:
+            logger.log_err(msg)
+        elif level >= WARNING:
+            logger.log_warn(msg)
+        else:
+            logger.log_info(msg)
+
+    def log(self, level, msg, *args, **fields):
+        """
+        Write a record if `level` is enabled.
+
+        Args:
+            level (int): The record's level.
+            msg (str or callable): A %-format string, or a callable
+                returning the message (only called if the record is written).
+            *args: Arguments for the format string.
+            **fields: Structured `key=value` data appended to the record.
+
+        """
+        if level >= self.level:
+            self._write(level, msg, args, fields)
+
+    def debug(self, msg, *args, **fields):
+        if DEBUG >= self.level:
+            self._write(DEBUG, msg, args, fields)
+
+    def info(self, msg, *args, **fields):
+        if INFO >= self.level:
+            self._write(INFO, msg, args, fields)
+
+    def warning(self, msg, *args, **fields):
+        if WARNING >= self.level:
+            self._write(WARNING, msg, args, fields)
+
+    def error(self, msg, *args, **fields):
+        if ERROR >= self.level:
+            self._write(ERROR, msg, args, fields)
+
+    def sampled(self, level, msg, *args, rate=None, **fields):
+        """
+        Like `log`, but only writes a random fraction of the records.
+
+        Args:
+            level (int): The record's level.
+            msg (str or callable): As for `log`.
+            *args: Arguments for the format string.
+            rate (float, optional): Fraction of records to keep. Defaults to
+                this subsystem's `settings.GAME_LOG_SAMPLING` rate.
+            **fields: Structured data appended to the record.
+
+        """
+        if level < self.level:
+            return
+        rate = self.sample_rate if rate is None else rate
+        if rate >= 1.0 or random.random() < rate:
+            self._write(level, msg, args, fields)
+
+    def summary(self, event, level=INFO, **fields):
+        """
+        Write one structured record, typically once per tick.
+
+        Args:
+            event (str): What is being summarized, like "tick".
+            level (int, optional): The record's level.
+            **fields: The data, written as `key=value` pairs.
+
+        """
+        if level >= self.level:
+            self._write(level, event, (), fields)
+
+
+def get_logger(name):
+    """
+    Get the logger of a subsystem, creating it on first use.
+
+    Args:
+        name (str): Subsystem name, as used in `settings.GAME_LOG_LEVELS`.
+
+    Returns:
+        GameLogger: The shared logger for that subsystem.
+
+    """
+    log = _LOGGERS.get(name)
+    if log is None:
+        log = _LOGGERS[name] = GameLogger(name)
+    return log
@@ -0,0 +1,126 @@
+"""
+Items
+
+Helpers for handing out and using up items by prototype. Plain items are
+one object each; stackable ones (`typeclasses.objects.StackableObject`)
+hold any number of identical items in one object with a `quantity`, so a
+player carrying thirty 木柴 carries one object, not thirty.
+
+Stacks are told apart by the prototype they were spawned from (their
+`from_prototype` tag). They merge when they end up in the same place and
+split when only part of one is moved, see `StackableObject`.
+
+Usage:
+
+    from world.items import add_items, count_items, take_items
+
+    add_items(char, "FIREWOOD", 3)      # grows char's 木柴 stack by 3
+    count_items(char.contents)          # items, not objects
+    take_items(woods, 2)                # uses up 2 of them
+
+"""
+
+from evennia.prototypes.prototypes import PROTOTYPE_TAG_CATEGORY
+from evennia.prototypes.spawner import spawn
+
+STACKABLE_TYPECLASS = "typeclasses.objects.StackableObject"
+
+
+def prototype_of(obj):
+    """
+    Args:
+        obj (Object): An item.
+
+    Returns:
+        str or None: The (lowercase) key of the prototype it was spawned from.
+
+    """
+    keys = obj.tags.get(category=PROTOTYPE_TAG_CATEGORY, return_list=True)
+    return keys[0] if keys else None
+
+
+def is_stackable(obj):
+    return obj.is_typeclass(STACKABLE_TYPECLASS, exact=False)
+
+
+def quantity_of(obj):
+    """
+    Args:
+        obj (Object): An item.
+
+    Returns:
+        int: How many items it stands for; 1 unless it's a stack.
+
+    """
+    return obj.quantity if is_stackable(obj) else 1
+
+
+def count_items(objects):
+    """
+    Args:
+        objects (iterable): Items.
+
+    Returns:
+        int: How many items they stand for, counting stacks by quantity.
+
+    """
+    return sum(quantity_of(obj) for obj in objects)
+
+
+def add_items(location, prototype, quantity=1, move_type="get"):
+    """
+    Put items of a prototype into `location`. A stackable item grows the
+    stack already there, or spawns one stack of `quantity`; other items are
+    spawned one by one.
+
+    Args:
+        location (Object): Who or where gets them.
+        prototype (str): A prototype key.
+        quantity (int, optional): How many items.
+        move_type (str, optional): Passed on to `move_to` for new objects.
+
+    Returns:
+        list: The objects now holding the items.
+
+    """
+    key = prototype.lower()
+    for obj in location.contents:
+        if prototype_of(obj) == key and is_stackable(obj):
+            obj.quantity += quantity
+            return [obj]
+
+    objects = spawn(prototype)
+    if is_stackable(objects[0]):
+        objects[0].quantity = quantity
+    elif quantity > 1:
+        objects += spawn(*[prototype] * (quantity - 1))
+    for obj in objects:
+        # quiet, and no need to look for a stack to merge with
+        obj.move_to(location, quiet=True, move_type=move_type, stack=False)
+    return objects
+
+
+def take_items(objects, quantity):
+    """
+    Use up items: stacks shrink in place (and are deleted once empty),
+    other items are deleted. Objects are used in order.
+
+    Args:
+        objects (list): Items to take from.
+        quantity (int): How many items to use up.
+
+    Returns:
+        int: How many were used up; less than `quantity` if `objects` don't
+            hold that many.
+
+    """
+    taken = 0
+    for obj in objects:
+        if taken >= quantity:
+            break
+        if is_stackable(obj):
+            taken += obj.consume(quantity - taken)
+        else:
+            obj.delete()
+            taken += 1
+    return taken
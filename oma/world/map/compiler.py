@@ -0,0 +1,395 @@
+"""
+Map compiler
+
+Builds a map from declarative data (`ROOM_DEFINITIONS` / `EXIT_DEFINITIONS`,
+see `map_glimmerdew_forest.py`) by diffing it against the objects already in
+the game instead of deleting and recreating everything.
+
+Every object the compiler manages carries two tags:
+
+- the map's management tag (e.g. `map_glimmerdew_forest_obj:map_management`),
+  marking it as owned by that map;
+- a stable *map key* in the `map_key` category: `<map tag>/<room key>` for
+  rooms and `<map tag>/<origin>><destination>` for exits.
+
+It also stores a fingerprint of the definition it was last built from
+(and the tags that definition declared) in the `map_build` Attribute. A
+rebuild then needs three queries to tell which objects are unchanged, and
+only creates, updates or deletes the rest, all in one transaction. Unchanged rooms keep their dbref, contents and the
+players standing in them (so `settings.DEFAULT_HOME` stays valid).
+
+New objects are created in bulk, see `world.builder`. Objects built before
+map keys existed are adopted: managed rooms by their key, managed exits by
+their key, origin and destination.
+
+Usage (e.g. from a batchcode file):
+
+    from world.map.compiler import compile_map
+
+    report = compile_map(UNIQUE_MAP_TAG, ROOM_DEFINITIONS, EXIT_DEFINITIONS, caller=caller)
+
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.db import transaction
+from evennia.objects.models import ObjectDB
+from evennia.utils import logger
+
+from world.builder import ObjectSpec, bulk_create_objects
+from world.spawns import SPAWN_POINTS
+
+MANAGEMENT_TAG_CATEGORY = "map_management"
+MAP_KEY_CATEGORY = "map_key"
+BUILD_ATTRIBUTE = "map_build"
+DEFAULT_ROOM_TYPECLASS = "typeclasses.rooms.ForestRoom"
+DEFAULT_EXIT_TYPECLASS = settings.BASE_EXIT_TYPECLASS
+
+
+def parse_exit_key_string(key_string):
+    """
+    Split an exit key string like "北;north;n" into the main key and its
+    aliases.
+
+    Args:
+        key_string (str): Semicolon-separated names, main key first.
+
+    Returns:
+        tuple: `(main_key, aliases)`; `main_key` is None for an empty string.
+
+    """
+    parts = [part.strip() for part in (key_string or "").split(";") if part.strip()]
+    if not parts:
+        return None, []
+    return parts[0], parts[1:]
+
+
+def _typeclass_path(typeclass):
+    if isinstance(typeclass, str):
+        return typeclass
+    return f"{typeclass.__module__}.{typeclass.__name__}"
+
+
+class MapSpec:
+    """
+    What one object should look like.
+
+    """
+
+    __slots__ = ("map_key", "key", "typeclass", "desc", "tags", "attributes", "aliases",
+                 "location", "destination")
+
+    def __init__(self, map_key, key, typeclass, desc="", tags=(), attributes=None, aliases=(),
+                 location=None, destination=None):
+        self.map_key = map_key
+        self.key = key
+        self.typeclass = typeclass
+        self.desc = desc
+        self.tags = tuple(sorted((str(tkey).lower(), category) for tkey, category in tags))
+        self.attributes = tuple(sorted((attributes or {}).items()))
+        self.aliases = tuple(aliases)
+        # map keys of the rooms an exit connects
+        self.location = location
+        self.destination = destination
+
+    @property
+    def fingerprint(self):
+        """
+        Hash of everything the compiler sets on the object.
+        """
+        data = repr((self.key, self.typeclass, self.desc, self.tags, self.aliases,
+                     self.location, self.destination))
+        if self.attributes:
+            # only hashed when present, so older builds stay unchanged
+            data += repr(self.attributes)
+        return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+    @property
+    def build(self):
+        """
+        The `map_build` Attribute value: fingerprint, declared tags and
+        declared Attribute keys.
+        """
+        return [self.fingerprint, [list(tag) for tag in self.tags],
+                [key for key, _ in self.attributes]]
+
+
+class MapReport:
+    """
+    What a compile did.
+
+    """
+
+    __slots__ = ("created", "updated", "deleted", "unchanged", "adopted", "errors")
+
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.deleted = 0
+        self.unchanged = 0
+        self.adopted = 0
+        self.errors = []
+
+    def __str__(self):
+        return (
+            f"新建 {self.created}，更新 {self.updated}，删除 {self.deleted}，"
+            f"未变 {self.unchanged}，接管 {self.adopted}，错误 {len(self.errors)}"
+        )
+
+
+def build_specs(map_tag, rooms, exits):
+    """
+    Turn map definitions into `MapSpec`s.
+
+    Args:
+        map_tag (str): The map's management tag.
+        rooms (dict): Room key -> `{"typeclass", "desc", "tags", "attributes"}`,
+            `attributes` being an optional dict of extra Attributes.
+        exits (list): Dicts with `origin_room_key`, `destination_room_key`,
+            `exit_key_string`, `exit_desc` and optionally
+            `reverse_exit_key_string` / `reverse_exit_desc`.
+
+    Returns:
+        tuple: `(room specs, exit specs, errors)`, the specs as dicts keyed
+            by map key.
+
+    """
+    prefix = map_tag.lower()
+    room_specs, exit_specs, errors = {}, {}, []
+    for room_key, data in rooms.items():
+        map_key = f"{prefix}/{room_key.lower()}"
+        room_specs[map_key] = MapSpec(
+            map_key,
+            room_key,
+            _typeclass_path(data.get("typeclass", DEFAULT_ROOM_TYPECLASS)),
+            desc=(data.get("desc") or "").strip(),
+            tags=data.get("tags", ()),
+            attributes=data.get("attributes"),
+        )
+
+    def add_exit(origin, destination, key_string, desc, typeclass):
+        key, aliases = parse_exit_key_string(key_string)
+        if not key:
+            return
+        origin_key = f"{prefix}/{origin.lower()}"
+        destination_key = f"{prefix}/{destination.lower()}"
+        missing = [name for name, mkey in ((origin, origin_key), (destination, destination_key))
+                   if mkey not in room_specs]
+        if missing:
+            errors.append(f"出口 {key} 找不到房间: {', '.join(missing)}")
+            return
+        map_key = f"{origin_key}>{destination.lower()}"
+        if map_key in exit_specs:
+            errors.append(f"重复的出口: {origin} -> {destination}")
+            return
+        exit_specs[map_key] = MapSpec(
+            map_key, key, typeclass, desc=(desc or "").strip(), aliases=aliases,
+            location=origin_key, destination=destination_key,
+        )
+
+    for data in exits:
+        typeclass = _typeclass_path(data.get("typeclass", DEFAULT_EXIT_TYPECLASS))
+        add_exit(data["origin_room_key"], data["destination_room_key"],
+                 data.get("exit_key_string"), data.get("exit_desc"), typeclass)
+        add_exit(data["destination_room_key"], data["origin_room_key"],
+                 data.get("reverse_exit_key_string"), data.get("reverse_exit_desc"), typeclass)
+    return room_specs, exit_specs, errors
+
+
+def _load_live(map_tag):
+    """
+    Find the objects managed by a map.
+
+    Returns:
+        tuple: `(objects by id, map key by id, map_build value by id)`.
+
+    """
+    # filtered by tags rather than by a list of ids, which large maps would
+    # push past the database's limit of query parameters
+    managed = {"db_tags__db_key": map_tag.lower(), "db_tags__db_category": MANAGEMENT_TAG_CATEGORY}
+    objects = {obj.id: obj for obj in ObjectDB.objects.filter(**managed)}
+    map_keys = dict(
+        ObjectDB.objects.filter(
+            db_tags__db_key__startswith=f"{map_tag.lower()}/",
+            db_tags__db_category=MAP_KEY_CATEGORY,
+        ).values_list("id", "db_tags__db_key")
+    )
+    builds = dict(
+        ObjectDB.objects.filter(
+            db_attributes__db_key=BUILD_ATTRIBUTE, **managed
+        ).values_list("id", "db_attributes__db_value")
+    )
+    return objects, map_keys, builds
+
+
+def _adopt(objects, map_keys, room_specs, exit_specs, report):
+    """
+    Give map keys to managed objects that were built without them.
+    """
+    claimed = set(map_keys.values())
+    unkeyed = [obj for obj_id, obj in objects.items() if obj_id not in map_keys]
+    room_by_key = {}
+    for spec in room_specs.values():
+        if spec.map_key not in claimed:
+            room_by_key.setdefault(spec.key, spec)
+    for obj in unkeyed:
+        if obj.destination is None and obj.db_key in room_by_key:
+            spec = room_by_key.pop(obj.db_key)
+            map_keys[obj.id] = spec.map_key
+            claimed.add(spec.map_key)
+            obj.tags.add(spec.map_key, category=MAP_KEY_CATEGORY)
+            report.adopted += 1
+
+    room_ids = {map_key: obj_id for obj_id, map_key in map_keys.items() if map_key in room_specs}
+    exit_by_ends = {}
+    for spec in exit_specs.values():
+        if spec.map_key not in claimed:
+            ends = (room_ids.get(spec.location), room_ids.get(spec.destination), spec.key)
+            exit_by_ends.setdefault(ends, spec)
+    for obj in unkeyed:
+        if obj.id in map_keys or obj.destination is None or obj.location is None:
+            continue
+        spec = exit_by_ends.pop((obj.location.id, obj.destination.id, obj.db_key), None)
+        if spec:
+            map_keys[obj.id] = spec.map_key
+            obj.tags.add(spec.map_key, category=MAP_KEY_CATEGORY)
+            report.adopted += 1
+
+
+def _object_spec(spec, map_tag, rooms):
+    """
+    The `ObjectSpec` to bulk create a missing object from. `rooms` maps room
+    map keys to live rooms or to the `ObjectSpec`s of rooms created in the
+    same batch.
+    """
+    tags = list(spec.tags) + [(map_tag, MANAGEMENT_TAG_CATEGORY), (spec.map_key, MAP_KEY_CATEGORY)]
+    attributes = [(BUILD_ATTRIBUTE, spec.build)] + list(spec.attributes)
+    if spec.desc:
+        attributes.append(("desc", spec.desc))
+    return ObjectSpec(
+        spec.key,
+        spec.typeclass,
+        location=rooms.get(spec.location),
+        destination=rooms.get(spec.destination),
+        aliases=spec.aliases,
+        attributes=attributes,
+        tags=tags,
+    )
+
+
+def _update(obj, spec, old_tags, old_attributes, rooms):
+    if obj.typeclass_path != spec.typeclass:
+        obj.swap_typeclass(spec.typeclass, clean_attributes=False, run_start_hooks=None)
+    if obj.db_key != spec.key:
+        obj.key = spec.key
+    if spec.desc:
+        obj.attributes.add("desc", spec.desc)
+    else:
+        obj.attributes.remove("desc")
+    new_tags = set(spec.tags)
+    for tkey, category in set(old_tags) - new_tags:
+        obj.tags.remove(tkey, category=category)
+    for tkey, category in new_tags - set(old_tags):
+        obj.tags.add(tkey, category=category)
+    for key in set(old_attributes) - {key for key, _ in spec.attributes}:
+        obj.attributes.remove(key)
+    if spec.attributes:
+        obj.attributes.batch_add(*spec.attributes)
+    if spec.location is not None:
+        if set(obj.aliases.all()) != set(spec.aliases):
+            obj.aliases.clear()
+            if spec.aliases:
+                obj.aliases.batch_add(*spec.aliases)
+        if obj.location != rooms.get(spec.location):
+            obj.location = rooms.get(spec.location)
+        if obj.destination != rooms.get(spec.destination):
+            obj.destination = rooms.get(spec.destination)
+    obj.attributes.add(BUILD_ATTRIBUTE, spec.build)
+
+
+def compile_map(map_tag, rooms, exits, caller=None, delete=True):
+    """
+    Bring the live objects of a map in line with its definitions.
+
+    Args:
+        map_tag (str): The map's management tag, like "map_glimmerdew_forest_obj".
+        rooms (dict): Room definitions, see `build_specs`.
+        exits (list): Exit definitions, see `build_specs`.
+        caller (Object, optional): Told about progress and problems.
+        delete (bool, optional): Delete managed objects that are no longer
+            defined.
+
+    Returns:
+        MapReport: What was done.
+
+    """
+    report = MapReport()
+    room_specs, exit_specs, report.errors = build_specs(map_tag, rooms, exits)
+    specs = {**room_specs, **exit_specs}
+
+    with transaction.atomic():
+        objects, map_keys, builds = _load_live(map_tag)
+        _adopt(objects, map_keys, room_specs, exit_specs, report)
+        by_map_key = {map_key: objects[obj_id] for obj_id, map_key in map_keys.items()}
+        rooms_live = {map_key: obj for map_key, obj in by_map_key.items() if map_key in room_specs}
+
+        # create everything missing in one bulk batch (rooms before exits),
+        # then update the rest
+        to_create = {}
+        rooms_new = dict(rooms_live)
+        for map_key, spec in specs.items():
+            if map_key not in by_map_key:
+                to_create[map_key] = _object_spec(spec, map_tag, rooms_new)
+                if map_key in room_specs:
+                    rooms_new[map_key] = to_create[map_key]
+        bulk_create_objects(to_create.values())
+        report.created = len(to_create)
+        rooms_live.update(
+            {map_key: obj_spec.obj for map_key, obj_spec in to_create.items() if map_key in room_specs}
+        )
+
+        for map_key, spec in specs.items():
+            obj = by_map_key.get(map_key)
+            if obj is None:
+                continue
+            build = builds.get(obj.id)
+            if build and build[0] == spec.fingerprint:
+                report.unchanged += 1
+                continue
+            old_attributes = build[2] if build and len(build) > 2 else []
+            if build:
+                old_tags = build[1]
+            else:
+                # adopted: the declared tags are whatever it has now
+                old_tags = [
+                    (tkey, category)
+                    for tkey, category in obj.tags.all(return_key_and_category=True)
+                    if category not in (MANAGEMENT_TAG_CATEGORY, MAP_KEY_CATEGORY)
+                ]
+            _update(obj, spec, [tuple(tag) for tag in old_tags], old_attributes, rooms_live)
+            report.updated += 1
+
+        if delete:
+            # exits before rooms, so rooms aren't deleted with exits in them
+            stale = [obj for map_key, obj in by_map_key.items() if map_key not in specs]
+            stale += [obj for obj_id, obj in objects.items() if obj_id not in map_keys]
+            stale.sort(key=lambda obj: obj.destination is None)
+            for obj in stale:
+                obj.delete()
+                report.deleted += 1
+
+    if report.created or report.updated or report.deleted:
+        from world.pathfinding import ROOM_GRAPH
+
+        # spawn tags may have come or gone without going through the room
+        SPAWN_POINTS.invalidate()
+        # ... and so may regions and coordinates
+        ROOM_GRAPH.invalidate()
+    for error in report.errors:
+        logger.log_warn(f"compile_map({map_tag}): {error}")
+        if caller:
+            caller.msg(f"错误: {error}")
+    if caller:
+        caller.msg(f"地图 {map_tag} 编译完成：{report}")
+    return report
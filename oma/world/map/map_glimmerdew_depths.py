@@ -0,0 +1,63 @@
+# oma/world/map/map_glimmerdew_depths.py
+
+from django.conf import settings
+from evennia import search_tag
+from evennia.utils import create
+
+from world.map.compiler import MAP_KEY_CATEGORY
+from world.map.procgen import BIOMES, build_region, room_key
+
+# -----------------------------------------------------------------------------
+# 地图配置
+# -----------------------------------------------------------------------------
+MAP_NAME = "荧露树林深处"
+UNIQUE_MAP_TAG = "map_glimmerdew_depths_obj"
+
+# 相同的种子和尺寸总是生成完全相同的区域，所以重复执行本脚本不会改动任何房间。
+# 修改种子会生成一片全新的森林（旧房间会被删除，请谨慎）。
+SEED = 20250601
+WIDTH = 100
+HEIGHT = 100
+SPAWN_POINTS = 20
+
+# 连接到手工地图“荧露树林”的入口：从“密林边缘”向西进入生成区域的入口房间
+LINK_FROM_MAP_KEY = "map_glimmerdew_forest_obj/密林边缘"
+LINK_EXIT = ("西;west;w", "东;east;e")
+
+# -----------------------------------------------------------------------------
+# 主要脚本执行逻辑
+# -----------------------------------------------------------------------------
+# 区域由 world/map/procgen.py 按种子生成，再交给地图编译器批量构建，详见两文件。
+
+if caller:
+    caller.msg(f"--- 开始生成/更新地图 '{MAP_NAME}' ({WIDTH}x{HEIGHT}) ---")
+
+report = build_region(
+    UNIQUE_MAP_TAG, SEED, WIDTH, HEIGHT, caller=caller, spawn_points=SPAWN_POINTS
+)
+
+# 入口房间在北边正中，总是一片草甸（见 generate_region 的 entrance 参数）
+entrance_key = room_key(BIOMES["meadow"], WIDTH // 2, 0)
+origin = search_tag(LINK_FROM_MAP_KEY, category=MAP_KEY_CATEGORY)
+entrance = search_tag(f"{UNIQUE_MAP_TAG}/{entrance_key}", category=MAP_KEY_CATEGORY)
+if origin and entrance:
+    origin, entrance = origin[0], entrance[0]
+    # 连接出口不带地图标签，所以两张地图的编译器都不会删除它们
+    for location, destination, key_string in (
+        (origin, entrance, LINK_EXIT[0]),
+        (entrance, origin, LINK_EXIT[1]),
+    ):
+        key, *aliases = key_string.split(";")
+        if not any(exi.destination == destination for exi in location.exits):
+            create.create_object(
+                settings.BASE_EXIT_TYPECLASS,
+                key=key,
+                aliases=aliases,
+                location=location,
+                destination=destination,
+            )
+elif caller:
+    caller.msg("未找到“密林边缘”或入口房间，没有创建连接出口。")
+
+if caller:
+    caller.msg(f"--- 地图 '{MAP_NAME}' 生成/更新完毕：{report} ---")
@@ -1,12 +1,9 @@
 # oma/world/map_glimmerdew_forest.py
 
-from evennia import create_object, DefaultRoom, DefaultExit
+from evennia import DefaultRoom
 from evennia.utils import logger
-# 导入 evennia.utils.search 模块以访问 search_object
-import evennia.utils.search
-# 导入 evennia.search_tag 函数
-from evennia import search_tag # <--- 新增导入
-from django.conf import settings
+
+from world.map.compiler import compile_map
 
 # 尝试导入自定义房间类，如果失败则使用默认房间类
 try:
@@ -107,149 +104,19 @@ EXIT_DEFINITIONS = [
     }
 ]
 
-# -----------------------------------------------------------------------------
-# 辅助函数：清理由本地图脚本管理的对象
-# -----------------------------------------------------------------------------
-def cleanup_managed_objects(tag_key_to_delete, tag_category_to_delete, caller_obj):
-    """删除所有带有特定管理标签和类别的对象。"""
-    if caller_obj:
-        caller_obj.msg(f"--- 开始为地图 '{MAP_NAME}' 清理托管对象 (标签: {tag_key_to_delete}:{tag_category_to_delete}) ---")
-
-    # 使用 evennia.search_tag() 进行搜索
-    objects_to_delete = search_tag(key=tag_key_to_delete, category=tag_category_to_delete) # <--- 修改在这里
-
-    if not objects_to_delete:
-        if caller_obj:
-            caller_obj.msg(f"未找到任何带有标签 '{tag_key_to_delete}:{tag_category_to_delete}' 的托管对象。")
-        return 0
-        
-    if caller_obj:
-        caller_obj.msg(f"找到 {len(objects_to_delete)} 个带有标签 '{tag_key_to_delete}:{tag_category_to_delete}' 的托管对象准备删除。")
-
-    deleted_count = 0
-    for obj in objects_to_delete:
-        obj_id_str = f"#{obj.id}" if obj.id else "(no id)"
-        obj_key_str = obj.key if obj.key else "(no key)"
-        try:
-            if caller_obj and hasattr(caller_obj, "location") and caller_obj.location == obj:
-                default_home_obj_list = evennia.utils.search.search_object(settings.DEFAULT_HOME, exact=True)
-                if default_home_obj_list and default_home_obj_list[0] != obj:
-                    caller_obj.move_to(default_home_obj_list[0], quiet=True, move_hooks=False)
-                    if caller_obj:
-                        caller_obj.msg(f"你已从即将被删除的房间 {obj_key_str} 移至 {default_home_obj_list[0].key}。")
-                else:
-                    if caller_obj:
-                        caller_obj.msg(f"警告: 跳过删除你当前所在的房间 {obj_key_str}{obj_id_str} (无法安全移至默认房间)。")
-                    continue
-            
-            obj.delete()
-            deleted_count += 1
-        except Exception as e:
-            logger.log_err(f"删除对象 {obj_key_str}{obj_id_str} 时出错: {e}")
-            if caller_obj:
-                caller_obj.msg(f"删除对象 {obj_key_str}{obj_id_str} 时出错: {e}")
-
-    if caller_obj:
-        caller_obj.msg(f"--- 地图 '{MAP_NAME}' 清理完毕。共删除了 {deleted_count} 个托管对象。 ---")
-    return deleted_count
-
-# -----------------------------------------------------------------------------
-# 辅助函数：解析出口键字符串并添加别名
-# -----------------------------------------------------------------------------
-def _parse_exit_key_string(key_string):
-    """
-    解析包含主名和别名（用分号分隔）的字符串。
-    返回 (main_key, list_of_aliases)
-    """
-    parts = [part.strip() for part in key_string.split(';') if part.strip()]
-    if not parts:
-        return None, []
-    main_key = parts[0]
-    aliases = parts[1:]
-    return main_key, aliases
-
 # -----------------------------------------------------------------------------
 # 主要脚本执行逻辑
 # -----------------------------------------------------------------------------
 # 'caller' 是 @batchcode 命令执行时可用的全局变量，指向执行该命令的角色
-
-PERFORM_CLEANUP_BEFORE_BUILD = True
-if PERFORM_CLEANUP_BEFORE_BUILD:
-    cleanup_managed_objects(UNIQUE_MAP_TAG, UNIQUE_MAP_TAG_CATEGORY, caller)
-
-created_rooms = {}
+#
+# 地图编译器会把上面的定义与游戏中已有的对象比较，只新建、更新或删除有变化的
+# 房间和出口（在同一个事务中完成）。未变化的房间保留原来的 dbref、内容物和其中的
+# 玩家，所以 settings.DEFAULT_HOME 不会失效。详见 world/map/compiler.py。
 
 if caller:
     caller.msg(f"--- 开始构建/更新地图 '{MAP_NAME}' ---")
 
-# 步骤1: 创建所有房间
-for room_key_name, room_data in ROOM_DEFINITIONS.items():
-    base_tags = room_data.get("tags", []).copy() 
-    current_room_tags = base_tags + [(UNIQUE_MAP_TAG, UNIQUE_MAP_TAG_CATEGORY)]
-    
-    room = create_object(
-        room_data["typeclass"],
-        key=room_key_name,
-        attributes=[("desc", room_data["desc"].strip())],
-        tags=current_room_tags
-    )
-    created_rooms[room_key_name] = room
-    if caller:
-        tag_tuples = room.tags.all(return_key_and_category=True)
-        tag_strings = [f"{tkey}:{tcat}" if tcat else tkey for tkey, tcat in tag_tuples]
-        caller.msg(f"已创建房间: {room_key_name} (#{room.id}) - 标签: {', '.join(tag_strings)}")
-
-
-if caller:
-    caller.msg("所有房间已创建。开始创建出口...")
-
-# 步骤2: 创建所有出口
-for exit_data in EXIT_DEFINITIONS:
-    origin_room = created_rooms.get(exit_data["origin_room_key"])
-    destination_room = created_rooms.get(exit_data["destination_room_key"])
-
-    if origin_room and destination_room:
-        exit_tags = [(UNIQUE_MAP_TAG, UNIQUE_MAP_TAG_CATEGORY)]
-        
-        fwd_main_key, fwd_aliases = _parse_exit_key_string(exit_data["exit_key_string"])
-        if fwd_main_key: 
-            exit_attrs_forward = [("desc", exit_data["exit_desc"])] if exit_data.get("exit_desc") else []
-            fwd_exit_obj = create_object(
-                DefaultExit, 
-                key=fwd_main_key, 
-                location=origin_room,
-                destination=destination_room,
-                attributes=exit_attrs_forward,
-                tags=exit_tags
-            )
-            if fwd_aliases: 
-                fwd_exit_obj.aliases.batch_add(*fwd_aliases)
-        
-        rev_main_key, rev_aliases = _parse_exit_key_string(exit_data["reverse_exit_key_string"])
-        if rev_main_key: 
-            exit_attrs_reverse = [("desc", exit_data["reverse_exit_desc"])] if exit_data.get("reverse_exit_desc") else []
-            rev_exit_obj = create_object(
-                DefaultExit,
-                key=rev_main_key, 
-                location=destination_room,
-                destination=origin_room,
-                attributes=exit_attrs_reverse,
-                tags=exit_tags
-            )
-            if rev_aliases: 
-                rev_exit_obj.aliases.batch_add(*rev_aliases)
-            
-            if caller and fwd_main_key and rev_main_key : 
-                caller.msg(f"已创建双向出口: {origin_room.key} ({fwd_main_key}) <-> {destination_room.key} ({rev_main_key})")
-        
-    else:
-        missing_keys = []
-        if not origin_room: missing_keys.append(exit_data["origin_room_key"])
-        if not destination_room: missing_keys.append(exit_data["destination_room_key"])
-        error_msg = f"创建出口失败，因为找不到房间: {', '.join(missing_keys)}"
-        logger.log_warn(error_msg)
-        if caller:
-            caller.msg(f"错误: {error_msg}")
+report = compile_map(UNIQUE_MAP_TAG, ROOM_DEFINITIONS, EXIT_DEFINITIONS, caller=caller)
 
 if caller:
     caller.msg(f"--- 地图 '{MAP_NAME}' 构建/更新脚本执行完毕！ ---")
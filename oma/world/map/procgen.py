@@ -0,0 +1,406 @@
+"""
+Procedural regions
+
+Generates large stretches of the Glimmerdew Forest as map definitions
+(the same `ROOM_DEFINITIONS` / `EXIT_DEFINITIONS` shape the hand-written
+maps use) and builds them with the map compiler, which creates missing
+rooms and exits in bulk.
+
+A region is a `width` x `height` grid of `ForestRoom`s. Two smooth noise
+fields, elevation and moisture, decide each cell's biome (the micro
+ecologies of `design/ERM_desgin.md`: meadows, open woodland, deep forest,
+river valleys and rocky hills), and the biome decides the room's
+resources, danger and description. Danger also grows with the distance
+from the region's entrance. Rooms are connected by a random spanning tree,
+so every room can be reached, plus a share of extra passages so the forest
+isn't a pure maze.
+
+Generation only depends on the seed and the options: the same seed always
+gives the same region, so rebuilding it is a no-op for the compiler and
+only rooms whose definition changed are touched. Every tile is computed
+from its own coordinates (`Terrain`), which is also how the virtual
+wilderness (`world.wilderness`) makes up tiles nobody stored.
+
+Usage (e.g. from a batchcode file):
+
+    from world.map.procgen import build_region
+
+    build_region("map_glimmerdew_depths_obj", seed=42, width=100, height=100, caller=caller)
+
+"""
+
+import hashlib
+import math
+import random
+
+from world.map.compiler import compile_map
+from world.spawns import SPAWN_TAG, SPAWN_TAG_CATEGORY
+
+ROOM_TYPECLASS = "typeclasses.rooms.ForestRoom"
+REGION_TAG = ("GlimmerdewForest", "region")
+BIOME_TAG_CATEGORY = "biome"
+
+# (dx, dy, exit key string, reverse exit key string, direction name)
+EAST = (1, 0, "东;east;e", "西;west;w", "东")
+SOUTH = (0, 1, "南;south;s", "北;north;n", "南")
+WEST_NAME, NORTH_NAME = "西", "北"
+
+
+class Biome:
+    """
+    What rooms of one kind of terrain are like.
+
+    """
+
+    __slots__ = ("key", "name", "forageables", "wood", "flint", "danger", "openings", "details")
+
+    def __init__(self, key, name, forageables, wood, flint, danger, openings, details):
+        self.key = key
+        self.name = name
+        # chance of each resource being present
+        self.forageables = forageables
+        self.wood = wood
+        self.flint = flint
+        # base danger level, 1-5
+        self.danger = danger
+        self.openings = openings
+        self.details = details
+
+    def __repr__(self):
+        return f"<Biome {self.key}>"
+
+
+BIOMES = {
+    biome.key: biome
+    for biome in (
+        Biome(
+            "meadow", "林间草甸", 0.9, 0.2, 0.1, 1,
+            (
+                "树林在这里让出一片开阔的草甸，阳光毫无遮挡地洒在齐膝的野草上。",
+                "一片小小的空地，地上开满了不知名的野花，几只小虫在花间飞舞。",
+                "这里的树木稀稀落落，茂盛的灌木丛间点缀着红色的浆果。",
+            ),
+            (
+                "草丛里传来窸窸窣窣的声音，大概是什么小型食草动物。",
+                "微风吹过，草浪起伏，带来阵阵清香。",
+                "地上有几串小小的蹄印，一直延伸到树林边。",
+            ),
+        ),
+        Biome(
+            "woodland", "疏林", 0.6, 0.9, 0.1, 1,
+            (
+                "高低错落的树木之间留着不少空隙，林下的光线还算明亮。",
+                "一条被野兽踩出来的小径在树干之间弯弯曲曲地穿过。",
+                "脚下是松软的落叶层，踩上去沙沙作响。",
+            ),
+            (
+                "树梢上不时有鸟儿扑棱棱地飞起。",
+                "几缕阳光穿过枝叶，在地上投下斑驳的光点。",
+                "一棵倒下的枯树横在路边，树干上长满了蘑菇。",
+            ),
+        ),
+        Biome(
+            "deepwood", "密林深处", 0.5, 1.0, 0.05, 3,
+            (
+                "参天的古树遮天蔽日，林下昏暗得几乎分不清白天黑夜。",
+                "藤蔓从头顶垂下，与盘根错节的树根纠缠在一起，几乎无路可走。",
+                "这里安静得出奇，连鸟叫声都听不到，只有你自己的呼吸声。",
+            ),
+            (
+                "昏暗中，一些苔藓散发着微弱的荧光。",
+                "树干上留着几道深深的爪痕，看上去还很新。",
+                "远处似乎有什么东西在注视着你。",
+            ),
+        ),
+        Biome(
+            "valley", "河谷", 0.7, 0.5, 0.5, 2,
+            (
+                "一条溪流从谷底流过，溪水清澈，可以看见水底圆润的鹅卵石。",
+                "河谷两侧是长满蕨类的陡坡，潺潺的水声在谷中回荡。",
+                "浅滩上水流平缓，岸边的软泥里满是各种动物的足迹。",
+            ),
+            (
+                "水里偶尔有鱼影一闪而过。",
+                "岸边有一块被踩得光秃秃的空地，像是野兽饮水的地方。",
+                "空气潮湿清凉，混着水草的气味。",
+            ),
+        ),
+        Biome(
+            "hills", "丘陵", 0.3, 0.4, 0.9, 2,
+            (
+                "地势在这里陡然升高，风化的岩石从薄薄的土层下露了出来。",
+                "一片碎石坡，稀疏的矮树顽强地扎根在石缝之间。",
+                "低矮的山丘连绵起伏，站在高处能望见远处一片起伏的树冠。",
+            ),
+            (
+                "坡下有个小小的岩洞，黑黢黢的洞口只容一人通过。",
+                "几块巨石以奇怪的角度排列着，上面似乎有模糊的刻痕。",
+                "山风吹过岩缝，发出低沉的呜呜声。",
+            ),
+        ),
+    )
+}
+
+
+class ValueNoise:
+    """
+    Smooth 2D value noise: random values on a coarse lattice, interpolated
+    between lattice points. Lattice values are hashed from the seed and
+    the lattice point, so any point can be computed on its own, without
+    generating the grid around it.
+    """
+
+    def __init__(self, seed, salt, scale):
+        self.seed = seed
+        self.salt = salt
+        self.scale = scale
+        self._lattice = {}
+
+    def _value(self, lx, ly):
+        value = self._lattice.get((lx, ly))
+        if value is None:
+            digest = hashlib.blake2b(
+                f"{self.seed}:{self.salt}:{lx}:{ly}".encode(), digest_size=8
+            ).digest()
+            value = self._lattice[(lx, ly)] = int.from_bytes(digest, "big") / 2**64
+        return value
+
+    def __call__(self, x, y):
+        fx, fy = x / self.scale, y / self.scale
+        ix, iy = math.floor(fx), math.floor(fy)
+        # smoothstep, so the lattice doesn't show as straight lines
+        tx, ty = fx - ix, fy - iy
+        tx, ty = tx * tx * (3 - 2 * tx), ty * ty * (3 - 2 * ty)
+        value = self._value
+        top = value(ix, iy) + (value(ix + 1, iy) - value(ix, iy)) * tx
+        bottom = value(ix, iy + 1) + (value(ix + 1, iy + 1) - value(ix, iy + 1)) * tx
+        return top + (bottom - top) * ty
+
+
+def pick_biome(elevation, moisture):
+    """
+    Args:
+        elevation (float): 0-1.
+        moisture (float): 0-1.
+
+    Returns:
+        Biome: The biome for that terrain.
+
+    """
+    if elevation > 0.68:
+        return BIOMES["hills"]
+    if moisture > 0.66 and elevation < 0.5:
+        return BIOMES["valley"]
+    if moisture < 0.32:
+        return BIOMES["meadow"]
+    if moisture > 0.5:
+        return BIOMES["deepwood"]
+    return BIOMES["woodland"]
+
+
+def room_key(biome, x, y):
+    """
+    The key of the room at `(x, y)`. Room keys have to be unique in a map,
+    so the coordinates are part of it.
+    """
+    return f"{biome.name} ({x},{y})"
+
+
+class Terrain:
+    """
+    The terrain of one seed: biome, resources, danger and description of
+    any coordinates, each computed on its own and always the same.
+
+    """
+
+    def __init__(self, seed, origin=(0, 0), danger_radius=12):
+        """
+        Args:
+            seed (int or str): Random seed.
+            origin (tuple, optional): `(x, y)` of the entrance, which is
+                always a safe meadow; danger grows with the distance to it.
+            danger_radius (int, optional): Every this many steps from the
+                origin add one to the danger level.
+
+        """
+        self.seed = seed
+        self.origin = tuple(origin)
+        self.danger_radius = danger_radius
+        self.elevation = ValueNoise(seed, "elevation", scale=8)
+        self.moisture = ValueNoise(seed, "moisture", scale=6)
+
+    def biome(self, x, y):
+        """
+        Returns:
+            Biome: The biome at `(x, y)`.
+
+        """
+        if (x, y) == self.origin:
+            return BIOMES["meadow"]
+        return pick_biome(self.elevation(x, y), self.moisture(x, y))
+
+    def room(self, x, y, tags=()):
+        """
+        The room definition of `(x, y)`.
+
+        Args:
+            x, y (int): Coordinates.
+            tags (list, optional): Extra `(key, category)` tags.
+
+        Returns:
+            tuple: `(room key, definition)`, the definition in the format of
+                `ROOM_DEFINITIONS` with the grid position in its
+                `coordinates` Attribute.
+
+        """
+        biome = self.biome(x, y)
+        rng = random.Random(f"{self.seed}:{x}:{y}")
+        if (x, y) == self.origin:
+            danger = 1
+        else:
+            distance = abs(x - self.origin[0]) + abs(y - self.origin[1])
+            danger = min(5, biome.danger + distance // self.danger_radius)
+        return room_key(biome, x, y), {
+            "typeclass": ROOM_TYPECLASS,
+            "desc": rng.choice(biome.openings),
+            "tags": [REGION_TAG, (biome.key, BIOME_TAG_CATEGORY), *tags],
+            "attributes": {
+                "has_forageables": rng.random() < biome.forageables,
+                "has_wood": rng.random() < biome.wood,
+                "has_flint": rng.random() < biome.flint,
+                "danger_level": danger,
+                "description_details": rng.choice(biome.details),
+                "coordinates": (x, y),
+            },
+        }
+
+
+def _find(parents, cell):
+    root = cell
+    while parents[root] != root:
+        root = parents[root]
+    while parents[cell] != root:
+        parents[cell], cell = root, parents[cell]
+    return root
+
+
+def _passages(rng, width, height, extra_passages):
+    """
+    Pick the connections between neighbouring cells: a random spanning
+    tree (Kruskal's) plus `extra_passages` of the remaining ones.
+    """
+    edges = []
+    for y in range(height):
+        for x in range(width):
+            if x + 1 < width:
+                edges.append((x, y, EAST))
+            if y + 1 < height:
+                edges.append((x, y, SOUTH))
+    rng.shuffle(edges)
+    parents = list(range(width * height))
+    passages, spare = [], []
+    for edge in edges:
+        x, y, direction = edge
+        here = _find(parents, y * width + x)
+        there = _find(parents, (y + direction[1]) * width + x + direction[0])
+        if here != there:
+            parents[here] = there
+            passages.append(edge)
+        else:
+            spare.append(edge)
+    passages.extend(edge for edge in spare if rng.random() < extra_passages)
+    # in grid order, so the exit list is stable and readable
+    passages.sort(key=lambda edge: (edge[1], edge[0], edge[2][0]))
+    return passages
+
+
+def generate_region(seed, width, height, entrance=None, extra_passages=0.15,
+                    danger_radius=12, spawn_points=0, tags=()):
+    """
+    Generate the map definitions of a region.
+
+    Args:
+        seed (int or str): Random seed; equal seeds give equal regions.
+        width (int): Rooms west to east.
+        height (int): Rooms north to south.
+        entrance (tuple, optional): `(x, y)` of the entrance room, which is
+            always a safe meadow. Defaults to the middle of the north edge.
+        extra_passages (float, optional): Share of the neighbouring rooms
+            that are connected on top of the spanning tree.
+        danger_radius (int, optional): Every this many steps from the
+            entrance add one to the danger level.
+        spawn_points (int, optional): How many low-danger meadows to make
+            (re)spawn points, spread over the region.
+        tags (list, optional): Extra `(key, category)` tags for every room.
+
+    Returns:
+        tuple: `(rooms, exits)` in the format of `ROOM_DEFINITIONS` and
+            `EXIT_DEFINITIONS`, ready for `compile_map`. Each room also gets
+            its grid position in the `coordinates` Attribute.
+
+    """
+    if width < 1 or height < 1:
+        raise ValueError("A region needs at least one room.")
+    rng = random.Random(seed)
+    terrain = Terrain(seed, origin=entrance or (width // 2, 0), danger_radius=danger_radius)
+
+    grid = {}
+    rooms = {}
+    for y in range(height):
+        for x in range(width):
+            key, definition = terrain.room(x, y, tags=tags)
+            grid[(x, y)] = (key, terrain.biome(x, y))
+            rooms[key] = definition
+
+    if spawn_points:
+        safe = [
+            grid[cell][0]
+            for cell in sorted(grid, key=lambda cell: (cell[1], cell[0]))
+            if grid[cell][1].key == "meadow"
+            and rooms[grid[cell][0]]["attributes"]["danger_level"] == 1
+        ]
+        step = max(1, len(safe) // spawn_points)
+        for key in safe[::step][:spawn_points]:
+            rooms[key]["tags"].append((SPAWN_TAG, SPAWN_TAG_CATEGORY))
+
+    exits = []
+    for x, y, direction in _passages(rng, width, height, extra_passages):
+        dx, dy, key_string, reverse_key_string, name = direction
+        origin, origin_biome = grid[(x, y)]
+        destination, destination_biome = grid[(x + dx, y + dy)]
+        reverse_name = WEST_NAME if direction is EAST else NORTH_NAME
+        exits.append(
+            {
+                "origin_room_key": origin,
+                "destination_room_key": destination,
+                "exit_key_string": key_string,
+                "exit_desc": f"向{name}是一片{destination_biome.name}。",
+                "reverse_exit_key_string": reverse_key_string,
+                "reverse_exit_desc": f"向{reverse_name}是一片{origin_biome.name}。",
+            }
+        )
+    return rooms, exits
+
+
+def build_region(map_tag, seed, width, height, caller=None, delete=True, **options):
+    """
+    Generate a region and build (or update) it with the map compiler.
+
+    Args:
+        map_tag (str): The map's management tag; use one tag per region.
+        seed (int or str): Random seed.
+        width (int): Rooms west to east.
+        height (int): Rooms north to south.
+        caller (Object, optional): Told about progress and problems.
+        delete (bool, optional): Delete rooms that are no longer generated,
+            e.g. after shrinking the region.
+        **options: Passed on to `generate_region`.
+
+    Returns:
+        MapReport: What the compiler did.
+
+    """
+    rooms, exits = generate_region(seed, width, height, **options)
+    if caller:
+        caller.msg(f"生成了 {len(rooms)} 个房间和 {len(exits) * 2} 个出口，开始构建……")
+    return compile_map(map_tag, rooms, exits, caller=caller, delete=delete)
@@ -0,0 +1,466 @@
+"""
+Needs engine
+
+Column-oriented simulation of the survival needs (hunger, thirst, stamina,
+temperature) of every online character. Instead of reading and writing
+`char.db.*` per character per tick, the engine keeps one array per need,
+applies the decay rules to the whole population in one batched step and
+returns what happened to each character.
+
+The authoritative values live in each character's `StatHandler`
+(`char.stats`): every step gathers the rows from there, updates them in
+bulk and scatters them back, which only touches memory. Characters that
+cross a threshold are flushed to the database right away so a crash never
+loses a state change that mattered; everything else is written by the
+regular stats flush.
+
+Each need is also tracked as a small state machine (hunger goes normal ->
+hungry -> starving and back). A step reports which states *changed*, so
+callers can message players on transitions instead of on every tick, plus
+an optional rate-limited reminder for characters stuck in a bad state.
+
+NumPy is used when it is installed. Without it the engine falls back to
+plain Python loops over the same columns so the game still runs, just
+without the vectorized speedup.
+
+"""
+
+import time
+from array import array
+
+from world.stats import flush_handlers
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# decay rules, per tick
+HUNGER_DECAY = 1
+THIRST_DECAY = 2
+STAMINA_REGEN = 5
+STAMINA_DRAIN = 2
+TEMPERATURE_DRIFT = -0.1
+
+# thresholds
+NEED_MAX = 100
+NEED_WARN = 25  # hunger/thirst below this is warned about
+NEED_CRITICAL = 10  # hunger/thirst below this stops regen and drains stamina
+TEMP_FREEZING = 35.0
+TEMP_COLD = 36.0
+TEMP_HOT = 38.5
+
+NEEDS = ("hunger", "thirst", "stamina", "temperature")
+
+# need states. New rows start as UNKNOWN so their first step reports any
+# bad state the character logged in with, but not a plain NORMAL.
+UNKNOWN = -1
+NORMAL = 0
+# hunger / thirst
+LOW = 1
+DEPLETED = 2
+# stamina
+EXHAUSTED = 1
+# temperature
+CHILLY = 1
+FREEZING = 2
+HOT = 3
+
+# need -> the state in which it costs 1 hp per tick
+DAMAGING_STATES = {"hunger": DEPLETED, "thirst": DEPLETED, "temperature": FREEZING}
+
+# column name -> array typecode
+_COLUMNS = {
+    "hunger": "h",
+    "thirst": "h",
+    "stamina": "h",
+    "temperature": "d",
+    "in_combat": "b",
+    "hunger_state": "b",
+    "thirst_state": "b",
+    "stamina_state": "b",
+    "temperature_state": "b",
+    "last_notice": "d",
+}
+# column, the stat `_gather` loads into it and how the value is read
+_GATHERED = (
+    ("hunger", "hunger", int),
+    ("thirst", "thirst", int),
+    ("stamina", "stamina", int),
+    ("temperature", "temperature", float),
+    ("in_combat", "is_in_combat", bool),
+)
+
+
+def need_state(value):
+    """
+    State of hunger or thirst: NORMAL, LOW or DEPLETED. Works on plain
+    numbers and NumPy arrays alike.
+    """
+    return 1 * (value < NEED_WARN) + 1 * (value <= 0)
+
+
+def stamina_state(value):
+    """
+    State of stamina: NORMAL or EXHAUSTED.
+    """
+    return 1 * (value <= 0)
+
+
+def temperature_state(value):
+    """
+    State of body temperature: NORMAL, CHILLY, FREEZING or HOT.
+    """
+    return 1 * (value < TEMP_COLD) + 1 * (value < TEMP_FREEZING) + 3 * (value > TEMP_HOT)
+
+
+_STATE_FUNCS = {
+    "hunger": need_state,
+    "thirst": need_state,
+    "stamina": stamina_state,
+    "temperature": temperature_state,
+}
+
+
+class NeedsTickResult:
+    """
+    Outcome of one `NeedsEngine.step`. Every sequence is indexed like
+    `rows` (NumPy arrays, or lists without NumPy).
+
+    Attributes:
+        rows: The rows that were stepped.
+        states (dict): Need -> its state per row after the step.
+        changed (dict): Need -> True where that state changed this step.
+        remind: True where a character that is still in a bad state is
+            due a reminder.
+        damage: Hp each row loses to depleted or freezing needs.
+        crossed: True where a value crossed a threshold (and was flushed).
+
+    """
+
+    __slots__ = ("rows", "states", "changed", "remind", "damage", "crossed")
+
+    def __init__(self, rows, states, changed, remind, damage, crossed):
+        self.rows = rows
+        self.states = states
+        self.changed = changed
+        self.remind = remind
+        self.damage = damage
+        self.crossed = crossed
+
+
+class NeedsEngine:
+    """
+    Array-backed needs simulation for a changing population.
+
+    Characters are mapped to rows; removing one swaps the last row into its
+    place so the columns stay dense.
+
+    """
+
+    def __init__(self, reminder_interval=0):
+        """
+        Args:
+            reminder_interval (float, optional): Seconds between reminders to
+                a character that stays in a bad state. 0 disables reminders,
+                so only state changes are reported.
+
+        """
+        self.reminder_interval = reminder_interval
+        self.characters = []
+        self.rows = {}
+        for name, typecode in _COLUMNS.items():
+            setattr(self, name, self._column(typecode))
+
+    def __len__(self):
+        return len(self.characters)
+
+    def __contains__(self, character):
+        return character.id in self.rows
+
+    @staticmethod
+    def _column(typecode, values=()):
+        if np is not None:
+            dtype = {"h": np.int16, "d": np.float64, "b": np.int8}[typecode]
+            return np.array(values, dtype=dtype)
+        return array(typecode, values)
+
+    @staticmethod
+    def _extend(column, values):
+        if np is not None:
+            return np.concatenate((column, np.asarray(values, dtype=column.dtype)))
+        column.extend(values)
+        return column
+
+    # population management
+
+    def add(self, *characters):
+        """
+        Start simulating characters. Adding several at once grows the
+        columns only once.
+
+        Args:
+            *characters (PrimordialCharacter): The characters to add.
+
+        """
+        new = [char for char in {char.id: char for char in characters}.values()
+               if char.id not in self.rows]
+        if not new:
+            return
+        for char in new:
+            self.rows[char.id] = len(self.characters)
+            self.characters.append(char)
+        for name in _COLUMNS:
+            default = UNKNOWN if name.endswith("_state") else 0
+            setattr(self, name, self._extend(getattr(self, name), [default] * len(new)))
+        self._gather(range(len(self.characters) - len(new), len(self.characters)))
+
+    def remove(self, character, save=True):
+        """
+        Stop simulating a character.
+
+        Args:
+            character (PrimordialCharacter): The character to remove.
+            save (bool, optional): Flush its stats before dropping it.
+
+        """
+        row = self.rows.get(character.id)
+        if row is None:
+            return
+        if save:
+            character.stats.flush()
+        last = len(self.characters) - 1
+        if row != last:
+            moved = self.characters[last]
+            self.characters[row] = moved
+            self.rows[moved.id] = row
+            for name in _COLUMNS:
+                column = getattr(self, name)
+                column[row] = column[last]
+        self.characters.pop()
+        del self.rows[character.id]
+        for name in _COLUMNS:
+            setattr(self, name, getattr(self, name)[:last])
+
+    def sync(self, characters):
+        """
+        Make the simulated population match `characters`, saving and
+        dropping anyone no longer in it.
+
+        Args:
+            characters (iterable): The characters that should be simulated.
+
+        """
+        wanted = {char.id: char for char in characters}
+        for char in [char for char in self.characters if char.id not in wanted]:
+            self.remove(char)
+        self.add(*wanted.values())
+
+    # stats exchange
+
+    def _gather(self, rows):
+        """
+        Load the current stats of `rows` into the columns.
+
+        Returns:
+            dict: Column -> the values loaded, indexed like `rows`, for
+                `_scatter`.
+
+        """
+        rows = list(rows)
+        handlers = [self.characters[row].stats for row in rows]
+        loaded = {}
+        if np is not None:
+            index = np.asarray(rows, dtype=np.intp)
+            for name, stat, cast in _GATHERED:
+                column = getattr(self, name)
+                values = np.fromiter(
+                    (cast(getattr(stats, stat)) for stats in handlers),
+                    dtype=column.dtype,
+                    count=len(rows),
+                )
+                column[index] = values
+                loaded[name] = values
+            return loaded
+        for name, stat, cast in _GATHERED:
+            column = getattr(self, name)
+            values = loaded[name] = [cast(getattr(stats, stat)) for stats in handlers]
+            for row, value in zip(rows, values):
+                column[row] = value
+        return loaded
+
+    def _scatter(self, rows, loaded):
+        """
+        Push the needs of `rows` back into the characters' stats, only where
+        they differ from what `_gather` loaded.
+        """
+        rows = list(rows)
+        characters = self.characters
+        if np is not None:
+            index = np.asarray(rows, dtype=np.intp)
+            for need in NEEDS:
+                values = getattr(self, need)[index]
+                changed = values != loaded[need]
+                for position, value in zip(np.flatnonzero(changed).tolist(), values[changed].tolist()):
+                    setattr(characters[rows[position]].stats, need, value)
+            return
+        for need in NEEDS:
+            column = getattr(self, need)
+            for row, old in zip(rows, loaded[need]):
+                if column[row] != old:
+                    setattr(characters[row].stats, need, column[row])
+
+    def save(self, rows=None):
+        """
+        Flush the stats of the given rows to the database in one transaction.
+
+        Args:
+            rows (iterable, optional): Rows to write. Defaults to all rows.
+
+        Returns:
+            int: Number of Attribute values written.
+
+        """
+        rows = range(len(self.characters)) if rows is None else rows
+        return flush_handlers(self.characters[row].stats for row in rows)
+
+    # simulation
+
+    def step(self, rows=None, now=None):
+        """
+        Advance the needs of the given rows by one tick and flush the rows
+        that crossed a threshold.
+
+        Args:
+            rows (sequence of int, optional): The rows to update. Defaults to
+                every row.
+            now (float, optional): The current time, for reminders.
+                Defaults to `time.time()`.
+
+        Returns:
+            NeedsTickResult: What happened to each row.
+
+        """
+        if rows is None:
+            rows = range(len(self.characters))
+        rows = list(rows)
+        now = time.time() if now is None else now
+        loaded = self._gather(rows)
+        if np is not None:
+            result = self._step_numpy(np.asarray(rows, dtype=np.intp), now)
+        else:
+            result = self._step_python(rows, now)
+        self._scatter(rows, loaded)
+        self.save(row for row, crossed in zip(rows, result.crossed) if crossed)
+        return result
+
+    @staticmethod
+    def _bands(hunger, thirst, stamina, temperature):
+        # the need states, plus NEED_CRITICAL where stamina regen stops
+        return (
+            need_state(hunger) + 1 * (hunger < NEED_CRITICAL),
+            need_state(thirst) + 1 * (thirst < NEED_CRITICAL),
+            stamina_state(stamina),
+            temperature_state(temperature),
+        )
+
+    def _step_numpy(self, rows, now):
+        hunger = self.hunger[rows]
+        thirst = self.thirst[rows]
+        stamina = self.stamina[rows]
+        temperature = self.temperature[rows]
+        old_bands = self._bands(hunger, thirst, stamina, temperature)
+
+        hunger = np.maximum(0, hunger - HUNGER_DECAY)
+        thirst = np.maximum(0, thirst - THIRST_DECAY)
+
+        regen = (self.in_combat[rows] == 0) & (hunger > NEED_CRITICAL) & (thirst > NEED_CRITICAL)
+        stamina = np.where(regen, np.minimum(NEED_MAX, stamina + STAMINA_REGEN), stamina)
+        drain = (hunger < NEED_CRITICAL) | (thirst < NEED_CRITICAL)
+        stamina = np.where(drain, np.maximum(0, stamina - STAMINA_DRAIN), stamina)
+
+        temperature = np.round(temperature + TEMPERATURE_DRIFT, 1)
+
+        self.hunger[rows] = hunger
+        self.thirst[rows] = thirst
+        self.stamina[rows] = stamina
+        self.temperature[rows] = temperature
+
+        crossed = np.zeros(len(rows), dtype=np.bool_)
+        for old, new in zip(old_bands, self._bands(hunger, thirst, stamina, temperature)):
+            crossed |= old != new
+
+        values = {"hunger": hunger, "thirst": thirst, "stamina": stamina, "temperature": temperature}
+        states, changed = {}, {}
+        any_changed = np.zeros(len(rows), dtype=np.bool_)
+        suffering = np.zeros(len(rows), dtype=np.bool_)
+        damage = np.zeros(len(rows), dtype=np.int16)
+        for need in NEEDS:
+            column = getattr(self, f"{need}_state")
+            old = column[rows]
+            new = _STATE_FUNCS[need](values[need]).astype(np.int8)
+            changed[need] = (new != old) & ((old != UNKNOWN) | (new != NORMAL))
+            column[rows] = new
+            states[need] = new
+            any_changed |= changed[need]
+            suffering |= new != NORMAL
+            if need in DAMAGING_STATES:
+                damage += new == DAMAGING_STATES[need]
+
+        last_notice = self.last_notice[rows]
+        if self.reminder_interval:
+            remind = suffering & ~any_changed & (now - last_notice >= self.reminder_interval)
+        else:
+            remind = np.zeros(len(rows), dtype=np.bool_)
+        self.last_notice[rows] = np.where(any_changed | remind, now, last_notice)
+
+        return NeedsTickResult(rows, states, changed, remind, damage, crossed)
+
+    def _step_python(self, rows, now):
+        states = {need: [] for need in NEEDS}
+        changed = {need: [] for need in NEEDS}
+        remind, damage, crossed = [], [], []
+        for row in rows:
+            hunger, thirst = self.hunger[row], self.thirst[row]
+            stamina, temperature = self.stamina[row], self.temperature[row]
+            old_bands = self._bands(hunger, thirst, stamina, temperature)
+
+            hunger = max(0, hunger - HUNGER_DECAY)
+            thirst = max(0, thirst - THIRST_DECAY)
+            if not self.in_combat[row] and hunger > NEED_CRITICAL and thirst > NEED_CRITICAL:
+                stamina = min(NEED_MAX, stamina + STAMINA_REGEN)
+            if hunger < NEED_CRITICAL or thirst < NEED_CRITICAL:
+                stamina = max(0, stamina - STAMINA_DRAIN)
+            temperature = round(temperature + TEMPERATURE_DRIFT, 1)
+
+            self.hunger[row], self.thirst[row] = hunger, thirst
+            self.stamina[row], self.temperature[row] = stamina, temperature
+            crossed.append(old_bands != self._bands(hunger, thirst, stamina, temperature))
+
+            values = {"hunger": hunger, "thirst": thirst, "stamina": stamina, "temperature": temperature}
+            any_changed = suffering = False
+            row_damage = 0
+            for need in NEEDS:
+                column = getattr(self, f"{need}_state")
+                old, new = column[row], _STATE_FUNCS[need](values[need])
+                did_change = new != old and (old != UNKNOWN or new != NORMAL)
+                column[row] = new
+                states[need].append(new)
+                changed[need].append(did_change)
+                any_changed = any_changed or did_change
+                suffering = suffering or new != NORMAL
+                if DAMAGING_STATES.get(need) == new:
+                    row_damage += 1
+
+            due = bool(
+                self.reminder_interval
+                and suffering
+                and not any_changed
+                and now - self.last_notice[row] >= self.reminder_interval
+            )
+            if any_changed or due:
+                self.last_notice[row] = now
+            remind.append(due)
+            damage.append(row_damage)
+        return NeedsTickResult(rows, states, changed, remind, damage, crossed)
@@ -0,0 +1,190 @@
+"""
+Online character registry
+
+Tick systems only care about characters someone is actually playing, but
+asking the database for "all characters, then filter by connected account"
+costs more with every dormant character ever created. `ONLINE_CHARACTERS`
+is an in-memory index of the puppeted `PrimordialCharacter`s, kept current
+by the character's puppet/unpuppet/move hooks and rebuilt from the live
+sessions when the server starts or a session is re-synced after a reload.
+
+Characters are also bucketed by the room they stand in and by the
+`region` tags of that room, so systems can work on just the live
+population of one place:
+
+    from world.online import ONLINE_CHARACTERS
+
+    for char in ONLINE_CHARACTERS.all(): ...
+    ONLINE_CHARACTERS.in_room(room)
+    ONLINE_CHARACTERS.in_region("GlimmerdewForest")
+
+"""
+
+from collections import defaultdict
+
+REGION_TAG_CATEGORY = "region"
+CHARACTER_TYPECLASS = "typeclasses.characters.PrimordialCharacter"
+
+
+class OnlineRegistry:
+    """
+    Index of online characters, bucketed by room and region tag.
+
+    """
+
+    def __init__(self):
+        self._characters = {}
+        # char id -> (room id, region tags) it is currently bucketed under
+        self._placement = {}
+        self._by_room = defaultdict(dict)
+        self._by_region = defaultdict(dict)
+
+    def __len__(self):
+        return len(self._characters)
+
+    def __contains__(self, character):
+        return character.id in self._characters
+
+    def __iter__(self):
+        return iter(list(self._characters.values()))
+
+    # queries
+
+    def all(self):
+        """
+        Returns:
+            list: All online characters.
+
+        """
+        return list(self._characters.values())
+
+    def in_room(self, room):
+        """
+        Args:
+            room (Object or int): The room or its id.
+
+        Returns:
+            list: Online characters in that room.
+
+        """
+        room_id = getattr(room, "id", room)
+        return list(self._by_room.get(room_id, {}).values())
+
+    def in_region(self, region):
+        """
+        Args:
+            region (str): A `region` tag key, like "GlimmerdewForest".
+                Tags are case-insensitive.
+
+        Returns:
+            list: Online characters in rooms tagged with that region.
+
+        """
+        return list(self._by_region.get(region.lower(), {}).values())
+
+    def count_in_room(self, room):
+        """
+        Args:
+            room (Object or int): The room or its id.
+
+        Returns:
+            int: Number of online characters in that room.
+
+        """
+        return len(self._by_room.get(getattr(room, "id", room), ()))
+
+    def rooms(self):
+        """
+        Returns:
+            list: Ids of the rooms that have at least one online character.
+
+        """
+        return list(self._by_room)
+
+    # maintenance
+
+    def add(self, character):
+        """
+        Register a character as online (or refresh its buckets).
+
+        Args:
+            character (Object): The puppeted character.
+
+        """
+        self._characters[character.id] = character
+        self.move(character)
+
+    def remove(self, character):
+        """
+        Unregister a character.
+
+        Args:
+            character (Object): The character going offline.
+
+        """
+        self._unplace(character.id)
+        self._characters.pop(character.id, None)
+
+    def move(self, character):
+        """
+        Re-bucket a character after it changed location. Characters that
+        aren't registered are ignored.
+
+        Args:
+            character (Object): The character that moved.
+
+        """
+        if character.id not in self._characters:
+            return
+        self._unplace(character.id)
+        location = character.location
+        if not location:
+            return
+        regions = tuple(
+            location.tags.get(category=REGION_TAG_CATEGORY, return_list=True) or ()
+        )
+        self._placement[character.id] = (location.id, regions)
+        self._by_room[location.id][character.id] = character
+        for region in regions:
+            self._by_region[region][character.id] = character
+
+    def _unplace(self, char_id):
+        placement = self._placement.pop(char_id, None)
+        if not placement:
+            return
+        room_id, regions = placement
+        self._discard(self._by_room, room_id, char_id)
+        for region in regions:
+            self._discard(self._by_region, region, char_id)
+
+    @staticmethod
+    def _discard(buckets, bucket_key, char_id):
+        bucket = buckets.get(bucket_key)
+        if bucket is not None:
+            bucket.pop(char_id, None)
+            if not bucket:
+                del buckets[bucket_key]
+
+    def clear(self):
+        """
+        Forget everyone.
+        """
+        self._characters.clear()
+        self._placement.clear()
+        self._by_room.clear()
+        self._by_region.clear()
+
+    def rebuild(self):
+        """
+        Rebuild the index from the sessions currently connected.
+        """
+        from evennia.server.sessionhandler import SESSIONS
+
+        self.clear()
+        for session in SESSIONS.get_sessions():
+            puppet = session.get_puppet()
+            if puppet and puppet.is_typeclass(CHARACTER_TYPECLASS, exact=False):
+                self.add(puppet)
+
+
+ONLINE_CHARACTERS = OnlineRegistry()
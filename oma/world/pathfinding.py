@@ -0,0 +1,494 @@
+"""
+Room graph and pathfinding
+
+Answering "how far is room A from room B" by following `exits` means
+loading every room and exit on the way. `ROOM_GRAPH` keeps the whole map
+as an in-memory adjacency graph of ids instead (rooms are nodes, exits are
+edges), so monster AI, wandering NPCs and travel can plan routes without
+touching the database.
+
+- The graph is loaded with three queries, at server start or on first use:
+  every exit with a destination, the `region` and `map_key` tags (see
+  `world.map.compiler`) and the rooms' `coordinates` Attributes.
+- Exits add and remove themselves from their creation and deletion hooks;
+  a `ForestRoom` updates its regions when its region tags change, and
+  `compile_map` reloads the graph after changing a map. Code relinking an
+  exit by hand (`exit.destination = ...`) should call
+  `ROOM_GRAPH.update_exit(exit)`.
+- Wilderness tiles (`world.wilderness`) aren't part of the graph: their
+  neighbours are computed from coordinates, not stored as exits.
+
+Paths are searched with A* when the target has coordinates (rooms of
+generated maps, where every exit joins neighbouring tiles) and breadth-first
+otherwise; every exit costs one step. Recent results are kept in an LRU
+cache of `settings.ROOM_GRAPH_CACHE_SIZE` entries, together with the
+distances from one room to the rest of its region; all-pairs distances are
+only computed for regions of at most `settings.ROOM_GRAPH_REGION_MAX_ROOMS`
+rooms (they grow with the square of the region). Everything cached is
+dropped when the graph changes.
+
+Usage:
+
+    from world.pathfinding import ROOM_GRAPH
+
+    ROOM_GRAPH.distance(room_a, room_b)      # steps, or None if unreachable
+    ROOM_GRAPH.path(room_a, room_b)          # ((exit id, room id), ...)
+    ROOM_GRAPH.next_exit(npc.location, target_room)
+    ROOM_GRAPH.within(room, 3)               # {room id: steps}
+    ROOM_GRAPH.region_distances("GlimmerdewForest", room)   # {room id: steps}
+    ROOM_GRAPH.region_distances("SpawnClearing")             # all pairs, small regions
+
+Rooms can be passed as objects or as ids; results are ids (except
+`next_exit`), so nothing is loaded from the database while searching.
+
+"""
+
+import heapq
+from collections import OrderedDict, defaultdict, deque
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+
+from world.gamelog import get_logger
+from world.map.compiler import MAP_KEY_CATEGORY
+from world.online import REGION_TAG_CATEGORY
+from world.wilderness import EXIT_TYPECLASS as WILDERNESS_EXIT_TYPECLASS
+
+COORDINATES_ATTRIBUTE = "coordinates"
+
+log = get_logger("pathfinding")
+
+
+def _id(room):
+    return room if isinstance(room, int) else room.id
+
+
+class RoomGraph:
+    """
+    Lazily loaded adjacency graph of rooms and exits, with a path cache.
+
+    """
+
+    def __init__(self):
+        # exit id -> (room id, destination id); None until loaded
+        self._exits = None
+        # room id -> {exit id: destination id}
+        self._edges = defaultdict(dict)
+        # room id -> region tags
+        self._regions = {}
+        # room id -> (map tag, x, y), for rooms of maps built with coordinates
+        self._coordinates = {}
+        self._paths = OrderedDict()
+        # region -> frozenset of its room ids
+        self._region_members = {}
+        self._region_distances = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        self._ensure_loaded()
+        return len(self._exits)
+
+    @property
+    def loaded(self):
+        return self._exits is not None
+
+    # loading and updates
+
+    def invalidate(self):
+        """
+        Forget the graph; it's reloaded on next use.
+        """
+        self._exits = None
+        self._edges = defaultdict(dict)
+        self._regions = {}
+        self._coordinates = {}
+        self._forget()
+
+    def _forget(self):
+        self._paths.clear()
+        self._region_members.clear()
+        self._region_distances.clear()
+
+    def _ensure_loaded(self):
+        if self._exits is None:
+            self.load()
+
+    def load(self):
+        """
+        (Re)load the graph from the database.
+        """
+        self.invalidate()
+        self._exits = {}
+        exits = (
+            ObjectDB.objects.filter(db_location__isnull=False, db_destination__isnull=False)
+            .exclude(db_typeclass_path=WILDERNESS_EXIT_TYPECLASS)
+            .values_list("id", "db_location_id", "db_destination_id")
+        )
+        for exit_id, room_id, destination_id in exits:
+            self._link(exit_id, room_id, destination_id)
+
+        maps = {}
+        tags = ObjectDB.db_tags.through.objects.filter(
+            tag__db_category__in=(REGION_TAG_CATEGORY, MAP_KEY_CATEGORY), tag__db_tagtype=None
+        ).values_list("objectdb_id", "tag__db_category", "tag__db_key")
+        for obj_id, category, key in tags:
+            if category == REGION_TAG_CATEGORY:
+                self._regions[obj_id] = self._regions.get(obj_id, ()) + (key,)
+            else:
+                maps[obj_id] = key.partition("/")[0]
+
+        attributes = ObjectDB.db_attributes.through.objects.filter(
+            attribute__db_key=COORDINATES_ATTRIBUTE, attribute__db_category__isnull=True
+        ).values_list("objectdb_id", "attribute__db_value")
+        for obj_id, coordinates in attributes:
+            # only coordinates within one map are comparable
+            if obj_id in maps and coordinates and len(coordinates) == 2:
+                self._coordinates[obj_id] = (maps[obj_id], *coordinates)
+
+        log.info(
+            "Loaded room graph.",
+            rooms=len(self._edges),
+            exits=len(self._exits),
+            located=len(self._coordinates),
+        )
+
+    def _link(self, exit_id, room_id, destination_id):
+        if room_id == destination_id:
+            # wilderness entrances and other exits that don't lead anywhere
+            return
+        self._exits[exit_id] = (room_id, destination_id)
+        self._edges[room_id][exit_id] = destination_id
+
+    def _unlink(self, exit_id):
+        link = self._exits.pop(exit_id, None)
+        if link is None:
+            return False
+        edges = self._edges.get(link[0])
+        if edges is not None:
+            edges.pop(exit_id, None)
+            if not edges:
+                del self._edges[link[0]]
+        return True
+
+    def add_exit(self, exit):
+        """
+        Add a newly created exit. Called by the exit's creation hook.
+
+        Args:
+            exit (Exit): The exit; ignored without a location or destination.
+
+        """
+        if self._exits is None or exit.typeclass_path == WILDERNESS_EXIT_TYPECLASS:
+            return
+        if exit.db_location_id is None or exit.db_destination_id is None:
+            return
+        self._unlink(exit.id)
+        self._link(exit.id, exit.db_location_id, exit.db_destination_id)
+        self._forget()
+
+    def remove_exit(self, exit):
+        """
+        Remove an exit about to be deleted. Called by the exit's deletion hook.
+
+        Args:
+            exit (Exit): The exit.
+
+        """
+        if self._exits is not None and self._unlink(exit.id):
+            self._forget()
+
+    def update_exit(self, exit):
+        """
+        Pick up an exit that was moved or relinked.
+
+        Args:
+            exit (Exit): The exit.
+
+        """
+        self.remove_exit(exit)
+        self.add_exit(exit)
+
+    def update_room(self, room):
+        """
+        Pick up changed region tags of a room.
+
+        Args:
+            room (Room): The room.
+
+        """
+        if self._exits is None:
+            return
+        regions = tuple(room.tags.get(category=REGION_TAG_CATEGORY, return_list=True) or ())
+        if regions != self._regions.get(room.id, ()):
+            self._regions[room.id] = regions
+            self._forget()
+
+    # queries
+
+    def neighbours(self, room):
+        """
+        Args:
+            room (Room or int): The room.
+
+        Returns:
+            list: `(exit id, destination id)` for every exit out of the room.
+
+        """
+        self._ensure_loaded()
+        return list(self._edges.get(_id(room), {}).items())
+
+    def _heuristic(self, goal):
+        coordinates = self._coordinates
+        goal = coordinates.get(goal)
+        if goal is None:
+            return None
+        map_tag, goal_x, goal_y = goal
+
+        def estimate(room_id):
+            here = coordinates.get(room_id)
+            if here is None or here[0] != map_tag:
+                return 0
+            return abs(here[1] - goal_x) + abs(here[2] - goal_y)
+
+        return estimate
+
+    def _search(self, source, target):
+        edges = self._edges
+        came_from = {source: None}
+        estimate = self._heuristic(target)
+        if estimate is None:
+            queue = deque([source])
+            while queue:
+                room_id = queue.popleft()
+                if room_id == target:
+                    break
+                for exit_id, destination_id in edges.get(room_id, {}).items():
+                    if destination_id not in came_from:
+                        came_from[destination_id] = (exit_id, room_id)
+                        queue.append(destination_id)
+        else:
+            # rooms outside the target's map estimate 0, so the estimate is
+            # admissible but not consistent: rooms may be reopened
+            steps = {source: 0}
+            queue = [(estimate(source), 0, source)]
+            while queue:
+                _, cost, room_id = heapq.heappop(queue)
+                if room_id == target:
+                    break
+                if cost > steps[room_id]:
+                    continue
+                cost += 1
+                for exit_id, destination_id in edges.get(room_id, {}).items():
+                    if cost < steps.get(destination_id, cost + 1):
+                        steps[destination_id] = cost
+                        came_from[destination_id] = (exit_id, room_id)
+                        heapq.heappush(
+                            queue, (cost + estimate(destination_id), cost, destination_id)
+                        )
+        if target not in came_from:
+            return None
+        path = []
+        room_id = target
+        while room_id != source:
+            exit_id, previous = came_from[room_id]
+            path.append((exit_id, room_id))
+            room_id = previous
+        path.reverse()
+        return tuple(path)
+
+    def path(self, source, target):
+        """
+        Find a shortest way from one room to another.
+
+        Args:
+            source (Room or int): Where to start.
+            target (Room or int): Where to go.
+
+        Returns:
+            tuple or None: `(exit id, room id)` for every step, in order (empty
+                if already there), or None if `target` can't be reached.
+
+        """
+        self._ensure_loaded()
+        key = (_id(source), _id(target))
+        if key in self._paths:
+            self.hits += 1
+            self._paths.move_to_end(key)
+            return self._paths[key]
+        self.misses += 1
+        path = self._search(*key)
+        self._cache(key, path)
+        return path
+
+    def _cache(self, key, value):
+        self._paths[key] = value
+        if len(self._paths) > getattr(settings, "ROOM_GRAPH_CACHE_SIZE", 4096):
+            self._paths.popitem(last=False)
+
+    def distance(self, source, target):
+        """
+        Args:
+            source (Room or int): Where to start.
+            target (Room or int): Where to go.
+
+        Returns:
+            int or None: Number of exits to go through, or None if `target`
+                can't be reached.
+
+        """
+        path = self.path(source, target)
+        return None if path is None else len(path)
+
+    def next_exit(self, room, target):
+        """
+        The exit to take from `room` to get closer to `target`, for moving
+        NPCs one step at a time.
+
+        Args:
+            room (Room): Where the NPC stands.
+            target (Room or int): Where it wants to go.
+
+        Returns:
+            Exit or None: The exit, or None if already there or unreachable.
+
+        """
+        path = self.path(room, target)
+        if not path:
+            return None
+        exit_id = path[0][0]
+        # the room's contents are cached, this doesn't query
+        for exit in room.exits:
+            if exit.id == exit_id:
+                return exit
+        return None
+
+    def within(self, source, radius):
+        """
+        All rooms at most `radius` steps away, e.g. to find who could notice
+        or chase something.
+
+        Args:
+            source (Room or int): Where to start.
+            radius (int): Maximum number of steps.
+
+        Returns:
+            dict: `{room id: steps}`, including `source` itself at 0.
+
+        """
+        self._ensure_loaded()
+        edges = self._edges
+        source = _id(source)
+        found = {source: 0}
+        frontier = [source]
+        for steps in range(1, radius + 1):
+            reached = []
+            for room_id in frontier:
+                for destination_id in edges.get(room_id, {}).values():
+                    if destination_id not in found:
+                        found[destination_id] = steps
+                        reached.append(destination_id)
+            if not reached:
+                break
+            frontier = reached
+        return found
+
+    def regions(self, room):
+        """
+        Args:
+            room (Room or int): The room.
+
+        Returns:
+            tuple: The room's `region` tags.
+
+        """
+        self._ensure_loaded()
+        return self._regions.get(_id(room), ())
+
+    def region_rooms(self, region):
+        """
+        Args:
+            region (str): A `region` tag.
+
+        Returns:
+            frozenset: Ids of the rooms tagged with the region.
+
+        """
+        self._ensure_loaded()
+        region = region.lower()
+        rooms = self._region_members.get(region)
+        if rooms is None:
+            rooms = self._region_members[region] = frozenset(
+                room_id for room_id, regions in self._regions.items() if region in regions
+            )
+        return rooms
+
+    def _region_search(self, rooms, source):
+        # breadth-first, only through rooms of the region
+        edges = self._edges
+        found = {source: 0}
+        queue = deque([source])
+        while queue:
+            room_id = queue.popleft()
+            steps = found[room_id] + 1
+            for destination_id in edges.get(room_id, {}).values():
+                if destination_id in rooms and destination_id not in found:
+                    found[destination_id] = steps
+                    queue.append(destination_id)
+        return found
+
+    def region_distances(self, region, source=None):
+        """
+        Distances between rooms of a region, only counting ways that stay
+        inside it.
+
+        With `source`, the distances from that room are searched on demand
+        and kept in the LRU cache, like paths. Without, the distances between
+        all rooms are computed once per region and kept until the graph
+        changes; since that grows with the square of the region's size, it
+        is refused for regions of more than
+        `settings.ROOM_GRAPH_REGION_MAX_ROOMS` rooms.
+
+        Args:
+            region (str): A `region` tag.
+            source (Room or int, optional): Only the distances from this room.
+
+        Returns:
+            dict: `{room id: steps}` from `source`, or `{room id: {room id:
+                steps}}` for all rooms; rooms that can't be reached are
+                missing.
+
+        Raises:
+            ValueError: For all-pairs distances of a region that is too big.
+
+        """
+        self._ensure_loaded()
+        region = region.lower()
+        if source is not None:
+            key = ("region", region, _id(source))
+            if key in self._paths:
+                self.hits += 1
+                self._paths.move_to_end(key)
+                return self._paths[key]
+            self.misses += 1
+            rooms = self.region_rooms(region)
+            distances = self._region_search(rooms, key[2]) if key[2] in rooms else {}
+            self._cache(key, distances)
+            return distances
+
+        distances = self._region_distances.get(region)
+        if distances is not None:
+            return distances
+        rooms = self.region_rooms(region)
+        max_rooms = getattr(settings, "ROOM_GRAPH_REGION_MAX_ROOMS", 500)
+        if len(rooms) > max_rooms:
+            raise ValueError(
+                f"Region '{region}' has {len(rooms)} rooms, too many for all-pairs "
+                f"distances (max {max_rooms}); ask for the distances from one room."
+            )
+        distances = {room_id: self._region_search(rooms, room_id) for room_id in rooms}
+        self._region_distances[region] = distances
+        return distances
+
+
+ROOM_GRAPH = RoomGraph()
@@ -88,3 +88,76 @@ See the `spawn` command and `evennia.prototypes.spawner.spawn` for more info.
 # "key": "goblin archwizard",
 # "prototype_parent" : ("GOBLIN_WIZARD", "ARCHWIZARD_MIXIN")
 # }
+
+## gathered resources (stackable, see world.items, world.resources and
+## commands/gathering.py)
+
+WILD_BERRIES = {
+    "key": "野果",
+    "typeclass": "typeclasses.objects.StackableObject",
+    "desc": "一把酸甜的野果，勉强可以充饥。",
+    "tags": [("food", "item_type")],
+}
+
+FIREWOOD = {
+    "key": "木柴",
+    "typeclass": "typeclasses.objects.StackableObject",
+    "desc": "一截干燥的树枝，可以用来生火，也能做成简单的工具。",
+    "tags": [("wood", "material")],
+}
+
+FLINT = {
+    "key": "燧石",
+    "typeclass": "typeclasses.objects.StackableObject",
+    "desc": "一块边缘锋利的燧石，敲击时能迸出火星。",
+    "tags": [("flint", "material")],
+}
+
+## crafted items (see world.recipes)
+
+STONE_KNIFE = {
+    "key": "石刀",
+    "typeclass": "typeclasses.objects.Object",
+    "desc": "把燧石绑在木柄上做成的小刀，能切割，也能削木头。",
+    "tags": [("tool", "item_type")],
+}
+
+STONE_AXE = {
+    "key": "石斧",
+    "typeclass": "typeclasses.objects.Object",
+    "desc": "一把粗糙但结实的石斧，砍起树来省力得多。",
+    "tags": [("tool", "item_type")],
+}
+
+TORCH = {
+    "key": "火把",
+    "typeclass": "typeclasses.objects.Object",
+    "desc": "一根缠着干草的木棍，点燃后能照亮周围。",
+    "tags": [("light", "item_type")],
+}
+
+CAMPFIRE = {
+    "key": "篝火",
+    "typeclass": "typeclasses.objects.Object",
+    "desc": "一堆噼啪作响的篝火，散发着令人安心的温暖。",
+    "locks": "get:false()",
+    "tags": [("fire", "item_type")],
+}
+
+## monsters (see world.ai)
+
+FOREST_HARE = {
+    "key": "野兔",
+    "typeclass": "typeclasses.characters.MonsterCharacter",
+    "desc": "一只灰褐色的野兔，竖着耳朵警惕地打量四周。",
+    "attrs": [("behaviour", "passive"), ("max_hp", 15), ("current_hp", 15),
+              ("attack_power", 2), ("agility", 8), ("wander_chance", 0.2)],
+}
+
+GREY_WOLF = {
+    "key": "灰狼",
+    "typeclass": "typeclasses.characters.MonsterCharacter",
+    "desc": "一头瘦骨嶙峋的灰狼，眼睛在树影里泛着绿光。",
+    "attrs": [("behaviour", "aggressive"), ("chase_range", 2), ("max_hp", 40),
+              ("current_hp", 40), ("attack_power", 7), ("agility", 6)],
+}
@@ -0,0 +1,25 @@
+"""
+Recipes
+
+Crafting recipes, keyed by the name players type (`craft 石刀`). Fields:
+
+- product: Prototype key of what is made (see `world/prototypes.py`).
+- ingredients: `{prototype key: count}` of the items used up.
+- tools (optional): Prototype keys of items needed but not used up.
+- in_room (optional): Put the product in the room instead of the
+  crafter's hands, for things like campfires.
+
+Recipes are compiled into lookup indexes by `world.crafting.CRAFTING`.
+
+"""
+
+RECIPES = {
+    "石刀": {"product": "STONE_KNIFE", "ingredients": {"FLINT": 1, "FIREWOOD": 1}},
+    "火把": {"product": "TORCH", "ingredients": {"FIREWOOD": 2}},
+    "石斧": {
+        "product": "STONE_AXE",
+        "ingredients": {"FLINT": 2, "FIREWOOD": 2},
+        "tools": ["STONE_KNIFE"],
+    },
+    "篝火": {"product": "CAMPFIRE", "ingredients": {"FIREWOOD": 3, "FLINT": 1}, "in_room": True},
+}
@@ -0,0 +1,287 @@
+"""
+Resource nodes
+
+Forest rooms offer resources (forageables, wood, flint) that are used up by
+gathering and grow back over time. A room has a node of a resource type
+when the type's feature is set on it (`has_wood` etc., see
+`ForestRoom.get_feature`); every node starts full.
+
+Only nodes that are not full are stored, all of a room's in one
+`resource_pools` Attribute: `{type key: (amount, regrow_at)}`, where
+`regrow_at` is when the next unit grows back. A room nobody gathered in
+stores nothing.
+
+Regrowth is driven by one system on the tick scheduler (`world.ticks`),
+not a timer per room: the times nodes regrow next are kept in a min-heap,
+and every run pops just the nodes that are due and writes their pools back
+together. Amounts are also brought up to date whenever they are read, so a
+late tick (or a server that was down) never shows too little.
+
+Usage:
+
+    from world.resources import RESOURCES
+
+    RESOURCES.available(room, "wood")    # units left
+    RESOURCES.consume(room, "wood")      # units taken, 0 if none left
+
+"""
+
+import heapq
+import time
+from collections import defaultdict
+
+from evennia.objects.models import ObjectDB
+
+from world.attributes import bulk_set_attributes
+from world.gamelog import get_logger
+from world.ticks import TICK_SCHEDULER
+from world.wilderness import ROOM_TYPECLASS as WILDERNESS_ROOM_TYPECLASS
+from world.wilderness import WILDERNESS
+
+POOL_ATTRIBUTE = "resource_pools"
+
+log = get_logger("resources")
+
+
+class ResourceType:
+    """
+    One kind of resource node.
+
+    """
+
+    __slots__ = ("key", "name", "feature", "capacity", "regrow_time", "prototype", "stamina",
+                 "present", "depleted")
+
+    def __init__(self, key, name, feature, capacity, regrow_time, prototype, stamina,
+                 present, depleted):
+        self.key = key
+        self.name = name
+        # the room feature marking rooms that have this node
+        self.feature = feature
+        self.capacity = capacity
+        # seconds for one unit to grow back
+        self.regrow_time = regrow_time
+        # what one unit gathers
+        self.prototype = prototype
+        self.stamina = stamina
+        # lines in the room description, with units left and without
+        self.present = present
+        self.depleted = depleted
+
+    def __repr__(self):
+        return f"<ResourceType {self.key}>"
+
+
+RESOURCE_TYPES = {
+    "forage": ResourceType(
+        "forage", "野果", "has_forageables", capacity=5, regrow_time=300,
+        prototype="WILD_BERRIES", stamina=2,
+        present="你注意到这里似乎有一些可食用的植物。",
+        depleted="这里能吃的东西已经被人采光了。",
+    ),
+    "wood": ResourceType(
+        "wood", "木柴", "has_wood", capacity=8, regrow_time=600,
+        prototype="FIREWOOD", stamina=5,
+        present="周围有不少树木，可以砍伐。",
+        depleted="附近能砍的枝干都已经被砍光了。",
+    ),
+    "flint": ResourceType(
+        "flint", "燧石", "has_flint", capacity=3, regrow_time=1800,
+        prototype="FLINT", stamina=8,
+        present="你看到一些岩石，也许能找到燧石。",
+        depleted="岩石间已经找不到燧石了。",
+    ),
+}
+
+
+def _feature(room, name):
+    if hasattr(room, "get_feature"):
+        return room.get_feature(name)
+    return room.attributes.get(name)
+
+
+def _settle(resource, amount, regrow_at, now):
+    """
+    Grow back the units due by `now`.
+
+    Returns:
+        tuple: `(amount, regrow_at)`; `regrow_at` is None once full.
+
+    """
+    if regrow_at is not None and now >= regrow_at:
+        grown = 1 + int((now - regrow_at) // resource.regrow_time)
+        amount = min(resource.capacity, amount + grown)
+        regrow_at += grown * resource.regrow_time
+    if amount >= resource.capacity:
+        return resource.capacity, None
+    return amount, regrow_at
+
+
+class ResourceNodes:
+    """
+    Resource pools of all rooms and the heap of their regrowth times.
+
+    """
+
+    def __init__(self):
+        # (regrow_at, room id, type key); entries may be stale, the pool
+        # Attribute is the truth
+        self._queue = []
+        self._loaded = False
+
+    def __len__(self):
+        return len(self._queue)
+
+    def load(self):
+        """
+        Queue the regrowth of all partly used nodes after a server start and
+        register the regrowth system.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        self._queue = []
+        pools = ObjectDB.db_attributes.through.objects.filter(
+            attribute__db_key=POOL_ATTRIBUTE, attribute__db_category__isnull=True
+        ).values_list("objectdb_id", "attribute__db_value")
+        for room_id, pool in pools:
+            for key, (_, regrow_at) in (pool or {}).items():
+                if key in RESOURCE_TYPES and regrow_at is not None:
+                    self._queue.append((regrow_at, room_id, key))
+        heapq.heapify(self._queue)
+        TICK_SCHEDULER.register("resources", self.regrow, period=30)
+        log.info("Resource nodes loaded.", pending=len(self._queue))
+
+    def clear(self):
+        """
+        Forget the queue; it's rebuilt by the next `load`.
+        """
+        self._queue = []
+        self._loaded = False
+        TICK_SCHEDULER.unregister("resources")
+
+    def has(self, room, key):
+        """
+        Args:
+            room (Room): The room.
+            key (str): A key of `RESOURCE_TYPES`.
+
+        Returns:
+            bool: If the room has a node of this type, even an empty one.
+
+        """
+        resource = RESOURCE_TYPES.get(key)
+        return bool(resource and _feature(room, resource.feature))
+
+    def available(self, room, key, now=None):
+        """
+        Args:
+            room (Room): The room.
+            key (str): A key of `RESOURCE_TYPES`.
+            now (float, optional): The current time.
+
+        Returns:
+            int: Units left in the room's node, 0 if it has none.
+
+        """
+        if not self.has(room, key):
+            return 0
+        resource = RESOURCE_TYPES[key]
+        pool = (room.attributes.get(POOL_ATTRIBUTE) or {}).get(key)
+        if pool is None:
+            return resource.capacity
+        now = time.time() if now is None else now
+        return _settle(resource, *pool, now)[0]
+
+    def consume(self, room, key, amount=1, now=None):
+        """
+        Take units from a room's node. Checking and taking is one step, so
+        two gatherers can never both get the last unit.
+
+        Args:
+            room (Room): The room.
+            key (str): A key of `RESOURCE_TYPES`.
+            amount (int, optional): Units wanted.
+            now (float, optional): The current time.
+
+        Returns:
+            int: Units actually taken, up to `amount`; 0 if none were left.
+
+        """
+        if not self.has(room, key):
+            return 0
+        resource = RESOURCE_TYPES[key]
+        now = time.time() if now is None else now
+        pools = dict(room.attributes.get(POOL_ATTRIBUTE) or {})
+        stored = pools.get(key, (resource.capacity, None))
+        left, regrow_at = _settle(resource, *stored, now)
+        taken = min(amount, left)
+        if taken <= 0:
+            return 0
+        if regrow_at is None:
+            regrow_at = now + resource.regrow_time
+        if regrow_at != stored[1]:
+            # the queued entry (if any) is for the old time and will be
+            # skipped by `regrow`, so queue the new one
+            heapq.heappush(self._queue, (regrow_at, room.id, key))
+        pools[key] = (left - taken, regrow_at)
+        room.attributes.add(POOL_ATTRIBUTE, pools)
+        if room.is_typeclass(WILDERNESS_ROOM_TYPECLASS, exact=False):
+            # keep the tile's room, or the node would be full again
+            WILDERNESS.materialize(room)
+        return taken
+
+    def regrow(self, now=None):
+        """
+        Grow back the nodes that are due and write their pools. Run by the
+        tick scheduler.
+
+        Args:
+            now (float, optional): The current time.
+
+        Returns:
+            int: Number of rooms whose pools changed.
+
+        """
+        now = time.time() if now is None else now
+        queue = self._queue
+        due = defaultdict(set)
+        while queue and queue[0][0] <= now:
+            _, room_id, key = heapq.heappop(queue)
+            due[room_id].add(key)
+        if not due:
+            return 0
+
+        updates = []
+        for room in ObjectDB.objects.filter(id__in=list(due)):
+            pools = room.attributes.get(POOL_ATTRIBUTE)
+            if not pools:
+                # e.g. a wilderness tile the forest reclaimed
+                continue
+            pools = dict(pools)
+            changed = False
+            for key in due[room.id] & set(pools):
+                amount, regrow_at = pools[key]
+                if regrow_at is None or regrow_at > now:
+                    # stale: whoever moved regrow_at queued a newer entry
+                    continue
+                amount, regrow_at = _settle(RESOURCE_TYPES[key], amount, regrow_at, now)
+                if regrow_at is None:
+                    del pools[key]
+                else:
+                    pools[key] = (amount, regrow_at)
+                    heapq.heappush(queue, (regrow_at, room.id, key))
+                changed = True
+            if changed:
+                updates.append((room, POOL_ATTRIBUTE, pools))
+
+        bulk_set_attributes(updates)
+        for room, _, _ in updates:
+            # the bulk write bypasses the room's Attribute handler
+            if hasattr(room, "invalidate_appearance"):
+                room.invalidate_appearance()
+        log.debug("Resource nodes regrew.", rooms=len(updates), pending=len(queue))
+        return len(updates)
+
+
+RESOURCES = ResourceNodes()
@@ -0,0 +1,18 @@
+"""
+Skills
+
+Skill definitions, keyed by the name players type. Fields:
+
+- type: "attack" (an immediate extra hit on the target) or "heal".
+- cost_stamina: Stamina used.
+- cooldown: Seconds before the skill can be used again, tracked by
+  `world.cooldowns.COOLDOWNS`.
+- damage_multiplier: For attacks, applied to the attack power.
+- heal_amount: For heals, hp restored.
+
+"""
+
+SKILLS = {
+    "猛击": {"cost_stamina": 10, "cooldown": 5, "damage_multiplier": 1.5, "type": "attack"},
+    "治疗术": {"cost_stamina": 15, "cooldown": 10, "heal_amount": 20, "type": "heal"},
+}
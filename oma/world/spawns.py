@@ -0,0 +1,135 @@
+"""
+Spawn points
+
+Characters (re)spawn in a `ForestRoom` tagged `forest_spawn_point:info`.
+Looking those up used to mean one or two tag searches plus a typeclass
+check per candidate on every spawn and every death. `SPAWN_POINTS` resolves
+them once and keeps the result until a `ForestRoom` gains or loses a spawn
+tag or is deleted (the room invalidates the registry itself).
+
+Selection strategies (`settings.SPAWN_STRATEGY`):
+
+- "random": any spawn point, uniformly.
+- "weighted": random, weighted by each room's `spawn_weight` Attribute
+  (default 1). Use `ForestRoom.set_spawn_point` to change weights so the
+  registry picks the change up.
+- "least_populated": the spawn point with the fewest online characters
+  (ties broken by weight), so clustered deaths spread out.
+
+All strategies can be limited to one `region` tag.
+
+"""
+
+import random
+
+from django.conf import settings
+from evennia import search_tag
+
+from world.gamelog import get_logger
+from world.online import ONLINE_CHARACTERS, REGION_TAG_CATEGORY
+
+SPAWN_TAG = "forest_spawn_point"
+SPAWN_TAG_CATEGORY = "info"
+SPAWN_TYPECLASS = "typeclasses.rooms.ForestRoom"
+
+log = get_logger("spawns")
+
+
+class SpawnPoint:
+    """
+    Cached data about one spawn room.
+
+    """
+
+    __slots__ = ("room", "weight", "regions")
+
+    def __init__(self, room, weight, regions):
+        self.room = room
+        self.weight = weight
+        self.regions = regions
+
+    def __repr__(self):
+        return f"<SpawnPoint {self.room.key} weight={self.weight}>"
+
+
+class SpawnRegistry:
+    """
+    Lazily loaded, explicitly invalidated cache of spawn rooms.
+
+    """
+
+    def __init__(self):
+        self._points = None
+
+    def invalidate(self):
+        """
+        Forget the cached spawn points; they're reloaded on next use.
+        """
+        self._points = None
+
+    def _load(self):
+        rooms = search_tag(key=SPAWN_TAG, category=SPAWN_TAG_CATEGORY)
+        if not rooms:
+            # older builds tagged spawn points without a category
+            rooms = search_tag(key=SPAWN_TAG)
+        points = []
+        for room in rooms:
+            if not room.is_typeclass(SPAWN_TYPECLASS, exact=False):
+                continue
+            regions = tuple(room.tags.get(category=REGION_TAG_CATEGORY, return_list=True))
+            weight = room.attributes.get("spawn_weight", default=1)
+            points.append(SpawnPoint(room, max(0, weight), regions))
+        log.debug("Loaded %s spawn points.", len(points))
+        return points
+
+    def points(self, region=None):
+        """
+        Get the spawn points, loading them if needed.
+
+        Args:
+            region (str, optional): Only return points tagged with this region.
+
+        Returns:
+            list: `SpawnPoint`s.
+
+        """
+        if self._points is None:
+            self._points = self._load()
+        if region is None:
+            return list(self._points)
+        region = region.lower()
+        return [point for point in self._points if region in point.regions]
+
+    def choose(self, region=None, strategy=None):
+        """
+        Pick a spawn room.
+
+        Args:
+            region (str, optional): Prefer spawn points in this region. Falls
+                back to all spawn points if the region has none.
+            strategy (str, optional): "random", "weighted" or
+                "least_populated". Defaults to `settings.SPAWN_STRATEGY`.
+
+        Returns:
+            Room or None: The chosen room, or None if there are no spawn points.
+
+        """
+        points = (self.points(region) if region else []) or self.points()
+        if not points:
+            return None
+        strategy = strategy or getattr(settings, "SPAWN_STRATEGY", "weighted")
+
+        if strategy == "least_populated":
+            counts = [ONLINE_CHARACTERS.count_in_room(point.room) for point in points]
+            fewest = min(counts)
+            points = [point for point, count in zip(points, counts) if count == fewest]
+            strategy = "weighted"
+
+        if strategy == "weighted":
+            weights = [point.weight for point in points]
+            if any(weights):
+                return random.choices(points, weights=weights)[0].room
+        return random.choice(points).room
+
+
+SPAWN_POINTS = SpawnRegistry()
@@ -0,0 +1,185 @@
+"""
+Stat handler
+
+Survival and combat stats change constantly (every needs tick, every hit),
+and writing each change straight to its Attribute means one pickled row
+UPDATE per assignment. `StatHandler` keeps those stats in memory on the
+character, remembers which ones changed and writes them back together:
+
+- on a timer (`StatsFlushScript`, every `settings.STATS_FLUSH_INTERVAL`),
+- when the character is unpuppeted or dies,
+- for everyone before a server reload or shutdown.
+
+Usage:
+
+    char.stats.hunger -= 1        # memory only, marks hunger dirty
+    char.stats.flush()            # write this character's dirty stats
+    flush_all()                   # write every character's dirty stats
+
+The Attributes remain the persistent storage, so `char.db.hunger` still
+works for reading. Code that changes a stat should go through `stats`
+though, or the next flush will overwrite the change. Changes to hp and
+needs are also pushed to clients that asked for them, see `world.vitals`.
+
+"""
+
+from world.attributes import bulk_set_attributes
+from world.vitals import VITALS
+
+# stat name -> default used when the Attribute is missing
+STAT_DEFAULTS = {
+    "current_hp": 50,
+    "hunger": 100,
+    "thirst": 100,
+    "stamina": 100,
+    "temperature": 37.0,
+    "skill_cooldowns": None,
+    "is_in_combat": False,
+    "combat_target": None,
+}
+
+# handlers with unsaved changes
+_DIRTY_HANDLERS = set()
+
+
+class _Stat:
+    """
+    Descriptor exposing one slot of `StatHandler` and marking it dirty on set.
+    """
+
+    __slots__ = ("name", "slot")
+
+    def __init__(self, name):
+        self.name = name
+        self.slot = "_" + name
+
+    def __get__(self, handler, owner=None):
+        if handler is None:
+            return self
+        return getattr(handler, self.slot)
+
+    def __set__(self, handler, value):
+        setattr(handler, self.slot, value)
+        handler.mark_dirty(self.name)
+
+
+class StatHandler:
+    """
+    In-memory, write-behind view of a character's survival and combat stats.
+    Set up as `char.stats` through a `lazy_property` on the typeclass.
+
+    """
+
+    __slots__ = ("obj", "dirty") + tuple("_" + name for name in STAT_DEFAULTS)
+
+    current_hp = _Stat("current_hp")
+    hunger = _Stat("hunger")
+    thirst = _Stat("thirst")
+    stamina = _Stat("stamina")
+    temperature = _Stat("temperature")
+    skill_cooldowns = _Stat("skill_cooldowns")
+    is_in_combat = _Stat("is_in_combat")
+    combat_target = _Stat("combat_target")
+
+    def __init__(self, obj):
+        """
+        Args:
+            obj (Object): The object whose Attributes back these stats.
+
+        """
+        self.obj = obj
+        self.dirty = set()
+        self.load()
+
+    def __repr__(self):
+        return f"<StatHandler {self.obj.key} dirty={sorted(self.dirty)}>"
+
+    def load(self):
+        """
+        (Re)load every stat from its Attribute, dropping unsaved changes.
+        """
+        attributes = self.obj.attributes
+        for name, default in STAT_DEFAULTS.items():
+            setattr(self, "_" + name, attributes.get(name, default=default))
+        if self._skill_cooldowns is None:
+            self._skill_cooldowns = {}
+        self.dirty.clear()
+        _DIRTY_HANDLERS.discard(self)
+
+    def mark_dirty(self, *names):
+        """
+        Flag stats as changed. Needed after mutating a mutable stat (like
+        `skill_cooldowns`) in place, which the descriptors can't see.
+
+        Args:
+            *names (str): The stats that changed.
+
+        """
+        self.dirty.update(names)
+        _DIRTY_HANDLERS.add(self)
+        VITALS.changed(self.obj, names)
+
+    def pending(self):
+        """
+        Get the unsaved changes. The stats stay dirty until `saved` is
+        called, so changes whose write failed are written by the next flush.
+
+        Returns:
+            list: `(obj, key, value)` tuples for `bulk_set_attributes`.
+
+        """
+        return [(self.obj, name, getattr(self, "_" + name)) for name in self.dirty]
+
+    def saved(self):
+        """
+        Clear the dirty flags once the `pending` changes are written.
+        """
+        self.dirty.clear()
+        _DIRTY_HANDLERS.discard(self)
+
+    def flush(self):
+        """
+        Write this object's dirty stats to the database.
+
+        Returns:
+            int: Number of Attribute values written.
+
+        """
+        if not self.dirty:
+            return 0
+        return flush_handlers([self])
+
+
+def flush_handlers(handlers):
+    """
+    Write the dirty stats of several handlers in one transaction.
+
+    Args:
+        handlers (iterable): The `StatHandler`s to flush.
+
+    Returns:
+        int: Number of Attribute values written.
+
+    """
+    handlers = list(handlers)
+    updates = []
+    for handler in handlers:
+        if handler.obj.pk:
+            # skip objects deleted since they were changed
+            updates.extend(handler.pending())
+    written = bulk_set_attributes(updates)
+    # only now: if the write raised, everything stays dirty for the next try
+    for handler in handlers:
+        handler.saved()
+    return written
+
+
+def flush_all():
+    """
+    Write every pending stat change in the game in one transaction.
+
+    Returns:
+        int: Number of Attribute values written.
+
+    """
+    return flush_handlers(list(_DIRTY_HANDLERS))
@@ -0,0 +1,294 @@
+"""
+Tick scheduler
+
+Periodic game systems (needs, weather, campfires, monster AI...) used to
+each run on their own timer and process everything at once, so every
+system produced a spike on the reactor once per period. The scheduler
+instead runs on one short timer (a *slot*, `settings.TICK_SCHEDULER_SLOT`
+seconds, driven by `TickSchedulerScript`) and spreads each system's work
+over all slots in its period:
+
+- A system with a population (e.g. the online characters) is split into
+  `period / slot` shards by entity id. Each slot processes one shard, so
+  every entity is still handled exactly once per period, just not all at
+  the same moment.
+- A system without a population runs whole, once per period, in a slot
+  picked from its key so different systems don't pile up in the same slot.
+
+A per-system `budget` caps how many entities one slot may process; any
+excess is carried over to the front of the next slot. The carried-over
+backlog holds each entity once and drops entities that left the
+population; a warning is logged while it is larger than
+`BACKLOG_WARN_SHARDS` shards, i.e. while the budget can't keep up.
+
+Usage:
+
+    from world.ticks import TICK_SCHEDULER
+
+    TICK_SCHEDULER.register(
+        "needs", callback, period=60, population=ONLINE_CHARACTERS.all)
+
+    # callback(entities) gets the entities of the current shard,
+    # or no arguments if the system has no population.
+
+Period and budget can be overridden per system key in
+`settings.TICK_SYSTEMS`.
+
+Systems that need sub-second timing (combat) use `FRAME_CLOCK` instead: a
+single in-memory timer firing every `settings.FRAME_CLOCK_INTERVAL` seconds
+that only runs while at least one system is subscribed to it.
+
+    from world.ticks import FRAME_CLOCK
+
+    FRAME_CLOCK.subscribe("combat", callback)  # callback(now) every frame
+    FRAME_CLOCK.unsubscribe("combat")          # stops the timer if last
+
+"""
+
+import time
+import zlib
+
+from django.conf import settings
+from evennia.utils import logger
+from twisted.internet.task import LoopingCall
+
+# warn when a system's backlog is larger than this many shards
+BACKLOG_WARN_SHARDS = 1
+
+
+class TickSystem:
+    """
+    One registered periodic system.
+
+    """
+
+    __slots__ = (
+        "key",
+        "callback",
+        "period",
+        "population",
+        "budget",
+        "backlog",
+        "overloaded",
+        "last_count",
+        "last_duration",
+    )
+
+    def __init__(self, key, callback, period, population=None, budget=None):
+        self.key = key
+        self.callback = callback
+        self.period = period
+        self.population = population
+        self.budget = budget
+        # entity id -> entity carried over from earlier slots, oldest first
+        self.backlog = {}
+        self.overloaded = False
+        self.last_count = 0
+        self.last_duration = 0.0
+
+    def __repr__(self):
+        return f"<TickSystem {self.key} period={self.period}s budget={self.budget}>"
+
+
+class TickScheduler:
+    """
+    Spreads registered systems across fixed-length slots.
+
+    """
+
+    def __init__(self):
+        self.systems = {}
+        self.slot_index = 0
+
+    @property
+    def slot(self):
+        """
+        Length of one slot in seconds.
+        """
+        return max(1, getattr(settings, "TICK_SCHEDULER_SLOT", 5))
+
+    def shards(self, system):
+        """
+        Args:
+            system (TickSystem): A registered system.
+
+        Returns:
+            int: How many slots (and shards) the system's period spans.
+
+        """
+        return max(1, int(round(system.period / self.slot)))
+
+    def register(self, key, callback, period=60, population=None, budget=None):
+        """
+        Add a system, replacing any earlier one with the same key.
+
+        Args:
+            key (str): Unique name of the system, also used to look up
+                overrides in `settings.TICK_SYSTEMS`.
+            callback (callable): Called with the list of entities of the
+                current shard, or with no arguments if there's no population.
+            period (int, optional): Seconds between two runs for the same
+                entity.
+            population (callable, optional): Returns the entities to shard.
+                Entities must have an integer `id`.
+            budget (int, optional): Max entities per slot. `None` means
+                no limit.
+
+        Returns:
+            TickSystem: The registered system.
+
+        """
+        overrides = getattr(settings, "TICK_SYSTEMS", {}).get(key, {})
+        system = TickSystem(
+            key,
+            callback,
+            overrides.get("period", period),
+            population=population,
+            budget=overrides.get("budget", budget),
+        )
+        self.systems[key] = system
+        return system
+
+    def unregister(self, key):
+        """
+        Remove a system.
+
+        Args:
+            key (str): The key it was registered with.
+
+        """
+        self.systems.pop(key, None)
+
+    def run_slot(self):
+        """
+        Run one slot: the due shard of every system. Called by
+        `TickSchedulerScript` every `slot` seconds.
+        """
+        slot_index = self.slot_index
+        self.slot_index += 1
+        for system in list(self.systems.values()):
+            try:
+                self._run_system(system, slot_index)
+            except Exception:
+                logger.log_trace(f"TickScheduler: system '{system.key}' failed.")
+
+    def _run_system(self, system, slot_index):
+        shards = self.shards(system)
+        shard = slot_index % shards
+        start = time.perf_counter()
+
+        if system.population is None:
+            if shard != zlib.crc32(system.key.encode()) % shards:
+                return
+            system.callback()
+            system.last_count = 0
+        else:
+            population = list(system.population())
+            due = system.backlog
+            if due:
+                # drop entities deleted or logged off since they were carried over
+                alive = {entity.id for entity in population}
+                due = {entity_id: entity for entity_id, entity in due.items() if entity_id in alive}
+            for entity in population:
+                if entity.id % shards == shard:
+                    due.setdefault(entity.id, entity)
+            entities = list(due.values())
+            if system.budget is not None and len(entities) > system.budget:
+                entities, rest = entities[: system.budget], entities[system.budget :]
+                system.backlog = {entity.id: entity for entity in rest}
+            else:
+                system.backlog = {}
+            self._check_backlog(system, len(population) / shards)
+            if not entities:
+                return
+            system.callback(entities)
+            system.last_count = len(entities)
+
+        system.last_duration = time.perf_counter() - start
+
+    @staticmethod
+    def _check_backlog(system, shard_size):
+        """
+        Log when a system's backlog starts or stops growing past
+        `BACKLOG_WARN_SHARDS` shards.
+        """
+        overloaded = len(system.backlog) > BACKLOG_WARN_SHARDS * max(1.0, shard_size)
+        if overloaded and not system.overloaded:
+            logger.log_warn(
+                f"TickScheduler: system '{system.key}' is behind by {len(system.backlog)} "
+                f"entities (budget {system.budget} per slot)."
+            )
+        elif system.overloaded and not overloaded:
+            logger.log_info(f"TickScheduler: system '{system.key}' caught up.")
+        system.overloaded = overloaded
+
+
+class FrameClock:
+    """
+    One shared sub-second timer for all real-time systems. Subscribers are
+    called in subscription order with the current time, once per frame.
+
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self._loop = None
+
+    @property
+    def interval(self):
+        """
+        Length of one frame in seconds.
+        """
+        return getattr(settings, "FRAME_CLOCK_INTERVAL", 0.25)
+
+    @property
+    def running(self):
+        return self._loop is not None and self._loop.running
+
+    def subscribe(self, key, callback):
+        """
+        Call `callback(now)` every frame, starting the timer if needed.
+
+        Args:
+            key (str): Unique name of the subscriber.
+            callback (callable): Called with `time.time()` each frame.
+
+        """
+        self.subscribers[key] = callback
+        if not self.running:
+            self._loop = LoopingCall(self.run_frame)
+            self._loop.start(self.interval, now=False).addErrback(
+                lambda failure: logger.log_trace(f"FrameClock stopped: {failure}")
+            )
+
+    def unsubscribe(self, key):
+        """
+        Stop calling a subscriber. The timer stops with the last one.
+
+        Args:
+            key (str): The key it subscribed with.
+
+        """
+        self.subscribers.pop(key, None)
+        if not self.subscribers and self.running:
+            self._loop.stop()
+            self._loop = None
+
+    def run_frame(self, now=None):
+        """
+        Run one frame for every subscriber.
+
+        Args:
+            now (float, optional): The frame's time. Defaults to `time.time()`.
+
+        """
+        now = time.time() if now is None else now
+        for key, callback in list(self.subscribers.items()):
+            try:
+                callback(now)
+            except Exception:
+                logger.log_trace(f"FrameClock: subscriber '{key}' failed.")
+
+
+TICK_SCHEDULER = TickScheduler()
+FRAME_CLOCK = FrameClock()
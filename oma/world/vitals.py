@@ -0,0 +1,275 @@
+"""
+Vitals
+
+Clients learn a character's hp and needs from text lines, which graphical
+clients then have to scrape. `VITALS` pushes them over OOB instead, as a
+`char_vitals` command (GMCP `Char.Vitals`, or `["char_vitals", [], {...}]`
+for the webclient), to every session that asked for it:
+
+    Char.Vitals {"hp": 50, "maxhp": 50, "hunger": 100, "thirst": 100, "stamina": 100}
+    Char.Vitals {"hunger": 99}
+
+The first push after subscribing (or puppeting another character) has all
+fields; after that only the fields that differ from what that session was
+last sent. Changes are noticed through `StatHandler.mark_dirty` and sent at
+the end of the frame (`world.ticks.FRAME_CLOCK`), so a needs tick or a
+flurry of hits that changes several stats makes one packet. Each session
+also has a minimum interval between pushes; changes made in between wait
+and go out together.
+
+`maxhp` is an Attribute rather than a stat, so a change to it alone isn't
+noticed; it goes out with the next change of another field.
+
+Clients subscribe through the `char_vitals` inputfunc
+(`server/conf/inputfuncs.py`). Subscriptions live in memory and are kept
+across reloads through the session's `VITALS` protocol flag.
+
+Usage:
+
+    from world.vitals import VITALS
+
+    VITALS.subscribe(session, interval=1.0)
+    VITALS.unsubscribe(session)
+    VITALS.flush()                     # push now instead of at frame end
+
+"""
+
+import time
+
+from django.conf import settings
+
+from world.gamelog import get_logger
+from world.ticks import FRAME_CLOCK
+
+# stat -> field name in the packet
+VITAL_STATS = {
+    "current_hp": "hp",
+    "hunger": "hunger",
+    "thirst": "thirst",
+    "stamina": "stamina",
+}
+OUTPUTFUNC = "char_vitals"
+# longest interval a client may ask for
+MAX_INTERVAL = 60.0
+
+log = get_logger("vitals")
+
+
+def min_interval():
+    """
+    Returns:
+        float: Shortest allowed interval between two pushes to a session,
+            also the interval used when the client doesn't ask for one.
+
+    """
+    return getattr(settings, "VITALS_MIN_INTERVAL", 0.5)
+
+
+def snapshot(char):
+    """
+    Args:
+        char (PrimordialCharacter): The character.
+
+    Returns:
+        dict: Every vitals field with its current value.
+
+    """
+    stats = char.stats
+    values = {field: getattr(stats, stat) for stat, field in VITAL_STATS.items()}
+    values["maxhp"] = char.attributes.get("max_hp", default=stats.current_hp)
+    return values
+
+
+class Subscription:
+    """
+    One session's subscription.
+
+    """
+
+    __slots__ = ("session", "interval", "char_id", "sent", "due")
+
+    def __init__(self, session, interval):
+        self.session = session
+        self.interval = interval
+        # id of the character it reports on, None while not puppeting one
+        self.char_id = None
+        # field -> value as last sent to the session
+        self.sent = {}
+        # no push before this time
+        self.due = 0.0
+
+
+class VitalsChannel:
+    """
+    Vitals subscriptions and the characters with unsent changes.
+
+    """
+
+    def __init__(self):
+        # session id -> Subscription
+        self._subs = {}
+        # character id -> {session id: Subscription}
+        self._watchers = {}
+        # character id -> character with unsent changes
+        self._dirty = {}
+        self.sends = 0
+
+    def __len__(self):
+        return len(self._subs)
+
+    def clear(self):
+        """
+        Drop all subscriptions and pending changes.
+        """
+        self._subs.clear()
+        self._watchers.clear()
+        self._dirty.clear()
+        FRAME_CLOCK.unsubscribe("vitals")
+
+    def _watch(self, sub, char):
+        old = self._watchers.get(sub.char_id)
+        if old is not None:
+            old.pop(sub.session.sessid, None)
+            if not old:
+                del self._watchers[sub.char_id]
+        sub.char_id = None
+        sub.sent = {}
+        sub.due = 0.0
+        if char is not None and getattr(char, "stats", None) is not None:
+            sub.char_id = char.id
+            self._watchers.setdefault(char.id, {})[sub.session.sessid] = sub
+            self._mark(char)
+
+    def _mark(self, char):
+        if not self._dirty:
+            FRAME_CLOCK.subscribe("vitals", self.flush)
+        self._dirty[char.id] = char
+
+    def subscribe(self, session, interval=None):
+        """
+        Push the vitals of the session's puppet to it from now on. The next
+        push has all fields. Subscribing again only changes the interval.
+
+        Args:
+            session (ServerSession): The session.
+            interval (float, optional): Minimum seconds between pushes,
+                clamped to `settings.VITALS_MIN_INTERVAL`..`MAX_INTERVAL`.
+
+        Returns:
+            float: The interval used.
+
+        """
+        floor = min_interval()
+        interval = floor if interval is None else min(max(float(interval), floor), MAX_INTERVAL)
+        sub = self._subs.get(session.sessid)
+        if sub is None:
+            sub = self._subs[session.sessid] = Subscription(session, interval)
+            self._watch(sub, session.puppet)
+        else:
+            sub.session = session
+            sub.interval = interval
+        return interval
+
+    def unsubscribe(self, session):
+        """
+        Stop pushing vitals to a session.
+
+        Args:
+            session (ServerSession): The session.
+
+        Returns:
+            bool: If it was subscribed.
+
+        """
+        sub = self._subs.pop(session.sessid, None)
+        if sub is None:
+            return False
+        self._watch(sub, None)
+        return True
+
+    def is_subscribed(self, session):
+        """
+        Returns:
+            bool: If vitals are pushed to this session.
+
+        """
+        return session.sessid in self._subs
+
+    def bind(self, session, char):
+        """
+        Report on another character, when a subscribed session puppets or
+        stops puppeting one. The next push has all fields.
+
+        Args:
+            session (ServerSession): The session.
+            char (Object or None): What it puppets now.
+
+        """
+        sub = self._subs.get(session.sessid)
+        if sub is not None:
+            self._watch(sub, char)
+
+    def changed(self, char, names):
+        """
+        Note that stats of a character changed. Called by `StatHandler`.
+
+        Args:
+            char (Object): The character.
+            names (iterable): The stats that changed.
+
+        """
+        if char.id in self._watchers and not VITAL_STATS.keys().isdisjoint(names):
+            self._mark(char)
+
+    def flush(self, now=None):
+        """
+        Push changed vitals to every subscribed session that is due. Called
+        by `FRAME_CLOCK` at the end of the frame; changes for sessions not
+        yet due stay queued for a later frame.
+
+        Args:
+            now (float, optional): The current `time.time()`.
+
+        Returns:
+            int: Number of packets sent.
+
+        """
+        dirty = self._dirty
+        if not dirty:
+            return 0
+        now = time.time() if now is None else now
+        self._dirty = {}
+        waiting = {}
+        sent = 0
+        for char_id, char in dirty.items():
+            watchers = self._watchers.get(char_id)
+            if not watchers or not char.pk:
+                continue
+            values = None
+            for sub in watchers.values():
+                if now < sub.due:
+                    waiting[char_id] = char
+                    continue
+                if values is None:
+                    values = snapshot(char)
+                last = sub.sent
+                delta = {
+                    field: value
+                    for field, value in values.items()
+                    if field not in last or last[field] != value
+                }
+                if delta:
+                    last.update(delta)
+                    sub.due = now + sub.interval
+                    sub.session.msg(**{OUTPUTFUNC: delta})
+                    sent += 1
+        self._dirty.update(waiting)
+        if not self._dirty:
+            FRAME_CLOCK.unsubscribe("vitals")
+        self.sends += sent
+        if sent:
+            log.debug("Vitals pushed.", characters=len(dirty), sends=sent, waiting=len(waiting))
+        return sent
+
+
+VITALS = VitalsChannel()
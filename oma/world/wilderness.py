@@ -0,0 +1,440 @@
+"""
+Wilderness
+
+The far Glimmerdew Forest isn't stored room by room. Its tiles are computed
+on demand from their coordinates and `settings.WILDERNESS_SEED`, with the
+same terrain as the generated regions (`world.map.procgen.Terrain`), and
+only tiles that somebody is standing on, or that somebody changed, are
+backed by a database object. The forest can be as large as we like without
+growing the objects table.
+
+- A tile somebody walks onto is *bound* to a `WildernessRoom` taken from a
+  pool of spare rooms; a new room (with its four exits) is only created when
+  the pool is empty. The room shows the tile's terrain, which is kept in
+  memory, so binding a tile writes nothing but the room's `coordinates`.
+- When the last character leaves an unchanged tile, the tile is released
+  right away: its room goes back to the pool and the tile is virtual again.
+- A tile is *changed* while anything other than characters and exits is in
+  it (an item dropped, a campfire built), or after code called
+  `WILDERNESS.materialize(room)`, e.g. when a resource was used up. Changed
+  tiles keep their room so the changes stay.
+- A sweep on the tick scheduler releases changed tiles nobody visited for
+  `settings.WILDERNESS_IDLE_TIME` seconds: the forest reclaims whatever was
+  left there and the tile goes back to its generated state.
+
+Characters enter through a `WildernessEntrance` exit placed in an ordinary
+room and leave by walking off the map at the tile they came in by.
+
+Usage:
+
+    from world.wilderness import WILDERNESS
+
+    WILDERNESS.enter(char, (500, 0), return_to=char.location)
+    WILDERNESS.move(char, (501, 0))
+    WILDERNESS.materialize(char.location)
+    WILDERNESS.tile((501, 0))   # (room key, definition), nothing created
+
+"""
+
+import time
+
+from django.conf import settings
+from evennia.objects.models import ObjectDB
+from evennia.objects.objects import DefaultCharacter
+from evennia.utils.utils import inherits_from
+
+from world.builder import ObjectSpec, bulk_create_objects
+from world.gamelog import get_logger
+from world.map.procgen import REGION_TAG, Terrain
+from world.ticks import TICK_SCHEDULER
+
+ROOM_TYPECLASS = "typeclasses.rooms.WildernessRoom"
+EXIT_TYPECLASS = "typeclasses.exits.WildernessExit"
+# rooms owned by the wilderness, bound or spare
+WILDERNESS_TAG = ("wilderness", "wilderness")
+CHANGED_ATTRIBUTE = "wilderness_changed"
+# where a character returns to when walking off the map
+RETURN_ATTRIBUTE = "wilderness_return"
+# where a character that logged out in the wilderness is put back
+LOGOUT_ATTRIBUTE = "wilderness_coordinates"
+# spare rooms created at once when the pool runs dry
+POOL_GROWTH = 10
+
+# exit key -> (dx, dy, aliases)
+DIRECTIONS = {
+    "北": (0, -1, ["north", "n"]),
+    "东": (1, 0, ["east", "e"]),
+    "南": (0, 1, ["south", "s"]),
+    "西": (-1, 0, ["west", "w"]),
+}
+
+log = get_logger("wilderness")
+
+
+def _is_visitor(obj):
+    return obj.has_account or inherits_from(obj, DefaultCharacter)
+
+
+class Wilderness:
+    """
+    Binds wilderness tiles to pooled rooms on demand.
+
+    """
+
+    def __init__(self):
+        self.rooms = {}
+        self.spare = []
+        self.last_visit = {}
+        self._terrain = None
+        self._loaded = False
+
+    def __len__(self):
+        return len(self.rooms)
+
+    # configuration
+
+    @property
+    def terrain(self):
+        if self._terrain is None:
+            self._terrain = Terrain(getattr(settings, "WILDERNESS_SEED", 1), origin=self.entry)
+        return self._terrain
+
+    @property
+    def size(self):
+        return tuple(getattr(settings, "WILDERNESS_SIZE", (1000, 1000)))
+
+    @property
+    def entry(self):
+        """
+        Default coordinates to enter at: the middle of the north edge.
+        """
+        return (self.size[0] // 2, 0)
+
+    def is_valid(self, coordinates):
+        """
+        Args:
+            coordinates (tuple): `(x, y)`.
+
+        Returns:
+            bool: If the coordinates are on the map.
+
+        """
+        x, y = coordinates
+        width, height = self.size
+        return 0 <= x < width and 0 <= y < height
+
+    def tile(self, coordinates):
+        """
+        The generated state of a tile. Doesn't touch the database.
+
+        Args:
+            coordinates (tuple): `(x, y)`.
+
+        Returns:
+            tuple: `(room key, definition)`, see `Terrain.room`.
+
+        """
+        return self.terrain.room(*coordinates)
+
+    # registry
+
+    def load(self):
+        """
+        Find the wilderness rooms after a server start; bound ones are
+        treated as just visited. Also registers the idle sweep.
+        """
+        if self._loaded:
+            return
+        self._loaded = True
+        now = time.time()
+        self.rooms.clear()
+        self.spare.clear()
+        rooms = ObjectDB.objects.filter(
+            db_tags__db_key=WILDERNESS_TAG[0], db_tags__db_category=WILDERNESS_TAG[1]
+        )
+        for room in rooms:
+            coordinates = room.attributes.get("coordinates")
+            if coordinates is None:
+                self.spare.append(room)
+            else:
+                coordinates = tuple(coordinates)
+                self.rooms[coordinates] = room
+                self.last_visit[coordinates] = now
+        TICK_SCHEDULER.register(
+            "wilderness", self.sweep, period=60, population=lambda: list(self.rooms.values())
+        )
+        log.info("Wilderness loaded.", bound=len(self.rooms), spare=len(self.spare))
+
+    def clear(self):
+        """
+        Forget all rooms without touching them; they are found again by
+        the next `load`.
+        """
+        self.rooms.clear()
+        self.spare.clear()
+        self.last_visit.clear()
+        self._terrain = None
+        self._loaded = False
+        TICK_SCHEDULER.unregister("wilderness")
+
+    def room_at(self, coordinates):
+        """
+        Args:
+            coordinates (tuple): `(x, y)`.
+
+        Returns:
+            WildernessRoom or None: The room bound to the tile, if any.
+
+        """
+        self.load()
+        return self.rooms.get(tuple(coordinates))
+
+    def _new_rooms(self, count):
+        """
+        Create spare rooms with their exits in one bulk batch.
+        """
+        specs = []
+        rooms = []
+        for _ in range(count):
+            room = ObjectSpec("荒野", ROOM_TYPECLASS, tags=[WILDERNESS_TAG, REGION_TAG])
+            rooms.append(room)
+            specs.append(room)
+            specs.extend(
+                ObjectSpec(key, EXIT_TYPECLASS, location=room, destination=room, aliases=aliases)
+                for key, (_, _, aliases) in DIRECTIONS.items()
+            )
+        bulk_create_objects(specs)
+        return [room.obj for room in rooms]
+
+    def _bind(self, coordinates):
+        if not self.spare:
+            self.spare.extend(self._new_rooms(POOL_GROWTH))
+        room = self.spare.pop()
+        room.attributes.add("coordinates", coordinates)
+        room.ndb.coordinates = coordinates
+        room.ndb.tile = None
+        self.rooms[coordinates] = room
+        self.last_visit[coordinates] = time.time()
+        return room
+
+    def bind(self, coordinates):
+        """
+        Get the room of a tile, binding a spare room to it if needed.
+
+        Args:
+            coordinates (tuple): `(x, y)`.
+
+        Returns:
+            WildernessRoom: The room.
+
+        """
+        coordinates = tuple(coordinates)
+        return self.room_at(coordinates) or self._bind(coordinates)
+
+    def is_changed(self, room, exclude=None):
+        """
+        Args:
+            room (WildernessRoom): A bound room.
+            exclude (Object, optional): An object about to leave the room.
+
+        Returns:
+            bool: If the tile differs from its generated state.
+
+        """
+        if room.attributes.get(CHANGED_ATTRIBUTE):
+            return True
+        return any(
+            obj != exclude and not obj.destination and not _is_visitor(obj)
+            for obj in room.contents
+        )
+
+    def has_visitors(self, room, exclude=None):
+        """
+        Returns:
+            bool: If characters are in the room.
+
+        """
+        return any(obj != exclude and _is_visitor(obj) for obj in room.contents)
+
+    def materialize(self, room):
+        """
+        Mark a tile as changed, so it keeps its room until it is idle.
+
+        Args:
+            room (WildernessRoom): A bound room.
+
+        """
+        if not room.attributes.get(CHANGED_ATTRIBUTE):
+            room.attributes.add(CHANGED_ATTRIBUTE, True)
+
+    def release(self, room, reclaim=False, exclude=None):
+        """
+        Make a tile virtual again and put its room back in the pool.
+
+        Args:
+            room (WildernessRoom): A bound room.
+            reclaim (bool, optional): Delete whatever was left in the room.
+                Without it, a changed room is left bound.
+            exclude (Object, optional): An object about to leave the room.
+
+        Returns:
+            bool: If the room was released.
+
+        """
+        coordinates = room.coordinates
+        if coordinates is None or self.rooms.get(coordinates) != room:
+            return False
+        if self.has_visitors(room, exclude=exclude):
+            return False
+        leftovers = [obj for obj in room.contents if obj != exclude and not obj.destination]
+        if (leftovers or room.attributes.get(CHANGED_ATTRIBUTE)) and not reclaim:
+            return False
+        for obj in leftovers:
+            obj.delete()
+        # drops `coordinates` and any changes together
+        room.attributes.clear()
+        room.ndb.coordinates = None
+        room.ndb.tile = None
+        del self.rooms[coordinates]
+        self.last_visit.pop(coordinates, None)
+        self.spare.append(room)
+        return True
+
+    def at_leave(self, room, leaving=None):
+        """
+        Called when something leaves a bound room; releases the tile if it
+        is left empty and unchanged.
+
+        Args:
+            room (WildernessRoom): The room.
+            leaving (Object, optional): What is leaving, still in the room.
+
+        """
+        coordinates = room.coordinates
+        if coordinates is None:
+            return
+        if leaving is not None and _is_visitor(leaving):
+            self.last_visit[coordinates] = time.time()
+        self.release(room, exclude=leaving)
+
+    # moving around
+
+    def move(self, obj, coordinates, quiet=False):
+        """
+        Move something to a tile.
+
+        Args:
+            obj (Object): What to move.
+            coordinates (tuple): `(x, y)`, must be valid.
+            quiet (bool, optional): Don't announce the move.
+
+        Returns:
+            bool: If the move worked.
+
+        """
+        coordinates = tuple(coordinates)
+        if not self.is_valid(coordinates):
+            return False
+        room = self.bind(coordinates)
+        self.last_visit[coordinates] = time.time()
+        moved = obj.move_to(room, quiet=quiet, move_type="traverse")
+        if not moved:
+            self.at_leave(room)
+        return moved
+
+    def enter(self, obj, coordinates=None, return_to=None):
+        """
+        Move something into the wilderness from outside.
+
+        Args:
+            obj (Object): What enters.
+            coordinates (tuple, optional): Where; defaults to the entry.
+            return_to (Object, optional): The room to get back to when it
+                walks off the map at the tile it entered by.
+
+        Returns:
+            bool: If it worked.
+
+        """
+        coordinates = tuple(coordinates or self.entry)
+        if return_to is not None:
+            obj.attributes.add(RETURN_ATTRIBUTE, (coordinates, return_to))
+        return self.move(obj, coordinates)
+
+    def way_out(self, obj, coordinates):
+        """
+        Args:
+            obj (Object): Who wants to leave the map.
+            coordinates (tuple): The tile it leaves from.
+
+        Returns:
+            Object or None: The room it gets back to from here.
+
+        """
+        entry = obj.attributes.get(RETURN_ATTRIBUTE)
+        if entry and tuple(entry[0]) == tuple(coordinates) and entry[1] and entry[1].pk:
+            return entry[1]
+        return None
+
+    def at_logout(self, char):
+        """
+        Remember where a character logged out, before it is taken off the
+        map; its room may serve another tile by the time it comes back.
+        """
+        room = char.location
+        if room is not None and self.rooms.get(getattr(room, "coordinates", None)) == room:
+            char.attributes.add(LOGOUT_ATTRIBUTE, room.coordinates)
+            self.last_visit[room.coordinates] = time.time()
+
+    def at_login(self, char):
+        """
+        Put a character that logged out in the wilderness back on its tile.
+        """
+        coordinates = char.attributes.get(LOGOUT_ATTRIBUTE)
+        if coordinates is None:
+            return
+        char.attributes.remove(LOGOUT_ATTRIBUTE)
+        if char.location is None and self.is_valid(coordinates):
+            room = self.bind(coordinates)
+            char.db.prelogout_location = room
+
+    # idle sweep
+
+    def sweep(self, rooms, now=None):
+        """
+        Release bound tiles that are unchanged and empty, or changed but
+        idle for `settings.WILDERNESS_IDLE_TIME`. Called by the tick
+        scheduler with one shard of the bound rooms.
+
+        Args:
+            rooms (list): Bound rooms.
+            now (float, optional): The current time.
+
+        Returns:
+            int: Number of tiles released.
+
+        """
+        now = time.time() if now is None else now
+        idle_time = getattr(settings, "WILDERNESS_IDLE_TIME", 3600)
+        released = 0
+        for room in rooms:
+            coordinates = room.coordinates
+            if coordinates is None or not room.pk:
+                continue
+            if self.has_visitors(room):
+                self.last_visit[coordinates] = now
+                continue
+            idle = now - self.last_visit.get(coordinates, now) >= idle_time
+            if self.release(room, reclaim=idle):
+                released += 1
+        # rooms are only deleted here, never while something may still be
+        # on its way out of them
+        pool_size = getattr(settings, "WILDERNESS_POOL_SIZE", 50)
+        while len(self.spare) > pool_size:
+            self.spare.pop().delete()
+        if released:
+            log.info("Released %s idle wilderness tiles.", released, bound=len(self.rooms))
+        return released
+
+
+WILDERNESS = Wilderness()